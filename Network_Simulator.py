@@ -12,7 +12,7 @@ def main():
 
 
     st.sidebar.title("Select Simulation")
-    page = st.sidebar.selectbox("Select",("Layer 1","Layer 2","Error Control","Access Control", "Sliding Window","IP Addressing","Transport Layer"))
+    page = st.sidebar.selectbox("Select",("Layer 1","Layer 2","Error Control","Forward Error Correction","Access Control", "Sliding Window","IP Addressing","Transport Layer"))
 
     
         
@@ -25,6 +25,9 @@ def main():
     elif page == "Error Control":
         from simulations import error_control
         error_control.main()
+    elif page == "Forward Error Correction":
+        from simulations import fec
+        fec.main()
     elif page == "Access Control":
         from simulations import access_control
         access_control.main()
@@ -0,0 +1,4 @@
+import sys
+from simulations.runner import main
+
+sys.exit(main())
@@ -1,104 +1,292 @@
 import streamlit as st
 import random
-import time
+import matplotlib.pyplot as plt
+from simulations.engine import Scheduler
+from simulations.headers import Ethernet, int_to_mac, mac_to_int
+from simulations.queues import FrameBuffer
+from simulations.sinks import NullSink, StreamlitSink, default_sink
+
+# 10 Mbps Ethernet timing
+BIT_RATE = 10e6
+SLOT_TIME = 512 / BIT_RATE  # Backoff unit, 512 bit times
+INTERFRAME_GAP = 96 / BIT_RATE
+JAM_TIME = 32 / BIT_RATE
+PROPAGATION_DELAY = 25.6e-6  # End-to-end delay across the shared medium
+FRAME_BITS = 512 * 8
+MAX_ATTEMPTS = 16  # Abort the frame after this many collisions
+BACKOFF_LIMIT = 10  # Backoff window stops doubling after 10 collisions
+
+
+class Transmission:
+    __slots__ = ("device", "start", "end", "end_event", "collided")
+
+    def __init__(self, device, start, end):
+        self.device = device
+        self.start = start
+        self.end = end
+        self.end_event = None
+        self.collided = False
+
+
+# Shared bus that all stations transmit on. A station hears another station's
+# signal one propagation delay after it starts, so two stations that start
+# within that window both sense an idle channel and their frames overlap.
+class Channel:
+    def __init__(self, scheduler, receiver, propagation_delay=PROPAGATION_DELAY, frame_bits=FRAME_BITS,
+                 bit_rate=BIT_RATE):
+        self.scheduler = scheduler
+        self.receiver = receiver
+        self.propagation_delay = propagation_delay
+        self.frame_time = frame_bits / bit_rate
+        self.active = {}  # {device: Transmission} for every frame currently on the wire
+        self.carriers = 0  # Number of signals stations can currently hear
+        self.waiting = []  # Stations deferring until the carrier drops
+
+        self.busy_time = 0.0
+        self.successes = 0
+        self.collisions = 0
+
+    def carrier_sense(self):
+        return self.carriers > 0
+
+    def wait_for_idle(self, device):
+        self.waiting.append(device)
+
+    def start_transmission(self, device):
+        now = self.scheduler.now
+        transmission = Transmission(device, now, now + self.frame_time)
+
+        # Any frame still on the wire overlaps this one
+        if self.active:
+            self.collisions += 1
+            detect = now + self.propagation_delay
+            transmission.collided = True
+            for other in self.active.values():
+                if not other.collided:
+                    other.collided = True
+                    self.abort(other, detect)
+            self.active[device] = transmission
+            self.abort(transmission, detect)
+        else:
+            self.active[device] = transmission
+            transmission.end_event = self.scheduler.schedule_at(transmission.end, self.end_transmission,
+                                                                transmission)
+        self.scheduler.schedule(self.propagation_delay, self.carrier_on)
+
+    def abort(self, transmission, detect):
+        # Stop sending a jam signal after the collision is heard
+        end = min(detect + JAM_TIME, transmission.start + self.frame_time)
+        if transmission.end_event is not None:
+            transmission.end_event.cancel()
+        transmission.end = end
+        transmission.end_event = self.scheduler.schedule_at(end, self.end_transmission, transmission)
+
+    def end_transmission(self, transmission):
+        del self.active[transmission.device]
+        self.scheduler.schedule(self.propagation_delay, self.carrier_off)
+        if transmission.collided:
+            transmission.device.collided()
+        else:
+            self.successes += 1
+            self.busy_time += self.frame_time
+            transmission.device.transmitted(self.receiver)
+
+    def carrier_on(self):
+        self.carriers += 1
+
+    def carrier_off(self):
+        self.carriers -= 1
+        if self.carriers == 0 and self.waiting:
+            # 1-persistent CSMA: every deferring station goes as soon as the line is idle
+            waiting = self.waiting
+            self.waiting = []
+            for device in waiting:
+                self.scheduler.schedule(INTERFRAME_GAP, device.attempt)
 
 
 class Device:
-    def __init__(self, name, mac_address):
+    def __init__(self, name, mac_address, channel, buffer_size=16, sink=None, buffer_policy="tail"):
         self.name = name
-        self.mac_address = mac_address
-        self.buffer = []
+        self.mac_address = mac_to_int(mac_address)
+        self.channel = channel
+        self.scheduler = channel.scheduler
+        self.buffer = FrameBuffer(buffer_size, buffer_policy)  # (created, frame) waiting behind the one being sent
+        self.current = None
         self.connected_device = None
-        self.collision = False
+        self.busy = False
+        self.sink = default_sink(sink)
+
+        # Per-station counters
+        self.attempts = 0  # Attempts for the frame currently being sent
+        self.total_attempts = 0
+        self.collisions = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.total_delay = 0.0
 
     def generate_data(self, data_size):
         # Simulate data generation
         data = ''.join(random.choice('01') for _ in range(data_size))
         return data
 
-    def send(self, switch, destination_mac):
-        if not self.buffer:
-            # Generate data if buffer is empty
-            self.buffer.append({"source_mac": self.mac_address, "destination_mac": destination_mac,
-                                "data": self.generate_data(10)})  # Adjust data size as needed
-        else:
-            st.write(f"{self.name}: Buffer full, cannot send data.")
+    def send(self, destination_mac):
+        frame = (self.scheduler.now, Ethernet(destination_mac, self.mac_address, self.generate_data(10)))
+        if not self.busy:
+            self.busy = True
+            self.current = frame
+            self.attempts = 0
+            self.attempt()
+            return
+        if self.buffer.full():
+            self.sink.write(f"{self.name}: Buffer full, cannot send data." if self.buffer.policy == "tail"
+                            else f"{self.name}: Buffer full, dropping oldest frame.")
+            self.frames_dropped += 1
+        self.buffer.append(frame)
 
+    def attempt(self):
         # Carrier Sense Multiple Access (CSMA)
-        carrier_busy = False
-        for _ in range(5):  # Simulate checking for carrier signal (replace with switch status if available)
-            carrier_busy = random.randint(0, 1)  # Simulate random carrier activity (0 - idle, 1 - busy)
-            if not carrier_busy:
-                break  # Exit loop if carrier is not busy for a certain duration
-            time.sleep(0.1)  # Simulate checking interval
-
-        if carrier_busy:
-            st.write(f"{self.name}: Carrier Busy, deferring transmission.")
-            self.collision = True  # Set collision flag for next attempt
+        if self.channel.carrier_sense():
+            self.channel.wait_for_idle(self)
             return
+        self.attempts += 1
+        self.total_attempts += 1
+        self.channel.start_transmission(self)
 
+    def collided(self):
         # Collision Detection (CD)
-        transmission_time = 1  # Simulate transmission time
-        self.collision = False
-        for _ in range(transmission_time):
-            time.sleep(0.1)  # Simulate transmission duration
-            # Simulate potential collision with other devices transmitting at the same time
-            if random.randint(0, 1):  # Random chance of collision
-                self.collision = True
-                st.write(f"Collision detected on channel!")
-                break
-
-        if self.collision:
-            # Handle collision (e.g., backoff and retry)
-            st.write(f"{self.name}: Collision occurred, retrying...")
-            # Implement backoff strategy (exponential backoff is common)
-            backoff_time = random.randint(0, 2 ** len(self.buffer)) * 0.1  # Random backoff time based on retry attempts
-            time.sleep(backoff_time)
-            self.send(switch, destination_mac)  # Retry transmission after backoff
+        self.collisions += 1
+        self.sink.write(f"{self.name}: Collision detected on channel (attempt {self.attempts})")
+
+        if self.attempts >= MAX_ATTEMPTS:
+            self.sink.write(f"{self.name}: Too many collisions, dropping frame.")
+            self.frames_dropped += 1
+            self.next_frame()
+            return
+
+        # Truncated binary exponential backoff, counted in slot times
+        k = min(self.attempts, BACKOFF_LIMIT)
+        backoff_slots = random.randint(0, 2 ** k - 1)
+        self.scheduler.schedule(backoff_slots * SLOT_TIME, self.attempt)
+
+    def transmitted(self, switch):
+        created, frame = self.current
+        self.frames_sent += 1
+        self.total_delay += self.scheduler.now - created
+        self.sink.write(f"{self.name} sent data to {int_to_mac(frame.destination)}")
+        switch.receive(frame)
+        self.next_frame()
+
+    def next_frame(self):
+        self.attempts = 0
+        if self.buffer:
+            self.current = self.buffer.popleft()
+            self.scheduler.schedule(INTERFRAME_GAP, self.attempt)
         else:
-            st.write(f"{self.name} sent data to {destination_mac}")
-            switch.receive(self.buffer.pop())  # Remove data from buffer after simulated transmission
+            self.current = None
+            self.busy = False
 
 
 class Switch:
-    def __init__(self):
-        self.buffer = []
+    def __init__(self, sink=None, buffer_size=1024):
+        self.buffer = FrameBuffer(buffer_size, "head")  # The most recent frames received
+        self.sink = default_sink(sink)
 
     def receive(self, packet):
         # Simulate receiving data from device
-        st.write(f"Switch received: {packet}")
+        self.buffer.append(packet)
+        self.sink.write(f"Switch received: {packet}")
+
+
+def report(devices, channel):
+    stations = []
+    for device in devices:
+        stations.append({"station": device.name, "attempts": device.total_attempts,
+                         "collisions": device.collisions, "sent": device.frames_sent,
+                         "dropped": device.frames_dropped, "max_buffer": device.buffer.max_length})
+
+    now = channel.scheduler.now
+    sent = sum(device.frames_sent for device in devices)
+    summary = {
+        "throughput": channel.busy_time / now if now else 0.0,  # Normalized to the channel capacity
+        "mean_delay": sum(device.total_delay for device in devices) / sent if sent else 0.0,
+        "collisions": channel.collisions,
+        "sent": sent,
+        "dropped": sum(device.frames_dropped for device in devices),
+    }
+    return stations, summary
+
+
+def simulate(num_stations, offered_load, duration=0.5, propagation_delay=PROPAGATION_DELAY, frame_bits=FRAME_BITS,
+             speed=None, sink=None, buffer_size=16, buffer_policy="tail"):
+    sink = default_sink(sink)
+    scheduler = Scheduler()
+    switch = Switch(sink)
+    channel = Channel(scheduler, switch, propagation_delay, frame_bits)
+    devices = [Device(f"Device {i + 1}", i + 1, channel, buffer_size, sink, buffer_policy)
+               for i in range(num_stations)]
+
+    # Poisson arrivals; offered_load is in frames per frame time across all stations
+    rate = offered_load / (channel.frame_time * num_stations)
+
+    def arrival(device):
+        device.send(random.choice(devices).mac_address)
+        scheduler.schedule(random.expovariate(rate), arrival, device)
+
+    for device in devices:
+        scheduler.schedule(random.expovariate(rate), arrival, device)
+
+    scheduler.run(until=duration, speed=speed)
+    return report(devices, channel)
+
+
+def throughput_curve(num_stations, loads, duration=0.5, propagation_delay=PROPAGATION_DELAY, frame_bits=FRAME_BITS):
+    curve = []
+    for load in loads:
+        _, summary = simulate(num_stations, load, duration, propagation_delay, frame_bits, sink=NullSink())
+        curve.append({"offered_load": load, "throughput": summary["throughput"],
+                      "mean_delay": summary["mean_delay"]})
+    return curve
+
+
+def run_scenario(config, sink=None):
+    stations, summary = simulate(config.get("num_stations", 5), config.get("offered_load", 0.5),
+                                 config.get("duration", 0.5), config.get("propagation_delay", PROPAGATION_DELAY),
+                                 config.get("frame_bits", FRAME_BITS), sink=sink,
+                                 buffer_size=config.get("buffer_size", 16),
+                                 buffer_policy=config.get("buffer_policy", "tail"))
+    return {"summary": summary, "stations": stations}
 
 
 # Main function to create the Streamlit UI
 def main():
     st.title("Network Simulation with CSMA/CD")
 
-    # Create switch and devices
-    switch = Switch()
-    device1 = Device("Device 1", "1111111")
-    device2 = Device("Device 2", "2222222")
-    device3 = Device("Device 3", "3333333")
-    device4 = Device("Device 4", "4444444")
-    device5 = Device("Device 5", "5555555")
-
-    num_rounds = st.sidebar.slider("Number of Simulation Rounds", min_value=1, max_value=20, value=10)
+    num_stations = st.sidebar.slider("Number of Stations", min_value=2, max_value=1000, value=5)
+    offered_load = st.sidebar.slider("Offered Load (frames per frame time)", min_value=0.1, max_value=5.0, value=0.5)
+    duration_ms = st.sidebar.slider("Simulated Time (ms)", min_value=1, max_value=1000, value=50)
+    propagation_us = st.sidebar.slider("Propagation Delay (us)", min_value=0.0, max_value=100.0, value=25.6)
+    speed = st.sidebar.number_input("Playback Speed (x real time, 0 = as fast as possible)", min_value=0.0, value=0.0)
+    show_log = st.sidebar.checkbox("Show Event Log", value=num_stations <= 10)
     start_simulation = st.sidebar.button("Start Simulation")
 
     if start_simulation:
-        for _ in range(num_rounds):
-            device1.send(switch, device3.mac_address)
-            time.sleep(1)  # Simulate time between transmissions
-            device2.send(switch, device1.mac_address)
-            time.sleep(1)
-            device3.send(switch, device2.mac_address)
-            time.sleep(1)
-            device4.send(switch, device5.mac_address)
-            time.sleep(1)
-            device5.send(switch, device1.mac_address)
-            time.sleep(1)
-
+        sink = StreamlitSink() if show_log else NullSink()
+        stations, summary = simulate(num_stations, offered_load, duration_ms / 1000, propagation_us * 1e-6,
+                                     speed=speed or None, sink=sink)
+        st.table(stations)
+        st.write(f"Throughput: {summary['throughput']:.2%} of capacity, "
+                 f"mean delay: {summary['mean_delay'] * 1000:.3f} ms")
         st.success("Simulation complete.")
 
+    if st.sidebar.button("Plot Throughput Curve"):
+        loads = [0.1 * i for i in range(1, 31)]
+        curve = throughput_curve(num_stations, loads, duration_ms / 1000, propagation_us * 1e-6)
+        fig, ax = plt.subplots()
+        ax.plot(loads, [point["throughput"] for point in curve])
+        ax.set_xlabel("Offered load G")
+        ax.set_ylabel("Throughput S")
+        st.pyplot(fig)
+
 
 if __name__ == "__main__":
     main()
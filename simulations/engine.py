@@ -0,0 +1,194 @@
+import heapq
+import itertools
+import math
+import time
+
+
+class Event:
+    __slots__ = ("time", "callback", "args", "cancelled")
+
+    def __init__(self, time, callback, args):
+        self.time = time
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+# Discrete-event scheduler: a virtual clock plus a heap of pending events.
+# Protocols schedule their transmissions, backoffs, ACKs and timeouts here
+# instead of sleeping, so a run completes as fast as the CPU allows.
+class Scheduler:
+    def __init__(self, speed=None):
+        self.now = 0.0
+        self.queue = []
+        self.counter = itertools.count()
+        self.speed = speed  # None runs flat out, otherwise virtual seconds per real second
+        self.events_run = 0
+
+    def schedule(self, delay, callback, *args):
+        if delay < 0:
+            raise ValueError("Cannot schedule an event in the past")
+        return self.schedule_at(self.now + delay, callback, *args)
+
+    def schedule_at(self, when, callback, *args):
+        if when < self.now:
+            raise ValueError("Cannot schedule an event in the past")
+        event = Event(when, callback, args)
+        # The counter keeps events at the same time in FIFO order
+        heapq.heappush(self.queue, (when, next(self.counter), event))
+        return event
+
+    def cancel(self, event):
+        event.cancel()
+
+    def pending(self):
+        return sum(1 for _, _, event in self.queue if not event.cancelled)
+
+    def peek(self):
+        while self.queue and self.queue[0][2].cancelled:
+            heapq.heappop(self.queue)
+        if self.queue:
+            return self.queue[0][0]
+        return None
+
+    def step(self):
+        while self.queue:
+            when, _, event = heapq.heappop(self.queue)
+            if event.cancelled:
+                continue
+            self.now = when
+            self.events_run += 1
+            event.callback(*event.args)
+            return True
+        return False
+
+    def run(self, until=None, speed=None):
+        speed = self.speed if speed is None else speed
+        wall_start = time.perf_counter()
+        virtual_start = self.now
+
+        while True:
+            when = self.peek()
+            if when is None or (until is not None and when > until):
+                break
+            if speed:
+                # Replay at the requested real-time speed (used by the UI)
+                delay = wall_start + (when - virtual_start) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.step()
+
+        if until is not None and self.now < until:
+            self.now = until
+        return self.now
+
+
+class Timer:
+    __slots__ = ("expires", "callback", "args", "wheel")
+
+    def __init__(self, expires, callback, args, wheel):
+        self.expires = expires  # Tick number the timer fires on
+        self.callback = callback
+        self.args = args
+        self.wheel = wheel  # None once the timer has fired or been cancelled
+
+    def cancel(self):
+        if self.wheel is not None:
+            self.wheel.active -= 1
+            self.wheel = None
+
+    @property
+    def pending(self):
+        return self.wheel is not None
+
+
+# Hierarchical timing wheel on top of the scheduler. Protocols that keep a
+# retransmission timer per frame or per connection start and cancel them here
+# in O(1). Level 0 has one slot per tick and each level above it covers `size`
+# slots of the level below; a timer drops down a level every time the wheel
+# under it wraps around. The wheel keeps a single tick event on the scheduler,
+# and only while timers are pending.
+class TimerWheel:
+    def __init__(self, scheduler, tick=0.001, size=256, levels=4):
+        if size & (size - 1):
+            raise ValueError("The wheel size must be a power of two")
+        self.scheduler = scheduler
+        self.tick = tick
+        self.size = size
+        self.bits = size.bit_length() - 1
+        self.levels = levels
+        self.wheels = [[[] for _ in range(size)] for _ in range(levels)]
+        self.ticks = 0  # Last tick processed
+        self.active = 0
+        self.ticking = None
+        self.fired = 0
+
+    def start(self, delay, callback, *args):
+        if self.ticking is None:
+            # Idle wheels do not tick, so catch up with the clock first
+            self.ticks = int(self.scheduler.now / self.tick)
+        expires = max(self.ticks + 1, math.ceil((self.scheduler.now + delay) / self.tick))
+        timer = Timer(expires, callback, args, self)
+        self._insert(timer)
+        self.active += 1
+        if self.ticking is None:
+            self._schedule_tick()
+        return timer
+
+    def cancel(self, timer):
+        timer.cancel()
+
+    def _insert(self, timer):
+        delta = timer.expires - self.ticks
+        level = 0
+        while level < self.levels - 1 and delta >= 1 << (self.bits * (level + 1)):
+            level += 1
+        # Timers past the top level's span are parked there and re-inserted on every pass
+        index = (timer.expires >> (self.bits * level)) & (self.size - 1)
+        self.wheels[level][index].append(timer)
+
+    def _schedule_tick(self):
+        when = max(self.scheduler.now, (self.ticks + 1) * self.tick)
+        self.ticking = self.scheduler.schedule_at(when, self._advance)
+
+    def _cascade(self, level):
+        wheel = self.wheels[level]
+        index = (self.ticks >> (self.bits * level)) & (self.size - 1)
+        slot = wheel[index]
+        wheel[index] = []
+        for timer in slot:
+            if timer.wheel is not None:
+                self._insert(timer)
+
+    def _advance(self):
+        self.ticks += 1
+        # Empty the slots of every level that just wrapped, highest first, so
+        # timers moving down land in slots that have not been processed yet
+        wrapped = 1
+        while wrapped < self.levels and not self.ticks & ((1 << (self.bits * wrapped)) - 1):
+            wrapped += 1
+        for level in range(wrapped - 1, 0, -1):
+            self._cascade(level)
+
+        index = self.ticks & (self.size - 1)
+        slot = self.wheels[0][index]
+        if slot:
+            self.wheels[0][index] = []
+            for timer in slot:
+                if timer.wheel is None:
+                    continue  # Cancelled, possibly by an earlier callback in this tick
+                if timer.expires > self.ticks:
+                    self._insert(timer)
+                    continue
+                timer.wheel = None
+                self.active -= 1
+                self.fired += 1
+                timer.callback(*timer.args)
+        if self.active:
+            self._schedule_tick()
+        else:
+            self.ticking = None
+            self.wheels = [[[] for _ in range(self.size)] for _ in range(self.levels)]
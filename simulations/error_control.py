@@ -1,29 +1,493 @@
+import binascii
+import time
+import zlib
+import numpy as np
 import streamlit as st
+from simulations.sinks import StreamlitSink, default_sink
 
+
+def _reflect(value, width):
+    result = 0
+    for _ in range(width):
+        result = (result << 1) | (value & 1)
+        value >>= 1
+    return result
+
+
+# Table-driven CRC over bytes-like data. `poly` is the generator without its
+# leading x^width term, in the usual Rocksoft notation (normal, not reflected).
+class CRC:
+    NUMPY_THRESHOLD = 1 << 14  # Payloads at least this long are checksummed in parallel chunks
+    SEGMENT = 1 << 20
+
+    def __init__(self, width, poly, init=0, reflect=False, xorout=0, name=None):
+        self.width = width
+        self.poly = poly
+        self.init = init
+        self.reflect = reflect
+        self.xorout = xorout
+        self.name = name or f"CRC-{width}/{poly:#x}"
+        self.mask = (1 << width) - 1
+        # Non-reflected CRCs narrower than a byte run in an 8 bit register and shift back at the end
+        self.shift = 0 if reflect else max(0, 8 - width)
+        self.register_width = width + self.shift
+        self.register_mask = (1 << self.register_width) - 1
+        self.table = self._make_table()
+        self.slices = self._make_slices() if self.reflect and self.register_width <= 64 else None
+        self.dtype = np.uint32 if self.register_width <= 32 else np.uint64
+        self.np_table = np.array(self.table, dtype=self.dtype) if self.register_width <= 64 else None
+        self.zero_powers = []  # GF(2) matrices of 1, 2, 4, ... zero bytes through the register
+        self.combine_cache = {}  # {zero bytes: byte tables of that shift}
+        self.fast = self._fast_path()
+
+    @classmethod
+    def from_generator(cls, generator, **kwargs):
+        # Accepts a '0'/'1' string such as "1011", or an int with the leading term included
+        if isinstance(generator, str):
+            generator = int(generator, 2)
+        width = generator.bit_length() - 1
+        if width < 1:
+            raise ValueError("A generator needs degree 1 or more")
+        return cls(width, generator & ((1 << width) - 1), **kwargs)
+
+    def _make_table(self):
+        table = []
+        if self.reflect:
+            poly = _reflect(self.poly, self.width)
+            for byte in range(256):
+                crc = byte
+                for _ in range(8):
+                    crc = (crc >> 1) ^ poly if crc & 1 else crc >> 1
+                table.append(crc)
+        else:
+            width = self.register_width
+            poly = self.poly << self.shift
+            top = 1 << (width - 1)
+            for byte in range(256):
+                crc = byte << (width - 8)
+                for _ in range(8):
+                    crc = ((crc << 1) ^ poly if crc & top else crc << 1) & self.register_mask
+                table.append(crc)
+        return table
+
+    def _make_slices(self):
+        # Slicing-by-8 tables: slices[k][b] is the register after byte b followed by k zero bytes
+        slices = [self.table]
+        for _ in range(7):
+            previous = slices[-1]
+            slices.append([self._step(crc, 0) for crc in previous])
+        return slices
+
+    def _fast_path(self):
+        # zlib and binascii implement two of the presets in C
+        params = (self.width, self.poly, self.reflect, self.xorout)
+        if params == (32, 0x04C11DB7, True, 0xFFFFFFFF) and self.init == 0xFFFFFFFF:
+            return lambda data: zlib.crc32(data)
+        if params == (16, 0x1021, False, 0):
+            init = self.init
+            return lambda data: binascii.crc_hqx(data, init)
+        return None
+
+    def _step(self, crc, byte):
+        if self.reflect:
+            return self.table[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+        top = self.register_width - 8
+        return self.table[((crc >> top) ^ byte) & 0xFF] ^ ((crc << 8) & self.register_mask)
+
+    def _start(self):
+        return self.init << self.shift
+
+    def _finish(self, register):
+        return ((register >> self.shift) ^ self.xorout) & self.mask
+
+    def checksum(self, data):
+        if self.fast is not None:
+            return self.fast(data)
+        data = memoryview(data).cast("B")
+        if len(data) >= self.NUMPY_THRESHOLD and self.np_table is not None:
+            register = self._start()
+            # Segments of about a megabyte keep the transposed chunks in cache
+            for start in range(0, len(data), self.SEGMENT):
+                segment = data[start:start + self.SEGMENT]
+                register = self._shift_zeros(register, len(segment)) ^ self._register_numpy(segment)
+            return self._finish(register)
+        return self._finish(self._update(self._start(), data))
+
+    __call__ = checksum
+
+    def _update(self, crc, data):
+        if self.reflect and self.slices is not None:
+            return self._update_sliced(crc, data)
+        step = self._step
+        for byte in data:
+            crc = step(crc, byte)
+        return crc
+
+    def _update_sliced(self, crc, data):
+        # Reflected CRCs consume eight bytes per iteration with one lookup per byte
+        t0, t1, t2, t3, t4, t5, t6, t7 = self.slices
+        blocks = len(data) // 8
+        for i in range(0, blocks * 8, 8):
+            word = int.from_bytes(data[i:i + 8], "little") ^ crc
+            crc = (t7[word & 0xFF] ^ t6[(word >> 8) & 0xFF] ^ t5[(word >> 16) & 0xFF] ^
+                   t4[(word >> 24) & 0xFF] ^ t3[(word >> 32) & 0xFF] ^ t2[(word >> 40) & 0xFF] ^
+                   t1[(word >> 48) & 0xFF] ^ t0[word >> 56])
+        step = self._step
+        for byte in data[blocks * 8:]:
+            crc = step(crc, byte)
+        return crc
+
+    # The register update is linear over GF(2), so a long payload is cut into
+    # equal chunks that are all processed at once with zero initial registers,
+    # then combined pairwise by pushing the left half through len(right) zero bytes.
+    def _register_numpy(self, data):
+        buf = np.frombuffer(data, dtype=np.uint8)
+        chunks = 1 << min(12, max(0, (len(buf) // 64).bit_length() - 1))
+        length = -(-len(buf) // chunks)
+        # Leading zero bytes leave a zero register unchanged, so pad at the front
+        padded = np.zeros(chunks * length, dtype=np.uint8)
+        padded[len(padded) - len(buf):] = buf
+        columns = np.ascontiguousarray(padded.reshape(chunks, length).T)
+
+        registers = self._registers_numpy(np.zeros(chunks, dtype=self.dtype), columns)
+        while len(registers) > 1:
+            registers = self._apply_numpy(self._combine_tables(length), registers[0::2]) ^ registers[1::2]
+            length *= 2
+        return int(registers[0])
+
+    def _combine_tables(self, length):
+        tables = self.combine_cache.get(length)
+        if tables is None:
+            if len(self.combine_cache) > 64:
+                self.combine_cache.clear()
+            tables = self.combine_cache[length] = self._byte_tables(self._zero_matrix(length))
+        return tables
+
+    def _registers_numpy(self, registers, columns):
+        # Advances one register per frame through the rows of `columns` (bytes x frames)
+        table = self.np_table
+        dtype = self.dtype
+        eight, low = dtype(8), dtype(0xFF)
+        index = np.empty(len(registers), dtype=dtype)
+        looked_up = np.empty(len(registers), dtype=dtype)
+        if self.reflect:
+            for column in columns:
+                np.bitwise_xor(registers, column, out=index)
+                np.bitwise_and(index, low, out=index)
+                np.right_shift(registers, eight, out=registers)
+                np.take(table, index, out=looked_up)
+                np.bitwise_xor(registers, looked_up, out=registers)
+        else:
+            top, mask = dtype(self.register_width - 8), dtype(self.register_mask)
+            for column in columns:
+                np.right_shift(registers, top, out=index)
+                np.bitwise_xor(index, column, out=index)
+                np.bitwise_and(index, low, out=index)
+                np.left_shift(registers, eight, out=registers)
+                np.bitwise_and(registers, mask, out=registers)
+                np.take(table, index, out=looked_up)
+                np.bitwise_xor(registers, looked_up, out=registers)
+        return registers
+
+    def checksum_many(self, frames):
+        # One CRC per row of an (n_frames, frame_len) uint8 array, vectorized across frames
+        frames = np.asarray(frames, dtype=np.uint8)
+        registers = np.full(len(frames), self._start(), dtype=self.dtype)
+        registers = self._registers_numpy(registers, np.ascontiguousarray(frames.T))
+        registers = (registers >> self.dtype(self.shift)) ^ self.dtype(self.xorout)
+        return registers & self.dtype(self.mask)
+
+    # GF(2) matrices are lists of column images, one per register bit
+    def _zero_power(self, exponent):
+        powers = self.zero_powers
+        if not powers:
+            powers.append([self._step(1 << bit, 0) for bit in range(self.register_width)])
+        while len(powers) <= exponent:
+            powers.append(self._compose(powers[-1], powers[-1]))
+        return powers[exponent]
+
+    def _zero_matrix(self, count):
+        result = [1 << bit for bit in range(self.register_width)]
+        for exponent in range(count.bit_length()):
+            if (count >> exponent) & 1:
+                result = self._compose(self._zero_power(exponent), result)
+        return result
+
+    def _shift_zeros(self, register, count):
+        for exponent in range(count.bit_length()):
+            if (count >> exponent) & 1:
+                register = self._apply(self._zero_power(exponent), register)
+        return register
+
+    @staticmethod
+    def _apply(matrix, value):
+        result = 0
+        bit = 0
+        while value:
+            if value & 1:
+                result ^= matrix[bit]
+            value >>= 1
+            bit += 1
+        return result
+
+    def _compose(self, a, b):
+        return [self._apply(a, column) for column in b]
+
+    def _byte_tables(self, matrix):
+        # Splits a matrix into one 256-entry table per register byte, built by doubling
+        tables = []
+        for start in range(0, self.register_width, 8):
+            table = np.zeros(256, dtype=self.dtype)
+            for bit, column in enumerate(matrix[start:start + 8]):
+                table[1 << bit:2 << bit] = table[:1 << bit] ^ self.dtype(column)
+            tables.append(table)
+        return tables
+
+    def _apply_numpy(self, tables, values):
+        result = np.zeros_like(values)
+        for index, table in enumerate(tables):
+            result ^= table[(values >> self.dtype(8 * index)) & self.dtype(0xFF)]
+        return result
+
+    def verify(self, data, crc):
+        return self.checksum(data) == crc
+
+    def __repr__(self):
+        return f"CRC({self.name})"
+
+
+CRC8 = CRC(8, 0x07, name="CRC-8")
+CRC16_CCITT = CRC(16, 0x1021, init=0xFFFF, name="CRC-16-CCITT")
+CRC32 = CRC(32, 0x04C11DB7, init=0xFFFFFFFF, reflect=True, xorout=0xFFFFFFFF, name="CRC-32")
+CRC32C = CRC(32, 0x1EDC6F41, init=0xFFFFFFFF, reflect=True, xorout=0xFFFFFFFF, name="CRC-32C")
+PRESETS = {crc.name: crc for crc in (CRC8, CRC16_CCITT, CRC32, CRC32C)}
+
+
+def get_crc(generator):
+    if isinstance(generator, CRC):
+        return generator
+    if generator in PRESETS:
+        return PRESETS[generator]
+    return CRC.from_generator(generator)
+
+
+# Textbook CRC on '0'/'1' strings: modulo-2 long division, so leading zeros
+# in the data are kept and the remainder is always len(generator) - 1 bits.
 def binary_division(dividend, divisor):
     x = int(''.join(map(str, dividend)), 2)
     y = int(''.join(map(str, divisor)), 2)
-    rem = x % y
-    remainder = format(rem, 'b')
+    degree = len(divisor) - 1
+    for shift in range(len(dividend) - len(divisor), -1, -1):
+        if (x >> (shift + degree)) & 1:
+            x ^= y << shift
+    remainder = format(x, f'0{degree}b')
     return remainder
 
 def CRC_sender(data, generator):
     aug = len(generator) - 1
     aug = aug * str(0)
     aug_data = data + aug
-    a = int(''.join(map(str, aug_data)), 2)
-    aug_data = format(a, 'b')
     rem = binary_division(aug_data, generator)
-    codeword = aug_data + rem
+    codeword = data + rem
     return codeword
 
 def CRC_receiver(code, generator):
     r = binary_division(code, generator)
-    if r == "0":
+    if int(r, 2) == 0:
         return "The data has no error"
     else:
         return "Error in data"
 
+def generator_int(generator):
+    # A preset name, a '0'/'1' string or an int, as the full generator with its leading term
+    if isinstance(generator, CRC) or generator in PRESETS:
+        crc = get_crc(generator)
+        return (1 << crc.width) | crc.poly
+    if isinstance(generator, str):
+        return int(generator, 2)
+    return int(generator)
+
+
+# CRC checks over batches of codewords held as (frames, bits) uint8 arrays.
+# The remainder is linear in the codeword bits, so each frame's syndrome is
+# the XOR of the per-bit remainders x^(n-1-i) mod g of its set bits. The rows
+# are packed to bytes and combined with one 256-entry table per byte position.
+class BatchCRC:
+    def __init__(self, generator, data_bits):
+        self.generator = generator_int(generator)
+        self.width = self.generator.bit_length() - 1
+        if self.width < 1 or self.width > 64:
+            raise ValueError("Batch CRC checks support generators of degree 1 to 64")
+        self.data_bits = data_bits
+        self.n_bits = data_bits + self.width
+        self.dtype = np.uint32 if self.width <= 32 else np.uint64
+        self.tables = self._make_tables()
+
+    def _make_tables(self):
+        remainders = [0] * self.n_bits
+        remainder = 1
+        top = 1 << self.width
+        for position in range(self.n_bits - 1, -1, -1):
+            remainders[position] = remainder
+            remainder <<= 1
+            if remainder & top:
+                remainder ^= self.generator
+        n_bytes = -(-self.n_bits // 8)
+        columns = np.zeros(n_bytes * 8, dtype=self.dtype)  # Padding bits past the frame stay 0
+        columns[:self.n_bits] = remainders
+        columns = columns.reshape(n_bytes, 8)
+
+        tables = np.zeros((n_bytes, 256), dtype=self.dtype)
+        for bit in range(8):
+            # np.packbits puts the first bit of each byte in the most significant position
+            tables[:, 1 << bit:2 << bit] = tables[:, :1 << bit] ^ columns[:, 7 - bit, None]
+        return tables
+
+    def syndromes(self, bits):
+        packed = np.packbits(np.asarray(bits, dtype=np.uint8), axis=1)
+        result = np.zeros(len(packed), dtype=self.dtype)
+        for position, table in enumerate(self.tables):
+            result ^= table[packed[:, position]]
+        return result
+
+    def encode(self, data):
+        # Appends the remainder bits to each row of data, like CRC_sender
+        data = np.asarray(data, dtype=np.uint8)
+        codewords = np.zeros((len(data), self.n_bits), dtype=np.uint8)
+        codewords[:, :self.data_bits] = data
+        remainders = self.syndromes(codewords)
+        shifts = np.arange(self.width - 1, -1, -1, dtype=self.dtype)
+        codewords[:, self.data_bits:] = (remainders[:, None] >> shifts) & self.dtype(1)
+        return codewords
+
+    def check(self, received):
+        # True where a frame passes the receiver check, like CRC_receiver's "no error"
+        return self.syndromes(received) == 0
+
+
+# Bit error models for batches of frames: independent errors at a fixed BER,
+# single bursts of an exact length (first and last bit flipped, the rest
+# random), or a two-state Gilbert-Elliott chain with a good and a bad BER.
+class BitErrorChannel:
+    def __init__(self, model="random", ber=1e-3, burst_length=8, p_good_bad=0.01, p_bad_good=0.1,
+                 ber_good=1e-5, ber_bad=0.1, seed=None):
+        if model not in ("random", "burst", "gilbert_elliott"):
+            raise ValueError(f"Unknown error model '{model}'")
+        self.model = model
+        self.ber = ber
+        self.burst_length = burst_length
+        self.p_good_bad = p_good_bad
+        self.p_bad_good = p_bad_good
+        self.ber_good = ber_good
+        self.ber_bad = ber_bad
+        self.rng = np.random.default_rng(seed)
+
+    def errors(self, frames, n_bits):
+        if self.model == "random":
+            return (self.rng.random((frames, n_bits)) < self.ber).view(np.uint8)
+        if self.model == "burst":
+            return self._burst_errors(frames, n_bits)
+        return self._gilbert_elliott_errors(frames, n_bits)
+
+    def _burst_errors(self, frames, n_bits):
+        length = min(self.burst_length, n_bits)
+        errors = np.zeros((frames, n_bits), dtype=np.uint8)
+        pattern = self.rng.integers(0, 2, size=(frames, length), dtype=np.uint8)
+        pattern[:, 0] = 1
+        pattern[:, -1] = 1
+        starts = self.rng.integers(0, n_bits - length + 1, size=frames)
+        errors[np.arange(frames)[:, None], starts[:, None] + np.arange(length)] = pattern
+        return errors
+
+    def _gilbert_elliott_errors(self, frames, n_bits):
+        # Frames start in the stationary distribution, the chain then runs bit by bit for all frames at once
+        p_bad = self.p_good_bad / (self.p_good_bad + self.p_bad_good)
+        bad = self.rng.random(frames) < p_bad
+        draws = self.rng.random((n_bits, 2, frames))
+        errors = np.empty((n_bits, frames), dtype=bool)
+        for position in range(n_bits):
+            errors[position] = draws[position, 0] < np.where(bad, self.ber_bad, self.ber_good)
+            bad = np.where(bad, draws[position, 1] >= self.p_bad_good, draws[position, 1] < self.p_good_bad)
+        return np.ascontiguousarray(errors.T).view(np.uint8)
+
+    def transmit(self, codewords):
+        return codewords ^ self.errors(*codewords.shape)
+
+
+def detection_rates(generator, channel, frames, data_bits=256, batch_size=1 << 15, seed=None):
+    checker = BatchCRC(generator, data_bits)
+    rng = np.random.default_rng(seed)
+    errored = undetected = 0
+    for start in range(0, frames, batch_size):
+        count = min(batch_size, frames - start)
+        codewords = checker.encode(rng.integers(0, 2, size=(count, data_bits), dtype=np.uint8))
+        received = channel.transmit(codewords)
+        corrupted = (received != codewords).any(axis=1)
+        errored += int(corrupted.sum())
+        undetected += int((corrupted & checker.check(received)).sum())
+    return {"frames": frames, "errored": errored, "undetected": undetected,
+            "undetected_rate": undetected / errored if errored else 0.0}
+
+
+def run_detection_scenario(config, sink=None):
+    # Undetected error rate of each generator, per burst length for the burst model
+    sink = default_sink(sink)
+    generators = config.get("generators", ["1011", "CRC-8", "CRC-16-CCITT", "CRC-32"])
+    model = config.get("model", "burst")
+    burst_lengths = config.get("burst_lengths", [4, 8, 9, 12, 16, 17, 24, 33]) if model == "burst" else [None]
+    frames = int(config.get("frames", 100000))
+    data_bits = int(config.get("data_bits", 256))
+    seed = config.get("seed")
+    channel_options = {key: config[key] for key in ("ber", "p_good_bad", "p_bad_good", "ber_good", "ber_bad")
+                       if key in config}
+
+    rows = []
+    for generator in generators:
+        for burst_length in burst_lengths:
+            channel = BitErrorChannel(model, burst_length=burst_length, seed=seed, **channel_options)
+            row = {"generator": generator, "model": model, "burst_length": burst_length}
+            row.update(detection_rates(generator, channel, frames, data_bits, seed=seed))
+            sink.write(f"{generator} {model} burst={burst_length}: {row['undetected']} of "
+                       f"{row['errored']} errored frames undetected ({row['undetected_rate']:.3g})")
+            rows.append(row)
+    return {"data_bits": data_bits, "rows": rows}
+
+
+def run_scenario(config, sink=None):
+    if "crc" in config:
+        return run_checksum_scenario(config, sink)
+    data = config.get("data", "11101010101")
+    generator = config.get("generator", "1011")
+    codeword = CRC_sender(data, generator)
+    received = config.get("received", codeword)
+    return {"data": data, "generator": generator, "codeword": codeword, "received": received,
+            "result": CRC_receiver(received, generator)}
+
+def run_checksum_scenario(config, sink=None):
+    # Checksum a random payload, or a stream of equal-length frames, and report throughput
+    crc = get_crc(config.get("crc", "CRC-32"))
+    if crc.fast is not None and not config.get("allow_fast", True):
+        crc = CRC(crc.width, crc.poly, crc.init, crc.reflect, crc.xorout, name=f"{crc.name} (table)")
+        crc.fast = None
+    rng = np.random.default_rng(config.get("seed"))
+    payload_bytes = int(config.get("payload_bytes", 1 << 20))
+    frames = int(config.get("frames", 0))
+
+    if frames:
+        data = rng.integers(0, 256, size=(frames, payload_bytes), dtype=np.uint8)
+        start = time.perf_counter()
+        checksums = crc.checksum_many(data)
+        result = f"{int(checksums[0]):#x}"
+        total = data.size
+    else:
+        data = rng.integers(0, 256, size=payload_bytes, dtype=np.uint8).tobytes()
+        start = time.perf_counter()
+        result = f"{crc.checksum(data):#x}"
+        total = len(data)
+    elapsed = time.perf_counter() - start
+    return {"crc": crc.name, "bytes": total, "frames": frames, "checksum": result,
+            "seconds": elapsed, "mb_per_s": total / elapsed / 1e6 if elapsed else None}
+
 def main():
     st.title("CRC (Cyclic Redundancy Check) Simulation")
 
@@ -46,5 +510,20 @@ def main():
         else:
             st.write("Please enter a received codeword.")
 
+    st.header("Byte CRC")
+    preset = st.selectbox("Polynomial", list(PRESETS))
+    text = st.text_input("Enter text to checksum", "123456789")
+    if st.button("Compute CRC"):
+        crc = PRESETS[preset]
+        st.write(f"{crc.name}: {crc.checksum(text.encode()):#0{crc.width // 4 + 2}x}")
+
+    st.header("Error Detection Benchmark")
+    generators = st.multiselect("Generators", [generator] + list(PRESETS), default=[generator, "CRC-8"])
+    model = st.selectbox("Error model", ["burst", "random", "gilbert_elliott"])
+    frames = st.number_input("Frames per generator", min_value=1000, value=100000, step=10000)
+    if st.button("Run Benchmark"):
+        result = run_detection_scenario({"generators": generators, "model": model, "frames": frames}, StreamlitSink())
+        st.table(result["rows"])
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,451 @@
+import numpy as np
+import streamlit as st
+from simulations.error_control import BatchCRC, BitErrorChannel
+from simulations.sinks import StreamlitSink, default_sink
+
+# Every codec works on batches: encode takes a (frames, data_bits) uint8 bit
+# array, decode takes the received (frames, n_bits) array and returns the
+# decoded data plus a per-frame flag for errors the decoder saw but could not fix.
+
+
+class Uncoded:
+    name = "Uncoded"
+
+    def __init__(self, data_bits):
+        self.data_bits = data_bits
+        self.n_bits = data_bits
+        self.rate = 1.0
+
+    @classmethod
+    def data_bits_for(cls, n_bits):
+        return n_bits
+
+    def encode(self, data):
+        return np.asarray(data, dtype=np.uint8).copy()
+
+    def decode(self, received):
+        received = np.asarray(received, dtype=np.uint8)
+        return received.copy(), np.zeros(len(received), dtype=bool)
+
+
+# Hamming(7,4) with the parity bits at positions 1, 2 and 4, so the syndrome
+# read as a number is the position of a single flipped bit.
+class Hamming74:
+    name = "Hamming(7,4)"
+    block_bits = 7
+    G = np.array([[1, 1, 1, 0, 0, 0, 0],
+                  [1, 0, 0, 1, 1, 0, 0],
+                  [0, 1, 0, 1, 0, 1, 0],
+                  [1, 1, 0, 1, 0, 0, 1]], dtype=np.uint8)
+    H = np.array([[(position >> row) & 1 for position in range(1, 8)] for row in range(3)], dtype=np.uint8)
+    DATA_POSITIONS = [2, 4, 5, 6]
+    FLIP = np.vstack([np.zeros(7, dtype=np.uint8), np.eye(7, dtype=np.uint8)])  # Row s flips position s
+
+    def __init__(self, data_bits):
+        self.data_bits = data_bits
+        self.blocks = -(-data_bits // 4)
+        self.n_bits = self.blocks * self.block_bits
+        self.rate = data_bits / self.n_bits
+
+    @classmethod
+    def data_bits_for(cls, n_bits):
+        return n_bits // cls.block_bits * 4
+
+    def _blocks(self, data):
+        data = np.asarray(data, dtype=np.uint8)
+        padded = np.zeros((len(data), self.blocks * 4), dtype=np.uint8)
+        padded[:, :self.data_bits] = data
+        return padded.reshape(len(data), self.blocks, 4)
+
+    def encode(self, data):
+        codewords = (self._blocks(data) @ self.G) & 1
+        return codewords.reshape(len(codewords), -1)
+
+    def _correct(self, blocks):
+        syndromes = ((blocks[..., :7] @ self.H.T) & 1) @ np.array([1, 2, 4], dtype=np.uint8)
+        return blocks[..., :7] ^ self.FLIP[syndromes], syndromes
+
+    def _data(self, blocks):
+        return blocks[..., self.DATA_POSITIONS].reshape(len(blocks), -1)[:, :self.data_bits]
+
+    def decode(self, received):
+        blocks = np.asarray(received, dtype=np.uint8).reshape(-1, self.blocks, self.block_bits)
+        corrected, _ = self._correct(blocks)
+        return self._data(corrected), np.zeros(len(blocks), dtype=bool)
+
+
+# Extended Hamming(8,4): an overall parity bit corrects single errors and
+# detects double errors in each block.
+class SECDED(Hamming74):
+    name = "SECDED(8,4)"
+    block_bits = 8
+
+    def encode(self, data):
+        codewords = (self._blocks(data) @ self.G) & 1
+        parity = np.bitwise_xor.reduce(codewords, axis=2)[..., None]
+        return np.concatenate([codewords, parity], axis=2).reshape(len(codewords), -1)
+
+    def decode(self, received):
+        blocks = np.asarray(received, dtype=np.uint8).reshape(-1, self.blocks, self.block_bits)
+        parity = np.bitwise_xor.reduce(blocks, axis=2)
+        corrected, syndromes = self._correct(blocks)
+        # A single error flips the overall parity, so two errors leave it even with a non-zero syndrome
+        double = (parity == 0) & (syndromes != 0)
+        corrected = np.where(double[..., None], blocks[..., :7], corrected)
+        return self._data(corrected), double.any(axis=1)
+
+
+# GF(256) arithmetic with the 0x11d primitive polynomial used by most Reed-Solomon codes
+GF_EXP = np.zeros(512, dtype=np.int64)
+GF_LOG = np.zeros(256, dtype=np.int64)
+_value = 1
+for _power in range(255):
+    GF_EXP[_power] = _value
+    GF_LOG[_value] = _power
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11d
+GF_EXP[255:510] = GF_EXP[:255]
+_a, _b = np.meshgrid(np.arange(256), np.arange(256), indexing="ij")
+GF_MUL = np.where((_a == 0) | (_b == 0), 0, GF_EXP[(GF_LOG[_a] + GF_LOG[_b]) % 255]).astype(np.uint8)
+GF_INV = np.zeros(256, dtype=np.uint8)
+GF_INV[1:] = GF_EXP[(255 - GF_LOG[1:]) % 255]
+
+
+# Systematic Reed-Solomon over GF(256) with generator roots alpha^0 .. alpha^(nsym-1).
+# Frames are cut into bytes and split into shortened codewords of at most 255
+# bytes; each codeword corrects up to nsym // 2 byte errors. All steps of the
+# decoder (syndromes, Berlekamp-Massey, Chien search, Forney) run across every
+# codeword with errors at once.
+class ReedSolomon:
+    name = "Reed-Solomon"
+
+    def __init__(self, data_bits, parity_symbols=16):
+        if not 2 <= parity_symbols <= 254:
+            raise ValueError("Reed-Solomon needs between 2 and 254 parity symbols")
+        self.data_bits = data_bits
+        self.nsym = parity_symbols
+        data_bytes = -(-data_bits // 8)
+        self.codewords = -(-data_bytes // (255 - parity_symbols))
+        self.k = -(-data_bytes // self.codewords)  # Data bytes per codeword
+        self.n = self.k + parity_symbols
+        self.n_bits = self.codewords * self.n * 8
+        self.rate = data_bits / self.n_bits
+        self.name = f"RS({self.n},{self.k})"
+
+        generator = np.array([1], dtype=np.uint8)  # Highest degree first
+        for root in range(parity_symbols):
+            shifted = np.append(generator, 0)
+            shifted[1:] ^= GF_MUL[generator, GF_EXP[root]]
+            generator = shifted
+        self.feedback = GF_MUL[:, generator[1:]]  # Row f: f times the generator tail
+        powers = np.arange(self.n)[::-1]  # Byte i is the coefficient of x^(n-1-i)
+        self.syndrome_powers = GF_EXP[np.outer(np.arange(parity_symbols), powers) % 255].astype(np.uint8)
+        degrees = np.arange(parity_symbols + 1)
+        self.inverse_powers = GF_EXP[(-np.outer(degrees, powers)) % 255].astype(np.uint8)
+        self.positions = GF_EXP[powers % 255].astype(np.uint8)
+
+    @classmethod
+    def data_bits_for(cls, n_bits, parity_symbols=16):
+        n_bytes = n_bits // 8
+        return (n_bytes - -(-n_bytes // 255) * parity_symbols) * 8
+
+    def _symbols(self, data):
+        data = np.asarray(data, dtype=np.uint8)
+        bits = np.zeros((len(data), self.codewords * self.k * 8), dtype=np.uint8)
+        bits[:, :self.data_bits] = data
+        return np.packbits(bits, axis=1).reshape(-1, self.k)
+
+    def encode(self, data):
+        messages = self._symbols(data)
+        remainder = np.zeros((len(messages), self.nsym), dtype=np.uint8)
+        for column in messages.T:
+            feedback = column ^ remainder[:, 0]
+            remainder[:, :-1] = remainder[:, 1:]
+            remainder[:, -1] = 0
+            remainder ^= self.feedback[feedback]
+        codewords = np.concatenate([messages, remainder], axis=1)
+        return np.unpackbits(codewords.reshape(len(data), -1), axis=1)
+
+    def decode(self, received):
+        received = np.asarray(received, dtype=np.uint8)
+        frames = len(received)
+        symbols = np.packbits(received, axis=1).reshape(-1, self.n)
+        syndromes = np.stack([np.bitwise_xor.reduce(GF_MUL[symbols, row], axis=1)
+                              for row in self.syndrome_powers], axis=1)
+        bad = np.flatnonzero(syndromes.any(axis=1))
+        failed = np.zeros(len(symbols), dtype=bool)
+        if len(bad):
+            corrected, ok = self._correct(symbols[bad], syndromes[bad])
+            symbols = symbols.copy()
+            symbols[bad] = corrected
+            failed[bad] = ~ok
+        data = np.unpackbits(symbols[:, :self.k].reshape(frames, -1), axis=1)[:, :self.data_bits]
+        return data, failed.reshape(frames, self.codewords).any(axis=1)
+
+    def _correct(self, symbols, syndromes):
+        rows = len(symbols)
+        nsym = self.nsym
+        locator = self._berlekamp_massey(syndromes)
+
+        # Chien search: the locator vanishes at X^-1 for every error location X
+        values = np.zeros((rows, self.n), dtype=np.uint8)
+        for degree in range(nsym + 1):
+            values ^= GF_MUL[locator[:, degree, None], self.inverse_powers[degree]]
+        roots = values == 0
+        order = np.max(np.where(locator != 0, np.arange(nsym + 1), 0), axis=1)
+        ok = (roots.sum(axis=1) == order) & (2 * order <= nsym)
+
+        # Forney: magnitude = X * omega(X^-1) / locator'(X^-1), omega = S(x) locator(x) mod x^nsym
+        omega = np.zeros((rows, nsym), dtype=np.uint8)
+        for i in range(nsym):
+            omega[:, i:] ^= GF_MUL[locator[:, i, None], syndromes[:, :nsym - i]]
+        omega_values = np.zeros((rows, self.n), dtype=np.uint8)
+        for degree in range(nsym):
+            omega_values ^= GF_MUL[omega[:, degree, None], self.inverse_powers[degree]]
+        derivative_values = np.zeros((rows, self.n), dtype=np.uint8)
+        for degree in range(1, nsym + 1, 2):
+            derivative_values ^= GF_MUL[locator[:, degree, None], self.inverse_powers[degree - 1]]
+        magnitudes = GF_MUL[self.positions, GF_MUL[omega_values, GF_INV[derivative_values]]]
+        fix = roots & ok[:, None]
+        return np.where(fix, symbols ^ magnitudes, symbols), ok
+
+    def _berlekamp_massey(self, syndromes):
+        rows = len(syndromes)
+        size = self.nsym + 1
+        locator = np.zeros((rows, size), dtype=np.uint8)
+        locator[:, 0] = 1
+        previous = locator.copy()
+        length = np.zeros(rows, dtype=np.int64)
+        gap = np.ones(rows, dtype=np.int64)
+        last = np.ones(rows, dtype=np.uint8)  # Discrepancy when previous was saved
+        index = np.arange(size)
+        for step in range(self.nsym):
+            discrepancy = syndromes[:, step].copy()
+            for i in range(1, step + 1):
+                discrepancy ^= GF_MUL[locator[:, i], syndromes[:, step - i]]
+            nonzero = discrepancy != 0
+            scale = GF_MUL[discrepancy, GF_INV[last]]
+            source = index - gap[:, None]
+            shifted = np.where(source >= 0, np.take_along_axis(previous, np.maximum(source, 0), axis=1), 0)
+            updated = locator ^ GF_MUL[scale[:, None], shifted]
+            grow = nonzero & (2 * length <= step)
+            previous = np.where(grow[:, None], locator, previous)
+            length = np.where(grow, step + 1 - length, length)
+            last = np.where(grow, discrepancy, last)
+            locator = np.where(nonzero[:, None], updated, locator)
+            gap = np.where(grow, 1, gap + 1)
+        return locator
+
+
+# Rate 1/len(generators) convolutional code, terminated with constraint_length - 1
+# zero bits, decoded by hard-decision Viterbi over all frames of a batch at once.
+# Generators are given in the usual octal form, (0o7, 0o5) is the K=3 textbook code.
+class Convolutional:
+    name = "Convolutional"
+    MAX_DECISIONS = 1 << 25  # Survivor memory per decoding batch, in (step, frame, state) entries
+
+    def __init__(self, data_bits, generators=(0o7, 0o5), constraint_length=3):
+        self.data_bits = data_bits
+        self.generators = list(generators)
+        self.K = constraint_length
+        self.steps = data_bits + constraint_length - 1
+        self.n_bits = self.steps * len(self.generators)
+        self.rate = data_bits / self.n_bits
+        self.name = f"Conv(K={constraint_length}, {'/'.join(format(g, 'o') for g in self.generators)})"
+
+        states = 1 << (constraint_length - 1)
+        self.states = states
+        next_states = np.arange(states)
+        self.low_mask = (1 << (constraint_length - 2)) - 1
+        # The two states that lead to each state, and the output bits on those branches
+        predecessors = np.stack([((next_states & self.low_mask) << 1) | bit for bit in (0, 1)], axis=1)
+        inputs = next_states >> (constraint_length - 2)
+        registers = (inputs[:, None] << (constraint_length - 1)) | predecessors
+        expected = np.stack([self._parity(registers & g) for g in self.generators], axis=2)
+        # Hamming distance of every received symbol to every branch: branch[bit][state, symbol]
+        symbols = np.arange(1 << len(self.generators))
+        symbol_bits = (symbols[:, None] >> np.arange(len(self.generators) - 1, -1, -1)) & 1
+        distances = (symbol_bits[:, None, None, :] ^ expected[None]).sum(axis=3).astype(np.int32)
+        self.branch = [np.ascontiguousarray(distances[:, :, bit].T) for bit in (0, 1)]
+
+    @classmethod
+    def data_bits_for(cls, n_bits, generators=(0o7, 0o5), constraint_length=3):
+        return n_bits // len(generators) - (constraint_length - 1)
+
+    @staticmethod
+    def _parity(values):
+        values = np.asarray(values).copy()
+        parity = np.zeros_like(values)
+        while values.any():
+            parity ^= values & 1
+            values >>= 1
+        return parity
+
+    def encode(self, data):
+        data = np.asarray(data, dtype=np.uint8)
+        inputs = np.zeros((len(data), self.steps), dtype=np.uint8)
+        inputs[:, :self.data_bits] = data
+        outputs = np.zeros((len(data), self.steps, len(self.generators)), dtype=np.uint8)
+        for index, generator in enumerate(self.generators):
+            for delay in range(self.K):
+                if (generator >> (self.K - 1 - delay)) & 1:
+                    outputs[:, delay:, index] ^= inputs[:, :self.steps - delay]
+        return outputs.reshape(len(data), -1)
+
+    def decode(self, received):
+        received = np.asarray(received, dtype=np.uint8)
+        batch = max(1, self.MAX_DECISIONS // (self.steps * self.states))
+        data = np.empty((len(received), self.data_bits), dtype=np.uint8)
+        for start in range(0, len(received), batch):
+            data[start:start + batch] = self._viterbi(received[start:start + batch])
+        return data, np.zeros(len(received), dtype=bool)
+
+    def _viterbi(self, received):
+        # Path metrics are kept state-major, (states, frames), so each step works on contiguous rows
+        frames = len(received)
+        outputs = len(self.generators)
+        symbols = received.reshape(frames, self.steps, outputs)
+        received_index = np.ascontiguousarray((symbols << np.arange(outputs - 1, -1, -1)).sum(axis=2).T)
+        half = self.states // 2
+        metrics = np.full((self.states, frames), 1 << 20, dtype=np.int32)
+        metrics[0] = 0
+        decisions = np.empty((self.steps, self.states, frames), dtype=bool)
+        for step in range(self.steps):
+            symbol = received_index[step]
+            # Both predecessors of state s are in the pair 2 * (s & low_mask) + {0, 1}
+            pairs = metrics.reshape(half, 2, frames)
+            zero = (pairs[:, 0] + self.branch[0][:, symbol].reshape(2, half, frames)).reshape(self.states, frames)
+            one = (pairs[:, 1] + self.branch[1][:, symbol].reshape(2, half, frames)).reshape(self.states, frames)
+            np.less(one, zero, out=decisions[step])
+            metrics = np.minimum(zero, one)
+
+        # Trace back from the all-zero state the tail bits leave the encoder in
+        state = np.zeros(frames, dtype=np.int64)
+        rows = np.arange(frames)
+        bits = np.empty((frames, self.steps), dtype=np.uint8)
+        for step in range(self.steps - 1, -1, -1):
+            bits[:, step] = state >> (self.K - 2)
+            state = ((state & self.low_mask) << 1) | decisions[step, state, rows]
+        return bits[:, :self.data_bits]
+
+
+CODES = {"none": Uncoded, "hamming": Hamming74, "secded": SECDED, "reed_solomon": ReedSolomon,
+         "convolutional": Convolutional}
+
+
+def make_codec(scheme, data_bits, **options):
+    if scheme not in CODES:
+        raise ValueError(f"Unknown code '{scheme}', expected one of: {', '.join(CODES)}")
+    return CODES[scheme](data_bits, **options)
+
+
+# String interface matching CRC_sender/CRC_receiver. The codes pad the data out
+# to whole blocks; pass the sent data length as data_bits to decode just that.
+def FEC_sender(data, scheme="hamming", **options):
+    bits = np.array([[int(bit) for bit in data]], dtype=np.uint8)
+    codeword = make_codec(scheme, len(data), **options).encode(bits)[0]
+    return ''.join(map(str, codeword))
+
+def FEC_receiver(code, scheme="hamming", data_bits=None, **options):
+    bits = np.array([[int(bit) for bit in code]], dtype=np.uint8)
+    if data_bits is None:
+        data_bits = CODES[scheme].data_bits_for(len(code), **options)
+    codec = make_codec(scheme, data_bits, **options)
+    if codec.n_bits != len(code):
+        raise ValueError(f"A {codec.name} codeword for {data_bits} data bits has {codec.n_bits} bits, got {len(code)}")
+    data, failed = codec.decode(bits)
+    if failed[0]:
+        message = "Uncorrectable error in data"
+    elif (codec.encode(data) != bits).any():
+        message = "Errors corrected"
+    else:
+        message = "The data has no error"
+    return ''.join(map(str, data[0])), message
+
+
+def arq_goodput(delivered, frames, rate, window=1):
+    # Each failed transmission costs one frame time with Selective Repeat and a
+    # whole window of frames with Go-Back-N, which discards everything in flight.
+    failures = frames - delivered
+    slots = delivered + failures * window
+    return rate * delivered / slots if slots else 0.0
+
+
+def compare_goodput(schemes, channel, frames=100000, data_bits=1024, window=8, batch_size=8192,
+                    seed=None, options=None):
+    # Every frame carries a CRC-32 so the receiver can ask for a retransmission
+    # when the decoder leaves errors behind (type I hybrid ARQ).
+    crc = BatchCRC("CRC-32", data_bits)
+    rng = np.random.default_rng(seed)
+    rows = []
+    for scheme in schemes:
+        codec = make_codec(scheme, crc.n_bits, **(options or {}).get(scheme, {}))
+        accepted = correct = undetected = 0
+        for start in range(0, frames, batch_size):
+            count = min(batch_size, frames - start)
+            protected = crc.encode(rng.integers(0, 2, size=(count, data_bits), dtype=np.uint8))
+            decoded, failed = codec.decode(channel.transmit(codec.encode(protected)))
+            passed = ~failed & crc.check(decoded)
+            right = (decoded == protected).all(axis=1)
+            accepted += int(passed.sum())
+            correct += int(right.sum())
+            undetected += int((passed & ~right).sum())
+        rate = data_bits / codec.n_bits
+        rows.append({"code": codec.name, "code_rate": rate, "frames": frames,
+                     "frame_error_rate": 1 - accepted / frames, "undetected": undetected,
+                     "goodput_fec_only": rate * correct / frames,
+                     "goodput_selective_repeat": arq_goodput(accepted, frames, rate),
+                     "goodput_go_back_n": arq_goodput(accepted, frames, rate, window)})
+    return rows
+
+
+def run_goodput_scenario(config, sink=None):
+    sink = default_sink(sink)
+    channel_options = {key: config[key] for key in ("ber", "burst_length", "p_good_bad", "p_bad_good",
+                                                     "ber_good", "ber_bad") if key in config}
+    channel = BitErrorChannel(config.get("model", "random"), seed=config.get("seed"), **channel_options)
+    rows = compare_goodput(config.get("schemes", list(CODES)), channel, int(config.get("frames", 100000)),
+                           int(config.get("data_bits", 1024)), int(config.get("window", 8)),
+                           seed=config.get("seed"), options=config.get("options"))
+    for row in rows:
+        sink.write(f"{row['code']}: rate {row['code_rate']:.3f}, frame errors {row['frame_error_rate']:.3g}, "
+                   f"goodput SR {row['goodput_selective_repeat']:.3f}, GBN {row['goodput_go_back_n']:.3f}")
+    return {"rows": rows}
+
+
+def main():
+    st.title("Forward Error Correction")
+
+    st.sidebar.header("Input Parameters")
+    scheme = st.sidebar.selectbox("Code", [name for name in CODES if name != "none"])
+    data = st.sidebar.text_input("Enter the data string", "11101010101")
+
+    if st.sidebar.button("Encode"):
+        st.write(f"Codeword: {FEC_sender(data, scheme)}")
+
+    received_code = st.text_input("Enter the received codeword to decode")
+    if st.button("Decode"):
+        if received_code:
+            # Trim the block padding back to the length of the data that was encoded
+            try:
+                decoded, message = FEC_receiver(received_code, scheme, len(data) or None)
+            except ValueError as error:
+                st.write(str(error))
+            else:
+                st.write(f"Decoded data: {decoded}")
+                st.write(message)
+        else:
+            st.write("Please enter a received codeword.")
+
+    st.header("FEC vs ARQ Goodput")
+    model = st.selectbox("Error model", ["random", "gilbert_elliott", "burst"])
+    ber = st.number_input("Bit error rate", min_value=0.0, max_value=0.5, value=0.001, format="%.5f")
+    frames = st.number_input("Frames", min_value=1000, value=20000, step=1000)
+    window = st.slider("Go-Back-N window", min_value=1, max_value=64, value=8)
+    if st.button("Compare"):
+        result = run_goodput_scenario({"model": model, "ber": ber, "frames": frames, "window": window}, StreamlitSink())
+        st.table(result["rows"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import socket
+import struct
+from simulations.routetable import ip_to_int
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_ARP = 0x0806
+PROTOCOL_TCP = 6
+PROTOCOL_UDP = 17
+BROADCAST_MAC = 0xffffffffffff
+
+# TCP flags
+FIN, SYN, RST, PSH, ACK = 0x01, 0x02, 0x04, 0x08, 0x10
+
+ETHERNET_HEADER = struct.Struct("!6s6sH")
+IPV4_HEADER = struct.Struct("!BBHHHBBH4s4s")
+TCP_HEADER = struct.Struct("!HHIIBBHHH")
+UDP_HEADER = struct.Struct("!HHHH")
+
+
+def mac_to_int(mac):
+    if isinstance(mac, int):
+        return mac
+    try:
+        value = int(mac.replace(":", "").replace("-", "").replace(".", ""), 16)
+    except ValueError:
+        raise ValueError(f"Invalid MAC address '{mac}'") from None
+    if value >> 48:
+        raise ValueError(f"MAC address '{mac}' is longer than 48 bits")
+    return value
+
+
+def int_to_mac(value):
+    return ":".join(f"{value >> shift & 0xff:02x}" for shift in range(40, -8, -8))
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(struct.pack("!I", value))
+
+
+def payload_size(payload):
+    if payload is None:
+        return 0
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return len(payload)
+    if isinstance(payload, (Ethernet, IPv4, TCP, UDP)):
+        return payload.size
+    return len(str(payload).encode())
+
+
+def pack_payload(payload):
+    if payload is None:
+        return b""
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return bytes(payload)
+    if isinstance(payload, (Ethernet, IPv4, TCP, UDP)):
+        return payload.pack()
+    return str(payload).encode()
+
+
+def internet_checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+
+# Protocol headers shared by the simulations. Addresses are plain integers
+# (48-bit MACs, 32-bit IPv4), each header carries the next one, raw bytes or
+# any other object as its payload, and pack()/unpack() convert to and from
+# wire format. A sent header is shared by everything that receives it (a hub
+# hands the same frame to every port), so it must not be modified afterwards.
+class Ethernet:
+    __slots__ = ("destination", "source", "ethertype", "payload")
+    header_size = ETHERNET_HEADER.size
+
+    def __init__(self, destination, source, payload=None, ethertype=ETHERTYPE_IPV4):
+        self.destination = destination
+        self.source = source
+        self.ethertype = ethertype
+        self.payload = payload
+
+    @property
+    def size(self):
+        return self.header_size + payload_size(self.payload)
+
+    def pack(self):
+        return ETHERNET_HEADER.pack(self.destination.to_bytes(6, "big"), self.source.to_bytes(6, "big"),
+                                    self.ethertype) + pack_payload(self.payload)
+
+    @classmethod
+    def unpack(cls, data):
+        destination, source, ethertype = ETHERNET_HEADER.unpack_from(data)
+        payload = bytes(data[cls.header_size:])
+        if ethertype == ETHERTYPE_IPV4:
+            payload = IPv4.unpack(payload)
+        return cls(int.from_bytes(destination, "big"), int.from_bytes(source, "big"), payload, ethertype)
+
+    def __repr__(self):
+        return f"Ethernet({int_to_mac(self.source)} -> {int_to_mac(self.destination)}, {self.payload!r})"
+
+
+class IPv4:
+    __slots__ = ("source", "destination", "protocol", "ttl", "identification", "tos", "payload")
+    header_size = IPV4_HEADER.size
+
+    def __init__(self, source, destination, payload=None, protocol=PROTOCOL_TCP, ttl=64, identification=0, tos=0):
+        self.source = source
+        self.destination = destination
+        self.protocol = protocol
+        self.ttl = ttl
+        self.identification = identification
+        self.tos = tos
+        self.payload = payload
+
+    @classmethod
+    def from_strings(cls, source, destination, payload=None, **fields):
+        return cls(ip_to_int(source), ip_to_int(destination), payload, **fields)
+
+    @property
+    def size(self):
+        return self.header_size + payload_size(self.payload)
+
+    def pack(self):
+        header = IPV4_HEADER.pack(0x45, self.tos, self.size, self.identification, 0, self.ttl, self.protocol, 0,
+                                  self.source.to_bytes(4, "big"), self.destination.to_bytes(4, "big"))
+        checksum = internet_checksum(header)
+        return header[:10] + checksum.to_bytes(2, "big") + header[12:] + pack_payload(self.payload)
+
+    @classmethod
+    def unpack(cls, data):
+        (version_ihl, tos, length, identification, _, ttl, protocol, checksum,
+         source, destination) = IPV4_HEADER.unpack_from(data)
+        if version_ihl >> 4 != 4:
+            raise ValueError(f"Not an IPv4 header (version {version_ihl >> 4})")
+        header_size = (version_ihl & 0xf) * 4
+        if internet_checksum(bytes(data[:header_size])) != 0:
+            raise ValueError("IPv4 header checksum mismatch")
+        payload = bytes(data[header_size:length])
+        if protocol == PROTOCOL_TCP:
+            payload = TCP.unpack(payload)
+        elif protocol == PROTOCOL_UDP:
+            payload = UDP.unpack(payload)
+        return cls(int.from_bytes(source, "big"), int.from_bytes(destination, "big"), payload, protocol, ttl,
+                   identification, tos)
+
+    def __repr__(self):
+        return f"IPv4({int_to_ip(self.source)} -> {int_to_ip(self.destination)}, {self.payload!r})"
+
+
+# Checksums are left at zero: the simulated links only corrupt what the
+# error_control models are told to
+class TCP:
+    __slots__ = ("source_port", "destination_port", "seq", "ack", "flags", "window", "payload")
+    header_size = TCP_HEADER.size
+
+    def __init__(self, source_port, destination_port, payload=None, seq=0, ack=0, flags=ACK, window=65535):
+        self.source_port = source_port
+        self.destination_port = destination_port
+        self.seq = seq
+        self.ack = ack
+        self.flags = flags
+        self.window = window
+        self.payload = payload
+
+    @property
+    def size(self):
+        return self.header_size + payload_size(self.payload)
+
+    def pack(self):
+        return TCP_HEADER.pack(self.source_port, self.destination_port, self.seq, self.ack, 5 << 4, self.flags,
+                               self.window, 0, 0) + pack_payload(self.payload)
+
+    @classmethod
+    def unpack(cls, data):
+        source_port, destination_port, seq, ack, offset, flags, window, _, _ = TCP_HEADER.unpack_from(data)
+        return cls(source_port, destination_port, bytes(data[(offset >> 4) * 4:]), seq, ack, flags, window)
+
+    def __repr__(self):
+        return f"TCP({self.source_port} -> {self.destination_port}, seq={self.seq}, ack={self.ack}, flags={self.flags:#x})"
+
+
+class UDP:
+    __slots__ = ("source_port", "destination_port", "payload")
+    header_size = UDP_HEADER.size
+
+    def __init__(self, source_port, destination_port, payload=None):
+        self.source_port = source_port
+        self.destination_port = destination_port
+        self.payload = payload
+
+    @property
+    def size(self):
+        return self.header_size + payload_size(self.payload)
+
+    def pack(self):
+        return UDP_HEADER.pack(self.source_port, self.destination_port, self.size, 0) + pack_payload(self.payload)
+
+    @classmethod
+    def unpack(cls, data):
+        source_port, destination_port, length, _ = UDP_HEADER.unpack_from(data)
+        return cls(source_port, destination_port, bytes(data[cls.header_size:length]))
+
+    def __repr__(self):
+        return f"UDP({self.source_port} -> {self.destination_port}, {self.payload!r})"
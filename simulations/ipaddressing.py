@@ -1,11 +1,18 @@
 import streamlit as st
 import ipaddress
 import random
+import time
+from collections import OrderedDict
+import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
+from simulations.engine import Scheduler
+from simulations.headers import IPv4, int_to_ip
+from simulations.routetable import RouteTable, parse_prefix
+from simulations.sinks import StreamlitSink, default_sink
 
 
-# Define the Device, ARPTable, Router, Packet, and RIP classes
+# Define the Device, ARPTable, Router, and RIP classes, packets are headers.IPv4
 class Device:
     def __init__(self, name, ip, mac, connected_router=None):
         self.name = name
@@ -14,28 +21,108 @@ class Device:
         self.connected_router = connected_router
 
 
+# ARP cache. Learned entries expire after ttl seconds and the least recently used
+# entry is evicted once capacity is reached; static entries never age out.
 class ARPTable:
-    def __init__(self):
-        self.table = {}
-
-    def add_entry(self, ip, mac):
-        self.table[ip] = mac
+    def __init__(self, capacity=None, ttl=None, scheduler=None):
+        self.table = OrderedDict()  # {ip: (mac, expiry time)}, least recently used first
+        self.static = {}
+        self.capacity = capacity
+        self.ttl = ttl
+        self.scheduler = scheduler
+        self.evictions = 0
+        self.expirations = 0
+
+    def now(self):
+        return self.scheduler.now if self.scheduler is not None else time.monotonic()
+
+    def add_entry(self, ip, mac, static=False):
+        if static:
+            self.static[ip] = mac
+            return
+        expiry = self.now() + self.ttl if self.ttl is not None else None
+        self.table[ip] = (mac, expiry)
+        self.table.move_to_end(ip)
+        if self.capacity is not None and len(self.table) > self.capacity:
+            self.table.popitem(last=False)
+            self.evictions += 1
 
     def get_mac(self, ip):
-        return self.table.get(ip, None)
+        mac = self.static.get(ip)
+        if mac is not None:
+            return mac
+        entry = self.table.get(ip)
+        if entry is None:
+            return None
+        mac, expiry = entry
+        if expiry is not None and expiry <= self.now():
+            del self.table[ip]
+            self.expirations += 1
+            return None
+        self.table.move_to_end(ip)
+        return mac
+
+    def __len__(self):
+        return len(self.static) + len(self.table)
+
+
+# A broadcast domain that answers ARP requests: whoever owns the target IP replies
+class Subnet:
+    def __init__(self, network, scheduler=None, delay=0.0005):
+        self.network = ipaddress.ip_network(network, strict=False)
+        self.hosts = {}  # {ip: mac}
+        self.scheduler = scheduler
+        self.delay = delay  # One-way delay across the segment
+        self.requests = 0
+        self.replies = 0
+
+    def attach(self, ip, mac):
+        self.hosts[ip] = mac
+
+    def arp_request(self, sender, target_ip):
+        self.requests += 1
+        mac = self.hosts.get(target_ip)
+        if mac is None:
+            return
+        self.replies += 1
+        if self.scheduler is not None:
+            self.scheduler.schedule(2 * self.delay, sender.arp_reply, target_ip, mac)
+        else:
+            sender.arp_reply(target_ip, mac)
 
 
 class Router:
-    def __init__(self, name):
+    def __init__(self, name, sink=None, scheduler=None, arp_capacity=None, arp_ttl=None):
         self.name = name
-        self.routing_table = []
-        self.arp_table = ARPTable()
+        self.sink = default_sink(sink)
+        self.scheduler = scheduler
+        self.routing_table = RouteTable()
+        self.arp_table = ARPTable(arp_capacity, arp_ttl, scheduler)
         self.interfaces = {}
+        self.subnets = []
+
+        # ARP resolution state: packets wait here until their next hop answers
+        self.pending = {}  # {next hop IP: [packets]}
+        self.arp_timers = {}
+        self.arp_timeout = 1.0
+        self.arp_retries = 3
+        self.arp_queue_limit = 3  # Packets held per unresolved address, like Linux unres_qlen
+        self.arp_requests = 0
+        self.arp_replies = 0
+        self.forwarded = 0
+        self.dropped = 0
 
     def add_interface(self, interface_name, ip):
         mac = self._generate_mac()
         self.interfaces[interface_name] = {'ip': ip, 'mac': mac}
-        self.arp_table.add_entry(ip, mac)
+        self.arp_table.add_entry(ip, mac, static=True)
+        return mac
+
+    def attach_subnet(self, subnet, interface_name=None):
+        self.subnets.append(subnet)
+        if interface_name is not None:
+            interface = self.interfaces[interface_name]
+            subnet.attach(interface['ip'], interface['mac'])
 
     def _generate_mac(self):
         return "02:00:00:%02x:%02x:%02x" % (random.randint(0, 255),
@@ -43,59 +130,429 @@ class Router:
                                             random.randint(0, 255))
 
     def add_static_route(self, network, mask, next_hop):
-        self.routing_table.append({'network': network, 'mask': mask, 'next_hop': next_hop})
+        self.routing_table.add(network, mask, next_hop)
 
     def lookup_route(self, destination_ip):
-        longest_match = None
-        best_route = None
-        for route in self.routing_table:
-            network = ipaddress.ip_network(f"{route['network']}/{route['mask']}", strict=False)
-            if ipaddress.ip_address(destination_ip) in network:
-                if longest_match is None or network.prefixlen > longest_match.prefixlen:
-                    longest_match = network
-                    best_route = route
-        return best_route
+        return self.routing_table.lookup(destination_ip)
+
+    def lookup_routes(self, destinations):
+        # Bulk lookup for a uint32 array of destinations, returns indices into next_hops (-1 = no route)
+        return self.routing_table.lookup_many(destinations)
+
+    @property
+    def next_hops(self):
+        return self.routing_table.next_hops
 
     def handle_packet(self, packet):
-        destination_ip = packet.destination_ip
-        route = self.lookup_route(destination_ip)
+        destination = packet.destination
+        route = self.lookup_route(destination)
         if route:
-            next_hop_ip = route['next_hop']
+            next_hop_ip = route['next_hop'] or int_to_ip(destination)  # Directly connected networks have no next hop
             next_hop_mac = self.arp_table.get_mac(next_hop_ip)
             if next_hop_mac:
-                st.write(f"Packet forwarded to {next_hop_mac} via next hop {next_hop_ip}")
+                self.forward(packet, next_hop_ip, next_hop_mac)
+                return next_hop_mac
+            self.resolve(next_hop_ip, packet)
+            # Without a scheduler the subnet answers straight away
+            return self.arp_table.get_mac(next_hop_ip) if self.scheduler is None else None
+        else:
+            self.sink.write(f"No route found for destination {int_to_ip(destination)}")
+            self.dropped += 1
+        return None
+
+    def forward(self, packet, next_hop_ip, next_hop_mac):
+        self.forwarded += 1
+        self.sink.write(f"Packet forwarded to {next_hop_mac} via next hop {next_hop_ip}")
+
+    def resolve(self, ip, packet):
+        pending = self.pending.get(ip)
+        if pending is not None:
+            # A request is already out, just hold the packet
+            if len(pending) < self.arp_queue_limit:
+                pending.append(packet)
             else:
-                st.write(f"Next hop MAC address not found for IP {next_hop_ip}")
+                self.dropped += 1
+            return
+        self.pending[ip] = [packet]
+        self.send_arp_request(ip, 1)
+
+    def send_arp_request(self, ip, attempt):
+        self.arp_requests += 1
+        if self.scheduler is not None:
+            self.arp_timers[ip] = self.scheduler.schedule(self.arp_timeout, self.arp_timed_out, ip, attempt)
+        for subnet in self.subnets:
+            if ipaddress.ip_address(ip) in subnet.network:
+                subnet.arp_request(self, ip)
+                break
+        if self.scheduler is None and ip in self.pending:
+            self.resolution_failed(ip)
+
+    def arp_timed_out(self, ip, attempt):
+        if ip not in self.pending:
+            return
+        if attempt < self.arp_retries:
+            self.send_arp_request(ip, attempt + 1)
         else:
-            st.write(f"No route found for destination {destination_ip}")
+            self.resolution_failed(ip)
 
+    def resolution_failed(self, ip):
+        packets = self.pending.pop(ip)
+        self.arp_timers.pop(ip, None)
+        self.dropped += len(packets)
+        self.sink.write(f"Next hop MAC address not found for IP {ip}")
 
-class Packet:
-    def __init__(self, source_ip, destination_ip):
-        self.source_ip = source_ip
-        self.destination_ip = destination_ip
+    def arp_reply(self, ip, mac):
+        self.arp_replies += 1
+        self.arp_table.add_entry(ip, mac)
+        timer = self.arp_timers.pop(ip, None)
+        if timer is not None:
+            timer.cancel()
+        for packet in self.pending.pop(ip, []):
+            self.forward(packet, ip, mac)
 
 
-class RIP:
-    def __init__(self, router):
-        self.router = router
-        self.neighbors = []
+RIP_INFINITY = 16  # Metric meaning unreachable
+RIP_ENTRIES_PER_MESSAGE = 25
 
-    def add_neighbor(self, neighbor):
-        self.neighbors.append(neighbor)
 
-    def send_update(self):
+# Distance-vector routing with hop-count metrics, split horizon with poisoned
+# reverse and triggered updates: after the first full exchange a router only
+# advertises the routes that changed since its last update.
+class RIP:
+    def __init__(self, router, poisoned_reverse=True):
+        self.router = router
+        self.neighbors = {}  # {neighbor RIP: next hop IP towards it}
+        self.routes = {}  # {(prefix, prefixlen): (metric, learned from RIP or None, network, mask)}
+        self.changed = set()
+        self.degraded = set()  # Routes that just got worse or unreachable, to ask the neighbors about
+        self.poisoned_reverse = poisoned_reverse
+        self.messages_sent = 0
+        self.entries_sent = 0
+
+    def add_neighbor(self, neighbor, next_hop):
+        self.neighbors[neighbor] = next_hop
+
+    def remove_neighbor(self, neighbor):
+        # Link failure: everything learned through the neighbor becomes unreachable
+        self.neighbors.pop(neighbor, None)
+        for key, (metric, via, network, mask) in list(self.routes.items()):
+            if via is neighbor and metric < RIP_INFINITY:
+                self.set_route(key, RIP_INFINITY, via, network, mask)
+
+    def add_network(self, network, mask):
+        # Directly connected network, advertised with the cost of one hop
+        self.set_route(parse_prefix(network, mask), 1, None, network, mask)
+
+    def set_route(self, key, metric, via, network, mask):
+        previous = self.routes.get(key)
+        self.routes[key] = (metric, via, network, mask)
+        self.changed.add(key)
+        prefix, length = key
+        if previous is not None and metric > previous[0]:
+            self.degraded.add(key)
+        if metric >= RIP_INFINITY:
+            self.router.routing_table.delete(prefix, length)
+        else:
+            next_hop = self.neighbors[via] if via is not None else None
+            self.router.routing_table.insert(prefix, length, {'network': network, 'mask': mask,
+                                                              'next_hop': next_hop, 'metric': metric})
+
+    def build_update(self, full=False):
+        keys = list(self.routes) if full else self.changed
+        self.changed = set()
+        if not keys:
+            return {}
+
+        # Build the advertisement once and only patch the entries each neighbor must not
+        # hear back (split horizon), instead of rebuilding it per neighbor
+        base = {}
+        learned = {}
+        for key in keys:
+            metric, via, network, mask = self.routes[key]
+            base[key] = (metric, network, mask)
+            if via is not None:
+                learned.setdefault(via, []).append(key)
+
+        updates = {}
         for neighbor in self.neighbors:
-            st.write(f"Sending routing update from {self.router.name} to {neighbor.name}")
-            for route in self.router.routing_table:
-                neighbor.receive_update(self.router.name, route)
+            entries = base
+            if neighbor in learned:
+                entries = dict(base)
+                for key in learned[neighbor]:
+                    if self.poisoned_reverse:
+                        _, network, mask = base[key]
+                        entries[key] = (RIP_INFINITY, network, mask)
+                    else:
+                        del entries[key]  # Plain split horizon
+            if entries:
+                self.messages_sent += -(-len(entries) // RIP_ENTRIES_PER_MESSAGE)
+                self.entries_sent += len(entries)
+                updates[neighbor] = entries
+        return updates
+
+    def advertise(self, neighbor, keys):
+        entries = {}
+        for key in keys:
+            route = self.routes.get(key)
+            if route is None:
+                continue
+            metric, via, network, mask = route
+            if via is neighbor:
+                if not self.poisoned_reverse:
+                    continue
+                metric = RIP_INFINITY
+            entries[key] = (metric, network, mask)
+        return entries
+
+    def request_routes(self):
+        # Triggered updates only carry changes, so a router whose route got worse asks its
+        # neighbors for their current routes to those destinations (a RIP request)
+        keys = self.degraded
+        self.degraded = set()
+        changed = False
+        for neighbor in self.neighbors:
+            entries = neighbor.advertise(self, keys)
+            self.messages_sent += 1
+            if entries:
+                neighbor.messages_sent += -(-len(entries) // RIP_ENTRIES_PER_MESSAGE)
+                neighbor.entries_sent += len(entries)
+                if self.receive_update(neighbor, entries):
+                    changed = True
+        return changed
+
+    def send_update(self, full=False):
+        updated = []
+        for neighbor, entries in self.build_update(full).items():
+            self.router.sink.write(f"Sending routing update from {self.router.name} to {neighbor.router.name}")
+            if neighbor.receive_update(self, entries):
+                updated.append(neighbor)
+        return updated
+
+    def receive_update(self, neighbor, entries):
+        self.router.sink.write(f"Received routing update from {neighbor.router.name}")
+        changed = False
+        routes = self.routes
+        for key, (metric, network, mask) in entries.items():
+            metric += 1
+            if metric > RIP_INFINITY:
+                metric = RIP_INFINITY
+            current = routes.get(key)
+            if current is None:
+                if metric < RIP_INFINITY:
+                    self.set_route(key, metric, neighbor, network, mask)
+                    changed = True
+            elif current[1] is neighbor:
+                # The next hop's word is final, even if the route got worse
+                if metric != current[0]:
+                    self.set_route(key, metric, neighbor, network, mask)
+                    changed = True
+            elif metric < current[0]:
+                self.set_route(key, metric, neighbor, network, mask)
+                changed = True
+        return changed
+
+
+def converge(rip_instances, full=False, max_rounds=10000):
+    # Synchronous rounds: every router with changes sends, then all updates are delivered.
+    # Stops once a round produces no new changes.
+    rip_instances = list(rip_instances)
+    messages_before = sum(rip.messages_sent for rip in rip_instances)
+    entries_before = sum(rip.entries_sent for rip in rip_instances)
+
+    senders = [rip for rip in rip_instances if full or rip.changed]
+    rounds = 0
+    converged = False
+    while rounds < max_rounds:
+        for rip in rip_instances:
+            if rip.degraded and rip.request_routes() and rip not in senders:
+                senders.append(rip)
+        updates = [(rip, rip.build_update(full)) for rip in senders]
+        full = False
+        if not any(per_neighbor for _, per_neighbor in updates):
+            converged = True
+            break
+        rounds += 1
+        changed = set()
+        for rip, per_neighbor in updates:
+            for neighbor, entries in per_neighbor.items():
+                if neighbor.receive_update(rip, entries):
+                    changed.add(neighbor)
+        senders = list(changed)
+
+    return {"rounds": rounds, "converged": converged,
+            "messages": sum(rip.messages_sent for rip in rip_instances) - messages_before,
+            "entries": sum(rip.entries_sent for rip in rip_instances) - entries_before}
+
+
+def lan_network(index):
+    return ipaddress.ip_network(((10 << 24) + (index << 8), 24))
+
+
+def link_network(index):
+    return ipaddress.ip_network(((100 << 24) + (64 << 16) + (index << 2), 30))
+
+
+def line_topology(num_routers, sink=None):
+    # R0 - R1 - ... - Rn-1, each router with its own /24 LAN and static routes to every other LAN
+    routers = [Router(f"R{i}", sink) for i in range(num_routers)]
+    links = [link_network(i) for i in range(num_routers)]
+    for i in range(num_routers - 1):
+        left, right = links[i][1], links[i][2]
+        routers[i].add_interface(f"R{i}-eth1", str(left))
+        routers[i + 1].add_interface(f"R{i + 1}-eth0", str(right))
+        routers[i].arp_table.add_entry(str(right), routers[i + 1].interfaces[f"R{i + 1}-eth0"]['mac'])
+        routers[i + 1].arp_table.add_entry(str(left), routers[i].interfaces[f"R{i}-eth1"]['mac'])
+
+    for i, router in enumerate(routers):
+        for j in range(num_routers):
+            if j == i:
+                continue
+            next_hop = links[i][2] if j > i else links[i - 1][1]
+            lan = lan_network(j)
+            router.add_static_route(str(lan.network_address), str(lan.prefixlen), str(next_hop))
+    return {router.name: router for router in routers}
+
+
+def rip_topology(num_routers, topology="random", degree=4, seed=None, advertise_links=True, sink=None):
+    if topology == "line":
+        graph = nx.path_graph(num_routers)
+    elif topology == "grid":
+        side = max(1, round(num_routers ** 0.5))
+        graph = nx.convert_node_labels_to_integers(nx.grid_2d_graph(side, -(-num_routers // side)))
+    else:
+        graph = nx.connected_watts_strogatz_graph(num_routers, degree, 0.1, seed=seed)
+
+    routers = [Router(f"R{i}", sink) for i in graph.nodes]
+    rips = [RIP(router) for router in routers]
+    for i, rip in enumerate(rips):
+        lan = lan_network(i)
+        rip.add_network(str(lan.network_address), str(lan.prefixlen))
+
+    for index, (a, b) in enumerate(graph.edges):
+        link = link_network(index)
+        ip_a, ip_b = str(link[1]), str(link[2])
+        routers[a].add_interface(f"R{a}-eth{index}", ip_a)
+        routers[b].add_interface(f"R{b}-eth{index}", ip_b)
+        rips[a].add_neighbor(rips[b], ip_b)
+        rips[b].add_neighbor(rips[a], ip_a)
+        if advertise_links:
+            rips[a].add_network(str(link.network_address), str(link.prefixlen))
+            rips[b].add_network(str(link.network_address), str(link.prefixlen))
+    return graph, rips
+
+
+def run_rip_scenario(config, sink=None):
+    num_routers = config.get("num_routers", 50)
+    graph, rips = rip_topology(num_routers, config.get("topology", "random"), config.get("degree", 4),
+                               config.get("topology_seed"), config.get("advertise_links", True), sink)
+
+    start = time.perf_counter()
+    result = converge(rips, full=True)
+    result["time"] = time.perf_counter() - start
+    result["routers"] = num_routers
+    result["routes_per_router"] = sum(len(rip.router.routing_table) for rip in rips) / num_routers
+
+    # Fail some links and measure how long the triggered updates take to settle
+    failures = config.get("fail_links", 0)
+    if failures:
+        for a, b in random.sample(list(graph.edges), failures):
+            rips[a].remove_neighbor(rips[b])
+            rips[b].remove_neighbor(rips[a])
+        start = time.perf_counter()
+        result["reconvergence"] = converge(rips)
+        result["reconvergence"]["time"] = time.perf_counter() - start
+    return result
+
+
+def run_scenario(config, sink=None):
+    if "num_routers" in config:
+        return run_topology_scenario(config, sink)
+
+    routers = {}
+    for name, spec in config.get("routers", {}).items():
+        router = Router(name, sink)
+        for interface_name, ip in spec.get("interfaces", {}).items():
+            router.add_interface(interface_name, ip)
+        for network, mask, next_hop in spec.get("routes", []):
+            router.add_static_route(network, mask, next_hop)
+        for ip, mac in spec.get("arp", {}).items():
+            router.arp_table.add_entry(ip, mac)
+        routers[name] = router
+
+    forwarded = []
+    for spec in config.get("packets", []):
+        packet = IPv4.from_strings(spec["source"], spec["destination"])
+        forwarded.append({"router": spec["router"], "destination": spec["destination"],
+                          "next_hop_mac": routers[spec["router"]].handle_packet(packet)})
+    return {"packets": forwarded}
+
+
+def run_topology_scenario(config, sink=None):
+    num_routers = config["num_routers"]
+    routers = list(line_topology(num_routers, sink).values())
+
+    packets = []
+    for _ in range(config.get("num_packets", 1000)):
+        lan = lan_network(random.randrange(num_routers))
+        packets.append((random.choice(routers), IPv4(0, int(lan[random.randint(1, 254)]))))
+
+    if config.get("batch"):
+        # Replay the whole trace through one router with a single vectorized lookup
+        router = routers[0]
+        destinations = np.array([packet.destination for _, packet in packets], dtype=np.uint32)
+        router.lookup_routes(destinations[:1])  # Build the lookup table outside the timing
+        start = time.perf_counter()
+        forwarded = int((router.lookup_routes(destinations) >= 0).sum())
+    else:
+        start = time.perf_counter()
+        forwarded = sum(1 for router, packet in packets if router.handle_packet(packet))
+    elapsed = time.perf_counter() - start
+    return {"routers": num_routers, "routes_per_router": num_routers - 1, "packets": len(packets),
+            "forwarded": forwarded, "lookups_per_second": len(packets) / elapsed if elapsed else 0.0}
+
+
+def run_arp_scenario(config, sink=None):
+    # One router in front of a large subnet, forwarding a skewed traffic mix to its hosts
+    num_hosts = config.get("num_hosts", 20000)
+    num_packets = config.get("num_packets", 100000)
+    rate = config.get("rate", 10000.0)  # Packets per second
+    skew = config.get("skew", 3.0)  # Higher values concentrate traffic on fewer hosts
+    missing = config.get("missing_fraction", 0.01)  # Share of packets to addresses nobody owns
+
+    scheduler = Scheduler()
+    router = Router("R0", sink, scheduler, config.get("arp_capacity", 1024), config.get("arp_ttl", 60.0))
+    network = ipaddress.ip_network(config.get("network", "10.0.0.0/8"))
+    subnet = Subnet(network, scheduler)
+    router.add_interface("R0-eth0", str(network[1]))
+    router.attach_subnet(subnet, "R0-eth0")
+    router.add_static_route(str(network.network_address), str(network.prefixlen), None)
+
+    base = int(network.network_address) + 2
+    for i in range(num_hosts):
+        address = base + i
+        subnet.attach(str(ipaddress.IPv4Address(address)), "02:00:%02x:%02x:%02x:%02x" % tuple(address.to_bytes(4, "big")))
+
+    source = int(network[1])
+    max_cache = 0
+
+    def send():
+        nonlocal max_cache
+        if random.random() < missing:
+            destination = base + num_hosts + random.randrange(1000)
+        else:
+            destination = base + int(num_hosts * random.random() ** skew)
+        router.handle_packet(IPv4(source, destination))
+        max_cache = max(max_cache, len(router.arp_table))
 
-    def receive_update(self, neighbor_name, route):
-        st.write(f"Received routing update from {neighbor_name}")
-        network = ipaddress.ip_network(f"{route['network']}/{route['mask']}", strict=False)
-        if not any(ipaddress.ip_network(f"{r['network']}/{r['mask']}", strict=False) == network for r in
-                   self.router.routing_table):
-            self.router.add_static_route(route['network'], route['mask'], route['next_hop'])
+    for i in range(num_packets):
+        scheduler.schedule_at(i / rate, send)
+    scheduler.run()
+
+    arp_frames = router.arp_requests + router.arp_replies
+    return {"packets": num_packets, "forwarded": router.forwarded, "dropped": router.dropped,
+            "arp_requests": router.arp_requests, "arp_replies": router.arp_replies,
+            "arp_frames_per_packet": arp_frames / num_packets, "max_cache_entries": max_cache,
+            "evictions": router.arp_table.evictions, "expirations": router.arp_table.expirations}
 
 
 # Main function to create the Streamlit UI
@@ -116,7 +573,7 @@ def main():
         add_router = st.form_submit_button('Add Router')
 
     if add_router and router_name:
-        st.session_state.routers[router_name] = Router(router_name)
+        st.session_state.routers[router_name] = Router(router_name, StreamlitSink())
         st.session_state.rip_instances[router_name] = RIP(st.session_state.routers[router_name])
 
     # Add device
@@ -145,16 +602,26 @@ def main():
         ip2 = str(ipaddress.ip_network(f"{network}/{mask}")[2])
         st.session_state.routers[router1].add_interface(f"{router1}-eth0", ip1)
         st.session_state.routers[router2].add_interface(f"{router2}-eth0", ip2)
+        subnet = Subnet(f"{network}/{mask}")
+        st.session_state.routers[router1].attach_subnet(subnet, f"{router1}-eth0")
+        st.session_state.routers[router2].attach_subnet(subnet, f"{router2}-eth0")
         st.session_state.routers[router1].add_static_route(network, mask, ip2)
         st.session_state.routers[router2].add_static_route(network, mask, ip1)
-        st.session_state.rip_instances[router1].add_neighbor(st.session_state.routers[router2])
-        st.session_state.rip_instances[router2].add_neighbor(st.session_state.routers[router1])
+        st.session_state.rip_instances[router1].add_neighbor(st.session_state.rip_instances[router2], ip2)
+        st.session_state.rip_instances[router2].add_neighbor(st.session_state.rip_instances[router1], ip1)
+        st.session_state.rip_instances[router1].add_network(network, mask)
+        st.session_state.rip_instances[router2].add_network(network, mask)
         st.session_state.connections.append((router1, router2))
 
+    if st.sidebar.button('Run RIP'):
+        result = converge(st.session_state.rip_instances.values())
+        st.sidebar.write(f"RIP converged in {result['rounds']} rounds using {result['messages']} messages")
+
     # Display routers and devices
     st.subheader("Routers")
     for router in st.session_state.routers.values():
         st.write(f"Router: {router.name}, Interfaces: {router.interfaces}")
+        st.write(list(router.routing_table))
 
     st.subheader("Devices")
     for device in st.session_state.devices.values():
@@ -195,7 +662,7 @@ def main():
     if transfer_data and src_device and dest_device:
         src_ip = st.session_state.devices[src_device].ip
         dest_ip = st.session_state.devices[dest_device].ip
-        packet = Packet(src_ip, dest_ip)
+        packet = IPv4.from_strings(src_ip, dest_ip)
 
         src_router = st.session_state.routers[st.session_state.devices[src_device].connected_router]
         src_router.handle_packet(packet)
@@ -1,11 +1,24 @@
+import time
 import streamlit as st
+from simulations.engine import Scheduler
+from simulations.headers import Ethernet, int_to_mac, mac_to_int
+from simulations.link import Link, frame_size
+from simulations.queues import FrameBuffer, make_queue
+from simulations.sinks import NullSink, StreamlitSink, default_sink
+
 
 class Device:
-    def __init__(self, name, mac_address):
+    def __init__(self, name, mac_address, sink=None, link=None, buffer_size=1024, buffer_policy="tail"):
         self.name = name
         self.mac_address = mac_address
-        self.buffer = []
+        self.mac = mac_to_int(mac_address)
+        self.buffer = FrameBuffer(buffer_size, buffer_policy)
         self.connected_device = None
+        self.hubs = []
+        self.sink = default_sink(sink)
+        self.link = link  # Optional Link the device's transmissions are serialized onto
+        if link is not None:
+            link.receiver = self.deliver
 
     def connect(self, other_device):
         self.connected_device = other_device
@@ -14,36 +27,208 @@ class Device:
     def send(self, data, destination):
         if self.connected_device:
             if self.connected_device.mac_address == destination:
-                packet = {"source": self.name, "destination": destination, "data": data}
-                self.connected_device.buffer.append(packet)
+                self.transmit(Ethernet(mac_to_int(destination), self.mac, data))
             else:
-                st.write(f"{self.name}: Destination MAC ({destination}) doesn't match connected device.")
+                self.sink.write(f"{self.name}: Destination MAC ({destination}) doesn't match connected device.")
+        else:
+            self.transmit(Ethernet(mac_to_int(destination), self.mac, data))
+
+    def transmit(self, packet):
+        if self.link is not None:
+            self.link.send(packet, frame_size(packet.payload))
         else:
-            packet = {"source": self.name, "destination": destination, "data": data}
-            hub2.buffer.append(packet.copy())
-            hub1.buffer.append(packet.copy())
+            self.deliver(packet)
+
+    def deliver(self, packet):
+        # Puts a frame on the medium: the dedicated peer, or every hub the device is plugged into
+        if self.connected_device:
+            self.connected_device.buffer.append(packet)
+        else:
+            for hub in self.hubs:
+                hub.receive_frames((packet,), self)
+
+    def receive_frames(self, frames, origin=None):
+        self.buffer.extend(frames)
 
     def receive(self):
         if self.buffer:
-            packet = self.buffer.pop(0)
-            st.write(f"{self.name} received data: {packet['data']} from {packet['source']}")
+            packet = self.buffer.popleft()
+            self.sink.write(f"{self.name} received data: {packet.payload} from {int_to_mac(packet.source)}")
+            return packet
 
 
+# Repeater for one collision domain. Frames arriving on a port wait in the
+# buffer until the next transmit tick, then the whole batch goes out on every
+# other port as the same shared frame objects, never copies. A port can lead
+# to another hub, so hubs chain into larger domains (as long as the chain has
+# no loops). With a scheduler the hub ticks by itself `tick` seconds after
+# the first frame of a batch arrives; otherwise transmit() is called by hand.
 class Hub:
-    def __init__(self):
+    def __init__(self, name=None, scheduler=None, tick=0.0, buffer_size=4096, buffer_policy="tail"):
+        self.name = name
         self.connected_devices = []
-        self.buffer = []
+        self.links = []  # Per port, None where the device is reached instantly
+        self.ports = {}  # Device or hub -> port number
+        self.buffer = FrameBuffer(buffer_size, buffer_policy)  # (ingress port, frame) pairs
+        self.scheduler = scheduler
+        self.tick = tick
+        self.pending = None
+        self.ticks = 0
+        self.repeated = 0
+        self.deliveries = 0
+
+    def connect(self, device, link=None, return_link=None):
+        self._add_port(device, link)
+        if isinstance(device, Hub):
+            device._add_port(self, return_link)
+        else:
+            device.hubs.append(self)
 
-    def connect(self, device):
+    def _add_port(self, device, link):
+        self.ports[device] = len(self.connected_devices)
         self.connected_devices.append(device)
+        self.links.append(link)
+        if link is not None:
+            link.receiver = lambda frame: device.receive_frames((frame,), self)
+
+    def receive_frames(self, frames, origin):
+        port = self.ports[origin]
+        self.buffer.extend([(port, frame) for frame in frames])
+        if self.scheduler is not None and self.pending is None:
+            self.pending = self.scheduler.schedule(self.tick, self.transmit)
 
     def transmit(self):
-        if self.buffer:
-            for packet in list(self.buffer):
-                for connected_device in self.connected_devices:
-                    if connected_device.mac_address != packet["source"]:
-                        connected_device.buffer.append(packet.copy())
-            self.buffer.clear()
+        self.pending = None
+        if not self.buffer:
+            return
+        batch = self.buffer.drain()
+        frames = [frame for _, frame in batch]
+        ingress = [port for port, _ in batch]
+        self.ticks += 1
+        self.repeated += len(frames)
+        senders = set(ingress)
+        sizes = None
+        for port, (device, link) in enumerate(zip(self.connected_devices, self.links)):
+            if port in senders:
+                batch = [frame for frame, origin in zip(frames, ingress) if origin != port]
+                if not batch:
+                    continue
+            else:
+                batch = frames
+            self.deliveries += len(batch)
+            if link is None:
+                device.receive_frames(batch, self)
+                continue
+            if sizes is None:
+                sizes = {id(frame): frame_size(frame.payload) for frame in frames}
+            for frame in batch:
+                link.send(frame, sizes[id(frame)])
+
+
+def run_scenario(config, sink=None):
+    # With a "link" section every device uplink and hub port gets its own Link
+    # (bandwidth, delay, mtu, queue, queue_limit, queue_options) and frames
+    # take simulated time to cross the network
+    # A "buffer" section (size, policy) bounds every device and hub buffer
+    link_config = config.get("link")
+    buffer_config = config.get("buffer", {})
+    scheduler = Scheduler()
+    links = {}
+
+    def make_link(name):
+        if link_config is None:
+            return None
+        queue = make_queue(link_config.get("queue", "droptail"), link_config.get("queue_limit", 100),
+                           **link_config.get("queue_options", {}))
+        links[name] = Link(scheduler, link_config.get("bandwidth", 10e6), link_config.get("delay", 0.0001),
+                           mtu=link_config.get("mtu", 1500), queue=queue)
+        return links[name]
+
+    device_buffer = {"buffer_size": buffer_config.get("size", 1024), "buffer_policy": buffer_config.get("policy", "tail")}
+    hub_buffer = {"buffer_size": buffer_config.get("size", 4096), "buffer_policy": buffer_config.get("policy", "tail")}
+    devices = {name: Device(name, mac, sink, make_link(name), **device_buffer)
+               for name, mac in config.get("devices", {}).items()}
+    # A hub's members can name other hubs, which chains the two
+    hubs = {hub_name: Hub(hub_name, **hub_buffer) for hub_name in config.get("hubs", {})}
+    for hub_name, members in config.get("hubs", {}).items():
+        for member in members:
+            if member in hubs:
+                hubs[hub_name].connect(hubs[member], make_link(f"{hub_name}:{member}"),
+                                       make_link(f"{member}:{hub_name}"))
+            else:
+                hubs[hub_name].connect(devices[member], make_link(f"{hub_name}:{member}"))
+    for device1, device2 in config.get("dedicated", []):
+        devices[device1].connect(devices[device2])
+
+    for send in config.get("sends", []):
+        devices[send["from"]].send(send["data"], send["to"])
+    scheduler.run()
+    # Keep ticking until frames stop moving through chained hubs
+    while any(hub.buffer for hub in hubs.values()):
+        for hub in hubs.values():
+            hub.transmit()
+        scheduler.run()
+
+    names = {device.mac: name for name, device in devices.items()}
+    received = {}
+    for name, device in devices.items():
+        received[name] = []
+        while device.buffer:
+            frame = device.receive()
+            received[name].append({"source": names.get(frame.source), "source_mac": int_to_mac(frame.source),
+                                   "destination": int_to_mac(frame.destination), "data": frame.payload})
+    result = {"received": received,
+              "buffers": {name: item.buffer.stats() for name, item in list(devices.items()) + list(hubs.items())}}
+    if links:
+        result["time"] = scheduler.now
+        result["links"] = {name: link.stats() for name, link in links.items()}
+    return result
+
+
+def run_flood_benchmark(config, sink=None):
+    # `ports` stations spread over a chain of `hubs` hubs form one collision
+    # domain. Every tick `senders` stations each put `frames_per_sender`
+    # frames on the wire and the hubs repeat them to every other station.
+    # Stations count what they got and drop it so memory stays flat.
+    ports = config.get("ports", 1000)
+    chain = config.get("hubs", 1)
+    ticks = config.get("ticks", 100)
+    senders = config.get("senders", 10)
+    frames_per_sender = config.get("frames_per_sender", 1)
+    tick = config.get("tick", 0.001)
+    scheduler = Scheduler()
+    quiet = NullSink()
+
+    hubs = [Hub(f"hub{i}", scheduler, tick) for i in range(chain)]
+    for upstream, downstream in zip(hubs, hubs[1:]):
+        upstream.connect(downstream)
+    devices = []
+    for i in range(ports):
+        device = Device(f"station{i}", f"02:00:00:00:{i >> 8 & 0xff:02x}:{i & 0xff:02x}", quiet)
+        hubs[i * chain // ports].connect(device)
+        devices.append(device)
+
+    received = 0
+    start = time.perf_counter()
+    for t in range(ticks):
+        for s in range(senders):
+            sender = devices[(t * senders + s) % ports]
+            for f in range(frames_per_sender):
+                sender.send(f"frame {t}.{s}.{f}", "ff:ff:ff:ff:ff:ff")
+        scheduler.run()
+        for device in devices:
+            received += len(device.buffer)
+            device.buffer.clear()
+    elapsed = time.perf_counter() - start
+
+    sent = ticks * senders * frames_per_sender
+    result = {"ports": ports, "hubs": chain, "frames_sent": sent, "frames_received": received,
+              "expected": sent * (ports - 1), "hub_ticks": sum(hub.ticks for hub in hubs),
+              "deliveries": sum(hub.deliveries for hub in hubs), "seconds": elapsed,
+              "deliveries_per_second": received / elapsed if elapsed else None}
+    default_sink(sink).write(f"{sent} frames flooded to {ports} ports in {elapsed:.3f}s "
+                             f"({result['deliveries_per_second']:.0f} deliveries/s)")
+    return result
 
 
 def main():
@@ -60,7 +245,7 @@ def main():
         device_name = st.text_input("Device Name")
         device_mac = st.text_input("MAC Address")
         if st.button("Add Device"):
-            devices[device_name] = Device(device_name, device_mac)
+            devices[device_name] = Device(device_name, device_mac, StreamlitSink())
             st.success(f"Device {device_name} added.")
 
     # Connect Devices to Hub
@@ -1,39 +1,125 @@
+import itertools
+import random
+import time
+from collections import OrderedDict
 import streamlit as st
+from simulations.engine import Scheduler, TimerWheel
+from simulations.headers import BROADCAST_MAC, Ethernet, int_to_mac, mac_to_int
+from simulations.sinks import NullSink, StreamlitSink, default_sink
 
+# Bounded MAC address table. Entries are kept in the order they were last
+# refreshed, so the oldest is always at the front: aging pops expired entries
+# from there and a full table evicts the least recently seen MAC.
+class CAMTable:
+    def __init__(self, capacity=8192, aging_time=300.0):
+        self.capacity = capacity
+        self.aging_time = aging_time
+        self.entries = OrderedDict()  # mac -> [port, last_seen]
+        self.learned = 0
+        self.moved = 0
+        self.aged_out = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def learn(self, mac, port, now):
+        entry = self.entries.get(mac)
+        if entry is not None:
+            if entry[0] != port:
+                entry[0] = port
+                self.moved += 1
+            entry[1] = now
+            self.entries.move_to_end(mac)
+            return
+        self.expire(now)
+        if len(self.entries) >= self.capacity:
+            self.entries.popitem(last=False)
+            self.evicted += 1
+        self.entries[mac] = [port, now]
+        self.learned += 1
+
+    def lookup(self, mac, now):
+        entry = self.entries.get(mac)
+        if entry is None:
+            return None
+        if now - entry[1] > self.aging_time:
+            del self.entries[mac]
+            self.aged_out += 1
+            return None
+        return entry[0]
+
+    def expire(self, now):
+        entries = self.entries
+        while entries:
+            mac, entry = next(iter(entries.items()))
+            if now - entry[1] <= self.aging_time:
+                break
+            del entries[mac]
+            self.aged_out += 1
+
+    def flush_port(self, port):
+        for mac in [mac for mac, entry in self.entries.items() if entry[0] == port]:
+            del self.entries[mac]
+
+    def churn(self):
+        return self.learned + self.moved + self.aged_out + self.evicted
+
+
+# Learning switch. Frames are Ethernet headers with integer MAC addresses;
+# whatever is attached to a port (a Host, or another Switch and the port it
+# arrives on) gets them through handle_frame(frame, port, now). `now` is the
+# simulation time used for MAC aging.
 class Switch:
-    def __init__(self):
-        self.mac_table = {}
-        self.forwarding_table = {}
+    def __init__(self, sink=None, cam_capacity=8192, aging_time=300.0, name=None):
+        self.sink = default_sink(sink)
+        self.name = name
+        self.cam = CAMTable(cam_capacity, aging_time)
         self.active_ports = set()
+        self.attached = {}  # port -> (device, port on the device)
         self.root_bridge = None
         self.root_port = None
+        self.frames = 0
+        self.forwarded = 0
+        self.flooded = 0
+        self.filtered = 0
 
-    def update_mac_table(self, mac_address, port):
-        self.mac_table[mac_address] = port
+    @property
+    def mac_table(self):
+        return {int_to_mac(mac): entry[0] for mac, entry in self.cam.entries.items()}
 
-    def update_forwarding_table(self, destination_mac, port):
-        if destination_mac not in self.forwarding_table:
-            self.forwarding_table[destination_mac] = [port]
-        else:
-            if port not in self.forwarding_table[destination_mac]:
-                self.forwarding_table[destination_mac].append(port)
+    def update_mac_table(self, mac_address, port, now=0.0):
+        self.cam.learn(mac_to_int(mac_address), port, now)
 
-    def handle_frame(self, frame, in_port):
-        source_mac = frame['source_mac']
-        destination_mac = frame['destination_mac']
-        self.update_mac_table(source_mac, in_port)
+    def attach(self, port, device, device_port=None):
+        self.add_port(port)
+        self.attached[port] = (device, device_port)
 
-        if destination_mac in self.mac_table:
-            out_port = self.mac_table[destination_mac]
+    def handle_frame(self, frame, in_port, now=0.0):
+        destination_mac = frame.destination
+        self.frames += 1
+        self.cam.learn(frame.source, in_port, now)
+
+        out_port = self.cam.lookup(destination_mac, now)
+        if out_port is not None:
             if out_port != in_port:
-                st.write(f"Forwarding frame from port {in_port} to port {out_port}")
-                self.update_forwarding_table(destination_mac, out_port)
+                self.forwarded += 1
+                self.sink.write(f"Forwarding frame from port {in_port} to port {out_port}")
+                self._send(out_port, frame, now)
+            else:
+                self.filtered += 1  # The destination is on the segment the frame came from
         else:
-            st.write(f"Destination MAC {destination_mac} unknown, flooding frame to all ports")
+            self.flooded += 1
+            self.sink.write(f"Destination MAC {int_to_mac(destination_mac)} unknown, flooding frame to all ports")
             for port in self.active_ports:
                 if port != in_port:
-                    st.write(f"Forwarding frame from port {in_port} to port {port}")
-                    self.update_forwarding_table(destination_mac, port)
+                    self._send(port, frame, now)
+
+    def _send(self, port, frame, now):
+        attachment = self.attached.get(port)
+        if attachment is not None:
+            device, device_port = attachment
+            device.handle_frame(frame, device_port, now)
 
     def add_port(self, port):
         self.active_ports.add(port)
@@ -41,34 +127,625 @@ class Switch:
     def remove_port(self, port):
         if port in self.active_ports:
             self.active_ports.remove(port)
+            self.attached.pop(port, None)
+            self.cam.flush_port(port)
 
+    def counters(self):
+        return {"frames": self.frames, "forwarded": self.forwarded, "flooded": self.flooded,
+                "filtered": self.filtered, "mac_entries": len(self.cam), "learned": self.cam.learned,
+                "moved": self.cam.moved, "aged_out": self.cam.aged_out, "evicted": self.cam.evicted}
 
-class Bridge(Switch):
-    def __init__(self):
-        super().__init__()
-        self.bridge_id = None
-        self.cost_to_root = 0
-
-    def update_root_bridge(self, root_bridge_id, root_port):
-        if self.root_bridge is None:
-            self.root_bridge = root_bridge_id
-            self.root_port = root_port
+
+def connect_switches(switch_a, port_a, switch_b, port_b):
+    switch_a.attach(port_a, switch_b, port_b)
+    switch_b.attach(port_b, switch_a, port_a)
+
+
+# End station on a switch port, counts the frames addressed to it and the
+# flooded ones it has to throw away
+class Host:
+    def __init__(self, mac_address):
+        self.mac_address = mac_to_int(mac_address)
+        self.switch = None
+        self.port = None
+        self.received = 0
+        self.discarded = 0
+
+    def connect(self, switch, port):
+        self.switch = switch
+        self.port = port
+        switch.attach(port, self)
+
+    def send(self, destination_mac, data=None, now=0.0):
+        self.switch.handle_frame(Ethernet(destination_mac, self.mac_address, data), self.port, now)
+
+    def handle_frame(self, frame, port, now):
+        if frame.destination == self.mac_address or frame.destination == BROADCAST_MAC:
+            self.received += 1
         else:
-            if self.cost_to_root > root_bridge_id.cost_to_root:
-                self.root_bridge = root_bridge_id
-                self.root_port = root_port
+            self.discarded += 1
 
-    def add_port(self, port):
+
+# Port roles and states. STP walks a port through listening and learning on
+# forward-delay timers; RSTP skips listening and, on point-to-point links,
+# moves a designated port straight to forwarding once the neighbour agrees.
+ROOT, DESIGNATED, ALTERNATE, BACKUP, DISABLED = "root", "designated", "alternate", "backup", "disabled"
+DISCARDING, LISTENING, LEARNING, FORWARDING = "discarding", "listening", "learning", "forwarding"
+
+
+_bridge_numbers = itertools.count(1)
+
+
+class BPDU:
+    __slots__ = ("root", "cost", "bridge", "port", "message_age", "role", "proposal", "agreement", "tc")
+
+    def __init__(self, root, cost, bridge, port, message_age, role, proposal=False, agreement=False, tc=False):
+        self.root = root  # Bridge IDs are (priority, mac) tuples, lower wins
+        self.cost = cost
+        self.bridge = bridge
+        self.port = port
+        self.message_age = message_age  # Hops from the root
+        self.role = role
+        self.proposal = proposal
+        self.agreement = agreement
+        self.tc = tc
+
+    def vector(self):
+        return (self.root, self.cost, self.bridge, self.port)
+
+
+class BridgePort:
+    __slots__ = ("number", "cost", "edge", "enabled", "role", "state", "received", "received_age",
+                 "info_timer", "forward_timer", "proposing", "agreed")
+
+    def __init__(self, number, cost, edge=True):
+        self.number = number
+        self.cost = cost
+        self.edge = edge  # Hosts only, never receives BPDUs
+        self.enabled = True
+        self.role = None
+        self.state = DISCARDING
+        self.received = None  # Priority vector of the neighbour's last BPDU
+        self.received_age = 0
+        self.info_timer = None
+        self.forward_timer = None
+        self.proposing = False
+        self.agreed = False
+
+
+# Learning bridge running spanning tree (802.1D STP or 802.1w RSTP, `mode`).
+# Bridges exchange BPDUs over point-to-point links, elect the bridge with the
+# lowest ID as root, pick the cheapest path to it as their root port and
+# block every other redundant port, so frames never loop. Without a
+# scheduler no BPDUs are sent and every port forwards, like a plain Switch.
+class Bridge(Switch):
+    def __init__(self, sink=None, mac=None, priority=32768, scheduler=None, timers=None, mode="rstp",
+                 hello_time=2.0, max_age=20.0, forward_delay=15.0, link_delay=0.001, port_cost=20000, **options):
+        if mode not in ("stp", "rstp"):
+            raise ValueError(f"Unknown spanning tree mode '{mode}', expected 'stp' or 'rstp'")
+        super().__init__(sink, **options)
+        mac = 0x020000000000 | next(_bridge_numbers) if mac is None else mac_to_int(mac)
+        self.bridge_id = (priority, mac)
+        self.scheduler = scheduler
+        self.timers = timers
+        self.mode = mode
+        self.hello_time = hello_time
+        self.max_age = max_age
+        self.forward_delay = forward_delay
+        self.link_delay = link_delay
+        self.port_cost = port_cost
+        self.ports = {}
+        self.forwarding = set()
+        self.root_bridge = self.bridge_id
+        self.root_cost = 0
+        self.root_age = 0
+        self.hello_timer = None
+        self.tc_until = -1.0
+        self.blocked = 0
+        self.bpdus_sent = 0
+        self.bpdus_received = 0
+        self.topology_changes = 0
+        self.last_change = 0.0
+
+    @property
+    def is_root(self):
+        return self.root_bridge == self.bridge_id
+
+    def add_port(self, port, cost=None):
         super().add_port(port)
-        if self.root_bridge is None:
-            self.root_bridge = self
-            self.root_port = port
+        if port not in self.ports:
+            self.ports[port] = BridgePort(port, self.port_cost if cost is None else cost)
+            if self.scheduler is None:
+                self.ports[port].role = DESIGNATED
+                self._set_state(self.ports[port], FORWARDING)
+            elif self.hello_timer is not None:
+                self._update_roles()
+
+    def attach(self, port, device, device_port=None):
+        super().attach(port, device, device_port)
+        if isinstance(device, Bridge):
+            self.ports[port].edge = False
 
     def remove_port(self, port):
+        if port in self.ports:
+            self._disable(self.ports.pop(port))
+            self.forwarding.discard(port)
         super().remove_port(port)
-        if port == self.root_port:
-            self.root_bridge = None
-            self.root_port = None
+        if self.hello_timer is not None:
+            self._update_roles()
+
+    def start(self):
+        if self.scheduler is None:
+            raise RuntimeError("Spanning tree needs a scheduler")
+        self._update_roles()
+        self._hello()
+
+    # -- Data plane
+
+    def handle_frame(self, frame, in_port, now=0.0):
+        if frame.__class__ is BPDU:
+            self._receive(self.ports[in_port], frame)
+            return
+        port = self.ports.get(in_port)
+        state = port.state if port is not None else DISCARDING
+        if state != FORWARDING and state != LEARNING:
+            self.blocked += 1
+            return
+        self.frames += 1
+        self.cam.learn(frame.source, in_port, now)
+        if state != FORWARDING:
+            return
+        out_port = self.cam.lookup(frame.destination, now)
+        if out_port is not None:
+            if out_port == in_port:
+                self.filtered += 1
+            elif out_port in self.forwarding:
+                self.forwarded += 1
+                self._send(out_port, frame, now)
+            else:
+                self.blocked += 1
+        else:
+            self.flooded += 1
+            for port in self.forwarding:
+                if port != in_port:
+                    self._send(port, frame, now)
+
+    # -- Control plane
+
+    def _transmit(self, port, proposal=False, agreement=False):
+        attachment = self.attached.get(port.number)
+        if attachment is None or port.edge or not port.enabled:
+            return
+        device, device_port = attachment
+        bpdu = BPDU(self.root_bridge, self.root_cost, self.bridge_id, port.number,
+                    self.root_age + (0 if self.is_root else 1), port.role, proposal or port.proposing,
+                    agreement, self.scheduler.now < self.tc_until)
+        self.bpdus_sent += 1
+        self.scheduler.schedule(self.link_delay, device.handle_frame, bpdu, device_port, 0.0)
+
+    def _advertise(self):
+        for port in self.ports.values():
+            if port.role == DESIGNATED:
+                self._transmit(port)
+
+    def _hello(self):
+        # RSTP bridges all send hellos; in STP only the root does and the rest relay
+        if self.mode == "rstp" or self.is_root:
+            self._advertise()
+        self.hello_timer = self.timers.start(self.hello_time, self._hello)
+
+    def _receive(self, port, bpdu):
+        self.bpdus_received += 1
+        if not port.enabled or bpdu.message_age >= self.max_age:
+            return
+        port.edge = False
+        if bpdu.role == DESIGNATED:
+            # Only a designated port speaks for its segment, agreements and
+            # topology changes from root or alternate ports carry no path to the root
+            port.received = bpdu.vector()
+            port.received_age = bpdu.message_age
+            if port.info_timer is not None:
+                port.info_timer.cancel()
+            lifetime = 3 * self.hello_time if self.mode == "rstp" else self.max_age - bpdu.message_age
+            port.info_timer = self.timers.start(lifetime, self._info_expired, port)
+
+        changed = self._update_roles()
+        if bpdu.tc:
+            self._topology_change(port.number)
+        if (bpdu.agreement and bpdu.role != DESIGNATED and port.role == DESIGNATED and port.proposing
+                and bpdu.root == self.root_bridge):
+            port.proposing = False
+            port.agreed = True
+            self._set_state(port, FORWARDING)
+        if bpdu.proposal and bpdu.role == DESIGNATED and self.mode == "rstp":
+            if port.role == ROOT:
+                self._sync()
+                self._transmit(port, agreement=True)
+            elif port.role == ALTERNATE or port.role == BACKUP:
+                self._transmit(port, agreement=True)  # Already discarding, so in sync
+        if changed or (port.role == ROOT and self.mode == "stp"):
+            self._advertise()
+        elif port.role == DESIGNATED and bpdu.role == DESIGNATED:
+            self._transmit(port)  # Answer a neighbour with inferior information straight away
+
+    def _info_expired(self, port):
+        port.info_timer = None
+        port.received = None
+        if self._update_roles():
+            self._advertise()
+
+    def _update_roles(self):
+        best = None
+        for port in self.ports.values():
+            info = port.received
+            if info is None or not port.enabled or info[0] >= self.bridge_id:
+                continue
+            candidate = (info[0], info[1] + port.cost, info[2], info[3], port.number)
+            if best is None or candidate < best:
+                best = candidate
+        if best is None:
+            root, cost, root_port, age = self.bridge_id, 0, None, 0
+        else:
+            root, cost, root_port, age = best[0], best[1], best[4], self.ports[best[4]].received_age
+        changed = root != self.root_bridge or cost != self.root_cost or root_port != self.root_port
+        self.root_bridge, self.root_cost, self.root_port, self.root_age = root, cost, root_port, age
+        if changed:
+            self.last_change = self.scheduler.now
+
+        # Ports leave forwarding before the new root port enters it
+        for port in self.ports.values():
+            if not port.enabled:
+                role = DISABLED
+            elif port.number == root_port:
+                continue
+            elif port.received is not None and port.received < (root, cost, self.bridge_id, port.number):
+                role = BACKUP if port.received[2] == self.bridge_id else ALTERNATE
+            else:
+                role = DESIGNATED
+            self._set_role(port, role, changed)
+        if root_port is not None:
+            self._set_role(self.ports[root_port], ROOT, changed)
+        if changed and self.mode == "rstp":
+            self._sync()
+        return changed
+
+    def _set_role(self, port, role, changed):
+        if role == port.role and not changed:
+            return
+        if role != port.role:
+            port.role = role
+            self.last_change = self.scheduler.now
+        if role == DESIGNATED:
+            port.agreed = False  # What the port advertises changed, the neighbour has to agree again
+            if port.edge:
+                self._set_state(port, FORWARDING)
+            elif port.state != FORWARDING:
+                if port.forward_timer is None:
+                    self._start_forward_delay(port)
+                if self.mode == "rstp" and not port.proposing:
+                    port.proposing = True
+                    self._transmit(port)
+        elif role == ROOT:
+            port.proposing = False
+            if self.mode == "rstp":
+                self._set_state(port, FORWARDING)
+            elif port.state != FORWARDING and port.forward_timer is None:
+                self._start_forward_delay(port)
+        else:
+            port.proposing = False
+            self._set_state(port, DISCARDING)
+
+    def _sync(self):
+        # Block every designated port that has not agreed to the current
+        # information and ask its neighbour for agreement
+        for port in self.ports.values():
+            if port.role == DESIGNATED and not port.edge and not port.agreed and port.enabled:
+                if port.state == FORWARDING:
+                    self._set_state(port, DISCARDING)
+                    self._start_forward_delay(port)
+                if not port.proposing:
+                    port.proposing = True
+                    self._transmit(port)
+
+    def _start_forward_delay(self, port):
+        if port.forward_timer is not None:
+            port.forward_timer.cancel()
+        if self.mode == "stp":
+            self._set_state(port, LISTENING)
+        port.forward_timer = self.timers.start(self.forward_delay, self._forward_delay_expired, port)
+
+    def _forward_delay_expired(self, port):
+        port.forward_timer = None
+        if port.role != ROOT and port.role != DESIGNATED:
+            return
+        if port.state == LEARNING:
+            self._set_state(port, FORWARDING)
+        else:
+            self._set_state(port, LEARNING)
+            port.forward_timer = self.timers.start(self.forward_delay, self._forward_delay_expired, port)
+
+    def _set_state(self, port, state):
+        if port.state == state:
+            return
+        port.state = state
+        if state == FORWARDING:
+            if port.forward_timer is not None:
+                port.forward_timer.cancel()
+                port.forward_timer = None
+            self.forwarding.add(port.number)
+            if not port.edge:
+                self._topology_change(port.number)
+        else:
+            self.forwarding.discard(port.number)
+        if self.scheduler is not None:
+            self.last_change = self.scheduler.now
+            self.sink.write(f"Bridge {int_to_mac(self.bridge_id[1])} port {port.number}: {port.role}, {state}")
+
+    def _topology_change(self, except_port):
+        # Forget MACs learned behind other ports, they may have moved
+        for port in self.ports:
+            if port != except_port:
+                self.cam.flush_port(port)
+        now = self.scheduler.now
+        if now >= self.tc_until:
+            self.topology_changes += 1
+            self.tc_until = now + 2 * self.hello_time
+            for port in self.ports.values():
+                if port.number != except_port and (port.role == ROOT or port.role == DESIGNATED):
+                    self._transmit(port)
+
+    def _disable(self, port):
+        for timer in (port.info_timer, port.forward_timer):
+            if timer is not None:
+                timer.cancel()
+        port.info_timer = port.forward_timer = None
+        port.enabled = False
+        port.received = None
+        port.proposing = port.agreed = False
+
+    def link_down(self, port):
+        port = self.ports[port]
+        self._disable(port)
+        if self._update_roles():
+            self._advertise()
+
+    def link_up(self, port):
+        port = self.ports[port]
+        port.enabled = True
+        port.role = DISABLED
+        if self._update_roles():
+            self._advertise()
+        elif port.role == DESIGNATED:
+            self._transmit(port)
+
+    def port_roles(self):
+        return {port.number: (port.role, port.state) for port in self.ports.values()}
+
+    def counters(self):
+        counters = super().counters()
+        counters.update({"blocked": self.blocked, "bpdus_sent": self.bpdus_sent,
+                         "bpdus_received": self.bpdus_received, "topology_changes": self.topology_changes})
+        return counters
+
+
+def run_scenario(config, sink=None):
+    switch = Bridge(sink) if config.get("bridge") else Switch(sink)
+    for port in config.get("ports", []):
+        switch.add_port(port)
+    for frame in config.get("frames", []):
+        switch.handle_frame(Ethernet(mac_to_int(frame["destination_mac"]), mac_to_int(frame["source_mac"])),
+                            frame["in_port"], frame.get("time", 0.0))
+    return {"mac_table": switch.mac_table, "counters": switch.counters()}
+
+
+def spanning_tree_links(bridges):
+    # Bridge-to-bridge links forwarding at both ends, each counted once
+    links = []
+    for bridge in bridges:
+        for number, port in bridge.ports.items():
+            if port.edge or port.state != FORWARDING:
+                continue
+            peer, peer_port = bridge.attached[number]
+            if bridge.bridge_id < peer.bridge_id and peer.ports[peer_port].state == FORWARDING:
+                links.append((bridge, number, peer, peer_port))
+    return links
+
+
+def spanning_tree_status(bridges):
+    links = spanning_tree_links(bridges)
+    neighbours = {bridge: [] for bridge in bridges}
+    for bridge, _, peer, _ in links:
+        neighbours[bridge].append(peer)
+        neighbours[peer].append(bridge)
+    seen = set()
+    components = 0
+    for bridge in bridges:
+        if bridge in seen:
+            continue
+        components += 1
+        seen.add(bridge)
+        stack = [bridge]
+        while stack:
+            for peer in neighbours[stack.pop()]:
+                if peer not in seen:
+                    seen.add(peer)
+                    stack.append(peer)
+    root = min(bridge.bridge_id for bridge in bridges)
+    # A loop-free active topology is a forest, one tree per partition
+    return {"root": int_to_mac(root[1]), "agreed_root": all(bridge.root_bridge == root for bridge in bridges),
+            "forwarding_links": len(links), "partitions": components,
+            "loop_free": len(links) == len(bridges) - components}
+
+
+def fail_link(bridge, port):
+    peer, peer_port = bridge.attached[port]
+    bridge.link_down(port)
+    peer.link_down(peer_port)
+
+
+def spanning_tree_topology(config, make_bridge, rng):
+    topology = config.get("topology", "fabric")
+    links = []
+    if topology == "fabric":
+        # Core, aggregation and access tiers, every lower switch dual-homed
+        cores = [make_bridge(4096 + i) for i in range(config.get("cores", 2))]
+        aggregation = [make_bridge(8192) for _ in range(config.get("aggregation", 16))]
+        access = [make_bridge(32768) for _ in range(config.get("access", 256))]
+        links += [(a, b) for i, a in enumerate(cores) for b in cores[i + 1:]]
+        links += [(core, agg) for agg in aggregation for core in cores]
+        for switch in access:
+            links += [(agg, switch) for agg in rng.sample(aggregation, min(2, len(aggregation)))]
+        bridges = cores + aggregation + access
+    elif topology == "ring":
+        bridges = [make_bridge(32768) for _ in range(config.get("bridges", 16))]
+        links = [(bridges[i], bridges[(i + 1) % len(bridges)]) for i in range(len(bridges))]
+    elif topology == "grid":
+        rows, columns = config.get("rows", 10), config.get("columns", 10)
+        bridges = [make_bridge(32768) for _ in range(rows * columns)]
+        for r in range(rows):
+            for c in range(columns):
+                if c + 1 < columns:
+                    links.append((bridges[r * columns + c], bridges[r * columns + c + 1]))
+                if r + 1 < rows:
+                    links.append((bridges[r * columns + c], bridges[(r + 1) * columns + c]))
+    else:
+        raise ValueError(f"Unknown topology '{topology}', expected 'fabric', 'ring' or 'grid'")
+    for a, b in links:
+        port_a, port_b = len(a.ports) + 1, len(b.ports) + 1
+        a.add_port(port_a)
+        b.add_port(port_b)
+        connect_switches(a, port_a, b, port_b)
+    return bridges
+
+
+def run_spanning_tree_scenario(config, sink=None):
+    # Builds a redundant bridged network, lets STP or RSTP converge from cold,
+    # then fails random tree links and measures how long the protocol takes to
+    # settle again. A broadcast from one host after each phase shows whether
+    # the active topology is loop free (every bridge sees it exactly once).
+    sink = default_sink(sink)
+    rng = random.Random(config.get("seed"))
+    mode = config.get("mode", "rstp")
+    hello_time = config.get("hello_time", 2.0)
+    max_age = config.get("max_age", 20.0)
+    forward_delay = config.get("forward_delay", 15.0)
+    settle = config.get("settle", max_age + 3 * forward_delay if mode == "stp" else 4 * hello_time)
+    scheduler = Scheduler()
+    timers = TimerWheel(scheduler, config.get("timer_tick", 0.01))
+    quiet = NullSink()
+
+    def make_bridge(priority):
+        return Bridge(quiet, priority=priority, scheduler=scheduler, timers=timers, mode=mode,
+                      hello_time=hello_time, max_age=max_age, forward_delay=forward_delay,
+                      link_delay=config.get("link_delay", 0.001))
+
+    bridges = spanning_tree_topology(config, make_bridge, rng)
+    hosts = []
+    for i, bridge in enumerate(bridges):
+        host = Host(0x060000000000 | i)
+        host.connect(bridge, len(bridge.ports) + 1)
+        hosts.append(host)
+
+    def broadcast():
+        if not spanning_tree_status(bridges)["loop_free"]:
+            return None  # Flooding now would never stop
+        before = sum(bridge.frames for bridge in bridges)
+        rng.choice(hosts).send(BROADCAST_MAC, now=scheduler.now)
+        return sum(bridge.frames for bridge in bridges) - before
+
+    def settle_from(start):
+        scheduler.run(until=start + settle)
+        status = spanning_tree_status(bridges)
+        status["convergence_time"] = max(bridge.last_change for bridge in bridges) - start
+        status["broadcast_copies"] = broadcast()
+        return status
+
+    wall = time.perf_counter()
+    for bridge in bridges:
+        bridge.start()
+    result = {"mode": mode, "bridges": len(bridges),
+              "links": sum(1 for bridge in bridges for port in bridge.ports.values() if not port.edge) // 2,
+              "initial": settle_from(0.0), "failures": []}
+    for _ in range(config.get("failures", 3)):
+        links = spanning_tree_links(bridges)
+        if not links:
+            break
+        bridge, port, peer, _ = rng.choice(links)
+        start = scheduler.now
+        fail_link(bridge, port)
+        status = settle_from(start)
+        status["failed"] = (int_to_mac(bridge.bridge_id[1]), int_to_mac(peer.bridge_id[1]))
+        result["failures"].append(status)
+    result["bpdus"] = sum(bridge.bpdus_sent for bridge in bridges)
+    result["topology_changes"] = sum(bridge.topology_changes for bridge in bridges)
+    result["wall_seconds"] = time.perf_counter() - wall
+    sink.write(f"{mode.upper()} on {len(bridges)} bridges converged in "
+               f"{result['initial']['convergence_time']:.3f}s, reconvergence after link failures: "
+               + ", ".join(f"{status['convergence_time']:.3f}s" for status in result["failures"]))
+    return result
+
+
+def run_fabric_benchmark(config, sink=None):
+    # A core switch with `edges` edge switches below it and `hosts_per_edge`
+    # hosts on each. Random host pairs exchange `frames` frames at `rate` frames
+    # per second of simulated time; a share of them are broadcasts, and hosts
+    # occasionally move to another edge switch. CAM tables smaller than the
+    # number of MACs, or aging shorter than the gap between a host's frames,
+    # show up as floods and table churn.
+    rng = random.Random(config.get("seed"))
+    edges = config.get("edges", 16)
+    hosts_per_edge = config.get("hosts_per_edge", 128)
+    frames = config.get("frames", 1000000)
+    rate = config.get("rate", 100000.0)
+    broadcast_share = config.get("broadcast_share", 0.001)
+    move_share = config.get("move_share", 0.0001)
+    options = {"cam_capacity": config.get("cam_capacity", 8192), "aging_time": config.get("aging_time", 300.0)}
+    quiet = NullSink()
+
+    core = Switch(quiet, name="core", **options)
+    switches = [core]
+    hosts = []
+    for e in range(edges):
+        edge = Switch(quiet, name=f"edge{e}", **options)
+        connect_switches(core, e, edge, 0)
+        switches.append(edge)
+        for h in range(hosts_per_edge):
+            host = Host(0x020000000000 | e << 16 | h)
+            host.connect(edge, h + 1)
+            hosts.append(host)
+    free_ports = {edge: hosts_per_edge + 1 for edge in switches[1:]}
+
+    start = time.perf_counter()
+    moves = 0
+    for i in range(frames):
+        now = i / rate
+        source = hosts[rng.randrange(len(hosts))]
+        if rng.random() < move_share:
+            # The host reappears on another edge switch, its old entries point the wrong way until relearned
+            source.switch.remove_port(source.port)
+            edge = switches[1 + rng.randrange(edges)]
+            source.connect(edge, free_ports[edge])
+            free_ports[edge] += 1
+            moves += 1
+        if rng.random() < broadcast_share:
+            source.send(BROADCAST_MAC, now=now)
+        else:
+            source.send(hosts[rng.randrange(len(hosts))].mac_address, now=now)
+    elapsed = time.perf_counter() - start
+
+    totals = {}
+    for switch in switches:
+        for key, value in switch.counters().items():
+            totals[key] = totals.get(key, 0) + value
+    result = {"switches": len(switches), "hosts": len(hosts), "frames": frames, "moves": moves,
+              "seconds": elapsed, "frames_per_second": frames / elapsed if elapsed else None,
+              "switch_frames": totals["frames"], "flood_rate": totals["flooded"] / totals["frames"],
+              "table_churn": totals["learned"] + totals["moved"] + totals["aged_out"] + totals["evicted"],
+              "delivered": sum(host.received for host in hosts), "discarded": sum(host.discarded for host in hosts),
+              "totals": totals}
+    default_sink(sink).write(f"{frames} frames through {len(switches)} switches in {elapsed:.2f}s, "
+                             f"flood rate {result['flood_rate']:.4f}, table churn {result['table_churn']}")
+    return result
 
 
 def main():
@@ -76,8 +753,8 @@ def main():
     st.title("Layer 2")
 
     # Create switch and bridge
-    switch = Switch()
-    bridge = Bridge()
+    switch = Switch(StreamlitSink())
+    bridge = Bridge(StreamlitSink())
 
     # Add ports to switch
     st.header("Add Ports to Switch")
@@ -99,7 +776,7 @@ def main():
     destination_mac_switch = st.text_input("Destination MAC Address (Switch)")
     in_port_switch = st.number_input("Incoming Port (Switch)", min_value=1, max_value=65535, step=1)
     if st.button("Handle Frame (Switch)"):
-        frame_switch = {'source_mac': source_mac_switch, 'destination_mac': destination_mac_switch}
+        frame_switch = Ethernet(mac_to_int(destination_mac_switch), mac_to_int(source_mac_switch))
         switch.handle_frame(frame_switch, in_port_switch)
 
     # Handle frame input for bridge
@@ -108,7 +785,7 @@ def main():
     destination_mac_bridge = st.text_input("Destination MAC Address (Bridge)")
     in_port_bridge = st.number_input("Incoming Port (Bridge)", min_value=1, max_value=65535, step=1)
     if st.button("Handle Frame (Bridge)"):
-        frame_bridge = {'source_mac': source_mac_bridge, 'destination_mac': destination_mac_bridge}
+        frame_bridge = Ethernet(mac_to_int(destination_mac_bridge), mac_to_int(source_mac_bridge))
         bridge.handle_frame(frame_bridge, in_port_bridge)
 
     # Display MAC tables
@@ -119,10 +796,10 @@ def main():
     if st.button("Show MAC Table for Bridge"):
         st.write(bridge.mac_table)
 
-    # Display Forwarding tables
-    st.header("Forwarding Tables")
-    if st.button("Show Forwarding Table for Switch"):
-        st.write(switch.forwarding_table)
+    # Display forwarding counters
+    st.header("Forwarding Counters")
+    if st.button("Show Counters for Switch"):
+        st.write(switch.counters())
 
-    if st.button("Show Forwarding Table for Bridge"):
-        st.write(bridge.forwarding_table)
+    if st.button("Show Counters for Bridge"):
+        st.write(bridge.counters())
@@ -0,0 +1,79 @@
+from simulations.queues import DropTail
+
+FRAME_OVERHEAD = 18  # Ethernet header and FCS
+
+
+def frame_size(data, overhead=FRAME_OVERHEAD):
+    # Bytes a payload occupies on the wire
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return len(data) + overhead
+    return len(str(data).encode()) + overhead
+
+
+# Point-to-point link: packets wait in a queue discipline (drop-tail unless
+# another one is passed in), are serialized at `bandwidth` bits per second and
+# reach the receiver `delay` seconds after they finish transmitting. Packets
+# larger than the MTU are refused. By default a packet's `size` attribute
+# gives its length in bytes and its `flow` attribute the key flow-aware
+# queues hash on; send() can be given either explicitly instead.
+class Link:
+    def __init__(self, scheduler, bandwidth, delay, queue_limit=100, receiver=None, mtu=1500, queue=None):
+        self.scheduler = scheduler
+        self.bandwidth = bandwidth
+        self.delay = delay
+        self.mtu = mtu
+        self.receiver = receiver
+        self.queue = queue if queue is not None else DropTail(queue_limit)
+        if getattr(self.queue, "packet_time", False) is None:
+            self.queue.packet_time = mtu * 8 / bandwidth  # Lets RED age its average while idle
+        self.busy = False
+        self.sent = 0
+        self.oversized = 0
+        self.bytes_sent = 0
+        self.busy_time = 0.0
+
+    @property
+    def dropped(self):
+        return self.queue.dropped + self.oversized
+
+    def send(self, packet, size=None, flow=None):
+        if size is None:
+            size = packet.size
+        if size > self.mtu:
+            self.oversized += 1
+            return False
+        if flow is None:
+            flow = getattr(packet, "flow", None)
+        if not self.queue.enqueue(packet, size, flow, self.scheduler.now):
+            return False
+        if not self.busy:
+            self._transmit()
+        return True
+
+    def _transmit(self):
+        item = self.queue.dequeue(self.scheduler.now)
+        if item is None:
+            self.busy = False
+            return
+        self.busy = True
+        duration = item.size * 8 / self.bandwidth
+        self.busy_time += duration
+        self.scheduler.schedule(duration, self._transmitted, item)
+
+    def _transmitted(self, item):
+        self.sent += 1
+        self.bytes_sent += item.size
+        if self.receiver is not None:
+            self.scheduler.schedule(self.delay, self.receiver, item.packet)
+        self._transmit()
+
+    def utilization(self):
+        return self.busy_time / self.scheduler.now if self.scheduler.now else 0.0
+
+    def stats(self):
+        now = self.scheduler.now
+        stats = {"sent": self.sent, "bytes_sent": self.bytes_sent, "dropped": self.dropped,
+                 "oversized": self.oversized, "utilization": self.utilization(),
+                 "throughput": self.bytes_sent * 8 / now if now else 0.0}
+        stats["queue"] = self.queue.stats(now)
+        return stats
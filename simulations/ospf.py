@@ -0,0 +1,344 @@
+import heapq
+import random
+import time
+from collections import deque
+import networkx as nx
+from simulations.ipaddressing import Router, lan_network, link_network
+from simulations.routetable import parse_prefix
+
+INFINITY = float("inf")
+
+
+class LSA:
+    __slots__ = ("router_id", "sequence", "links", "networks")
+
+    def __init__(self, router_id, sequence, links, networks):
+        self.router_id = router_id
+        self.sequence = sequence
+        self.links = links  # {neighbor router id: cost}
+        self.networks = networks  # [(prefix, prefixlen, network, mask)] stub networks behind the router
+
+
+# Shortest path tree rooted at one router. compute() runs a full Dijkstra;
+# update_edge() repairs the tree after a single link changes, touching only the
+# nodes whose distance or parent can actually change.
+class ShortestPathTree:
+    def __init__(self, root, graph):
+        self.root = root
+        self.graph = graph  # {node: {neighbor: cost}}, shared with the owner and kept up to date by it
+        self.dist = {}
+        self.parent = {}
+        self.children = {}
+        self.first_hop = {}
+
+    def compute(self):
+        self.dist = {self.root: 0}
+        self.parent = {self.root: None}
+        self.children = {}
+        self.first_hop = {}
+        order = self._dijkstra([(0, self.root)])
+        self._update_first_hops(order)
+        return set(order)
+
+    def update_edge(self, u, v, old_cost, new_cost):
+        # Call after graph[u][v] was changed from old_cost to new_cost (None = no link).
+        # Returns the nodes whose distance or first hop may have changed.
+        old_cost = INFINITY if old_cost is None else old_cost
+        new_cost = INFINITY if new_cost is None else new_cost
+        dist = self.dist
+        if u not in dist:
+            return set()
+
+        if new_cost < old_cost:
+            # Cheaper or new link: only v and nodes reached through it can improve
+            candidate = dist[u] + new_cost
+            if candidate >= dist.get(v, INFINITY):
+                return set()
+            self._relax(v, candidate, u)
+            order = self._dijkstra([(candidate, v)])
+            self._update_first_hops(order)
+            return set(order)
+
+        if new_cost > old_cost and self.parent.get(v) == u:
+            # A tree link got worse or failed: re-attach v's subtree from the rest of the tree
+            affected = self._subtree(v)
+            for node in affected:
+                self._detach(node)
+                del dist[node]
+            heap = []
+            for node in affected:
+                best, via = INFINITY, None
+                for neighbor in self.graph.get(node, ()):
+                    cost = self.graph.get(neighbor, {}).get(node)
+                    if cost is not None and neighbor in dist and dist[neighbor] + cost < best:
+                        best, via = dist[neighbor] + cost, neighbor
+                if via is not None:
+                    self._relax(node, best, via)
+                    heap.append((best, node))
+            heapq.heapify(heap)
+            order = self._dijkstra(heap)
+            # Whatever could not be re-attached is now unreachable
+            for node in affected:
+                if node not in dist:
+                    self.first_hop.pop(node, None)
+            self._update_first_hops(order)
+            return affected
+
+        return set()
+
+    def _dijkstra(self, heap):
+        # Lazy Dijkstra from the nodes already on the heap; distances only ever go down
+        dist, graph = self.dist, self.graph
+        order = []
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist.get(node, INFINITY):
+                continue
+            order.append(node)
+            for neighbor, cost in graph.get(node, {}).items():
+                nd = d + cost
+                if nd < dist.get(neighbor, INFINITY):
+                    self._relax(neighbor, nd, node)
+                    heapq.heappush(heap, (nd, neighbor))
+        return order
+
+    def _relax(self, node, d, via):
+        self._detach(node)
+        self.dist[node] = d
+        self.parent[node] = via
+        self.children.setdefault(via, set()).add(node)
+
+    def _detach(self, node):
+        old_parent = self.parent.pop(node, None)
+        if old_parent is not None:
+            self.children[old_parent].discard(node)
+
+    def _subtree(self, node):
+        nodes = {node}
+        stack = [node]
+        while stack:
+            for child in self.children.get(stack.pop(), ()):
+                if child not in nodes:
+                    nodes.add(child)
+                    stack.append(child)
+        return nodes
+
+    def _update_first_hops(self, order):
+        # Nodes come out of Dijkstra in distance order, so a parent is always done before its children
+        for node in order:
+            via = self.parent.get(node)
+            if node == self.root:
+                self.first_hop[node] = None
+            elif via == self.root:
+                self.first_hop[node] = node
+            else:
+                self.first_hop[node] = self.first_hop.get(via)
+
+
+# Link-state routing: every router floods an LSA describing its links and stub
+# networks, keeps the full link-state database, and runs SPF over it to fill
+# Router.routing_table. After the first full SPF, each new LSA is applied to the
+# tree incrementally.
+class OSPF:
+    def __init__(self, router, router_id=None):
+        self.router = router
+        self.router_id = router_id or router.name
+        self.neighbors = {}  # {neighbor OSPF: [cost, next hop IP towards it]}
+        self.networks = []
+        self.sequence = 0
+        self.lsdb = {}  # {router id: LSA}
+        self.graph = {}  # Adjacency built from the LSDB
+        self.next_hops = {}  # {neighbor router id: next hop IP}
+        self.spt = None
+        self.installed = {}  # {(prefix, prefixlen): router id whose route is installed}
+        self.messages_sent = 0
+
+    def add_neighbor(self, neighbor, next_hop, cost=1):
+        self.neighbors[neighbor] = [cost, next_hop]
+        self.next_hops[neighbor.router_id] = next_hop
+
+    def remove_neighbor(self, neighbor):
+        self.neighbors.pop(neighbor, None)
+
+    def set_cost(self, neighbor, cost):
+        self.neighbors[neighbor][0] = cost
+
+    def add_network(self, network, mask):
+        prefix, length = parse_prefix(network, mask)
+        self.networks.append((prefix, length, network, mask))
+
+    def originate(self):
+        # New LSA for this router; returns the flooding messages to deliver
+        self.sequence += 1
+        links = {neighbor.router_id: cost for neighbor, (cost, _) in self.neighbors.items()}
+        lsa = LSA(self.router_id, self.sequence, links, list(self.networks))
+        self.install(lsa)
+        return [(neighbor, lsa, self) for neighbor in self.neighbors]
+
+    def receive_lsa(self, lsa, sender):
+        current = self.lsdb.get(lsa.router_id)
+        if current is not None and current.sequence >= lsa.sequence:
+            return []
+        self.install(lsa)
+        return [(neighbor, lsa, self) for neighbor in self.neighbors if neighbor is not sender]
+
+    def install(self, lsa):
+        old = self.lsdb.get(lsa.router_id)
+        self.lsdb[lsa.router_id] = lsa
+        old_links = old.links if old else {}
+        self.graph[lsa.router_id] = dict(lsa.links)
+        if self.spt is None:
+            return
+
+        # Repair worse links before trying better ones, so improvements start from valid distances
+        changes = []
+        for neighbor in set(old_links) | set(lsa.links):
+            old_cost, new_cost = old_links.get(neighbor), lsa.links.get(neighbor)
+            if old_cost != new_cost:
+                worse = old_cost is not None and (new_cost is None or new_cost > old_cost)
+                changes.append((not worse, neighbor, old_cost, new_cost))
+        changes.sort(key=lambda change: change[0])
+        changed = set()
+        for _, neighbor, old_cost, new_cost in changes:
+            changed |= self.spt.update_edge(lsa.router_id, neighbor, old_cost, new_cost)
+        if old is None or old.networks != lsa.networks:
+            if old is not None:
+                self.withdraw(old)
+            changed.add(lsa.router_id)
+        self.install_routes(changed)
+
+    def run_spf(self):
+        self.spt = ShortestPathTree(self.router_id, self.graph)
+        self.install_routes(self.spt.compute())
+
+    def install_routes(self, nodes):
+        table = self.router.routing_table
+        dist, first_hop = self.spt.dist, self.spt.first_hop
+        for node in nodes:
+            lsa = self.lsdb.get(node)
+            if lsa is None:
+                continue
+            for prefix, length, network, mask in lsa.networks:
+                key = (prefix, length)
+                if node not in dist:
+                    if self.installed.get(key) == node:
+                        table.delete(prefix, length)
+                        del self.installed[key]
+                    continue
+                owner = self.installed.get(key)
+                # The nearest router advertising a prefix wins
+                if owner is not None and owner != node and dist.get(owner, INFINITY) <= dist[node]:
+                    continue
+                hop = first_hop.get(node)
+                table.insert(prefix, length, {'network': network, 'mask': mask,
+                                              'next_hop': self.next_hops.get(hop) if hop else None,
+                                              'metric': dist[node]})
+                self.installed[key] = node
+
+    def withdraw(self, lsa):
+        for prefix, length, _, _ in lsa.networks:
+            if self.installed.get((prefix, length)) == lsa.router_id:
+                self.router.routing_table.delete(prefix, length)
+                del self.installed[(prefix, length)]
+
+
+def flood(messages):
+    # Deliver LSAs hop by hop until every router has the newest copy, returns the messages used
+    queue = deque(messages)
+    delivered = 0
+    while queue:
+        receiver, lsa, sender = queue.popleft()
+        sender.messages_sent += 1
+        delivered += 1
+        queue.extend(receiver.receive_lsa(lsa, sender))
+    return delivered
+
+
+def ospf_topology(num_routers, degree=4, seed=None, max_cost=10, sink=None):
+    rng = random.Random(seed)
+    graph = nx.connected_watts_strogatz_graph(num_routers, degree, 0.1, seed=seed)
+    routers = [Router(f"R{i}", sink) for i in graph.nodes]
+    instances = [OSPF(router) for router in routers]
+    for i, ospf in enumerate(instances):
+        lan = lan_network(i)
+        ospf.add_network(str(lan.network_address), str(lan.prefixlen))
+    for index, (a, b) in enumerate(graph.edges):
+        link = link_network(index)
+        cost = rng.randint(1, max_cost)
+        routers[a].add_interface(f"R{a}-eth{index}", str(link[1]))
+        routers[b].add_interface(f"R{b}-eth{index}", str(link[2]))
+        instances[a].add_neighbor(instances[b], str(link[2]), cost)
+        instances[b].add_neighbor(instances[a], str(link[1]), cost)
+    return graph, instances
+
+
+def run_ospf_scenario(config, sink=None):
+    num_routers = config.get("num_routers", 50)
+    graph, instances = ospf_topology(num_routers, config.get("degree", 4), config.get("topology_seed"),
+                                     config.get("max_cost", 10), sink)
+
+    messages = flood([message for ospf in instances for message in ospf.originate()])
+    start = time.perf_counter()
+    for ospf in instances:
+        ospf.run_spf()
+    result = {"routers": num_routers, "flood_messages": messages, "spf_time": time.perf_counter() - start,
+              "routes_per_router": sum(len(ospf.router.routing_table) for ospf in instances) / num_routers}
+
+    # Fail links; both ends originate new LSAs and every router repairs its tree incrementally
+    failures = config.get("fail_links", 0)
+    if failures:
+        start = time.perf_counter()
+        messages = 0
+        for a, b in random.sample(list(graph.edges), failures):
+            instances[a].remove_neighbor(instances[b])
+            instances[b].remove_neighbor(instances[a])
+            messages += flood(instances[a].originate() + instances[b].originate())
+        result["reconvergence"] = {"messages": messages, "time": time.perf_counter() - start}
+    return result
+
+
+def run_spf_benchmark(config, sink=None):
+    # Full versus incremental SPF on one router's view of a large topology
+    num_nodes = config.get("num_nodes", 10000)
+    changes = config.get("changes", 100)
+    max_cost = config.get("max_cost", 10)
+    rng = random.Random(config.get("topology_seed"))
+
+    topology = nx.connected_watts_strogatz_graph(num_nodes, config.get("degree", 4), 0.1,
+                                                 seed=config.get("topology_seed"))
+    graph = {node: {} for node in topology.nodes}
+    for a, b in topology.edges:
+        graph[a][b] = graph[b][a] = rng.randint(1, max_cost)
+
+    spt = ShortestPathTree(0, graph)
+    start = time.perf_counter()
+    spt.compute()
+    full_time = time.perf_counter() - start
+
+    edges = list(topology.edges)
+    incremental_time = 0.0
+    touched = 0
+    for _ in range(changes):
+        a, b = rng.choice(edges)
+        old = graph[a].get(b)
+        new = None if rng.random() < config.get("failure_rate", 0.2) else rng.randint(1, max_cost)
+        if old is None:
+            new = rng.randint(1, max_cost)  # Bring a failed link back
+        for u, v in ((a, b), (b, a)):
+            if new is None:
+                del graph[u][v]
+            else:
+                graph[u][v] = new
+            start = time.perf_counter()
+            touched += len(spt.update_edge(u, v, old, new))
+            incremental_time += time.perf_counter() - start
+
+    result = {"nodes": num_nodes, "changes": changes, "full_spf_time": full_time,
+              "incremental_spf_time": incremental_time / changes, "nodes_touched": touched / changes}
+    result["speedup"] = full_time / result["incremental_spf_time"] if incremental_time else None
+
+    if config.get("verify", True):
+        reference = ShortestPathTree(0, graph)
+        reference.compute()
+        result["verified"] = reference.dist == spt.dist
+    return result
@@ -0,0 +1,417 @@
+import math
+import random
+from collections import deque
+
+
+class QueuedPacket:
+    __slots__ = ("packet", "size", "flow", "enqueued")
+
+    def __init__(self, packet, size, flow, enqueued):
+        self.packet = packet
+        self.size = size  # Bytes
+        self.flow = flow  # Hashable key used by flow-aware disciplines
+        self.enqueued = enqueued
+
+
+# Base class for the queue disciplines a Link holds its backlog in. Every
+# discipline keeps the same counters: packets and bytes queued, drops split
+# into tail overflows and early (AQM) drops, the time-averaged occupancy and
+# the sojourn time of every packet that made it to the wire.
+class QueueDiscipline:
+    name = None
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.length = 0
+        self.backlog = 0  # Bytes
+        self.enqueued = 0
+        self.dequeued = 0
+        self.overflow_drops = 0
+        self.early_drops = 0
+        self.max_length = 0
+        self.area = 0.0  # Integral of length over time
+        self.last_change = 0.0
+        self.sojourn_total = 0.0
+        self.max_sojourn = 0.0
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def dropped(self):
+        return self.overflow_drops + self.early_drops
+
+    def _change(self, now, delta, size):
+        self.area += self.length * (now - self.last_change)
+        self.last_change = now
+        self.length += delta
+        self.backlog += delta * size
+
+    def _accepted(self, item, now):
+        self._change(now, 1, item.size)
+        self.enqueued += 1
+        if self.length > self.max_length:
+            self.max_length = self.length
+
+    def _released(self, item, now):
+        self._change(now, -1, item.size)
+        self.dequeued += 1
+        sojourn = now - item.enqueued
+        self.sojourn_total += sojourn
+        if sojourn > self.max_sojourn:
+            self.max_sojourn = sojourn
+
+    def _dropped_queued(self, item, now, early=True):
+        self._change(now, -1, item.size)
+        if early:
+            self.early_drops += 1
+        else:
+            self.overflow_drops += 1
+
+    def stats(self, now):
+        area = self.area + self.length * (now - self.last_change)
+        return {"discipline": self.name, "limit": self.limit, "length": self.length, "backlog": self.backlog,
+                "enqueued": self.enqueued, "dequeued": self.dequeued, "dropped": self.dropped,
+                "overflow_drops": self.overflow_drops, "early_drops": self.early_drops,
+                "max_length": self.max_length, "mean_length": area / now if now else 0.0,
+                "mean_sojourn": self.sojourn_total / self.dequeued if self.dequeued else 0.0,
+                "max_sojourn": self.max_sojourn}
+
+
+class DropTail(QueueDiscipline):
+    name = "droptail"
+
+    def __init__(self, limit=100):
+        super().__init__(limit)
+        self.queue = deque()
+
+    def enqueue(self, packet, size, flow, now):
+        if self.length >= self.limit:
+            self.overflow_drops += 1
+            return False
+        item = QueuedPacket(packet, size, flow, now)
+        self.queue.append(item)
+        self._accepted(item, now)
+        return True
+
+    def dequeue(self, now):
+        if not self.queue:
+            return None
+        item = self.queue.popleft()
+        self._released(item, now)
+        return item
+
+
+# Random Early Detection (Floyd and Jacobson): drops arrivals with a
+# probability that grows with an EWMA of the queue length between min_th and
+# max_th, spreading losses out instead of hitting every flow at once when the
+# queue fills. While the queue sits empty the average decays as if one small
+# packet per packet_time had arrived.
+class RED(QueueDiscipline):
+    name = "red"
+
+    def __init__(self, limit=100, min_th=None, max_th=None, max_p=0.1, weight=0.002, packet_time=None, seed=None):
+        super().__init__(limit)
+        self.min_th = max(1, limit // 4) if min_th is None else min_th
+        self.max_th = min(limit, 3 * self.min_th) if max_th is None else max_th
+        if self.max_th <= self.min_th:
+            raise ValueError("RED needs max_th above min_th")
+        self.max_p = max_p
+        self.weight = weight
+        self.packet_time = packet_time
+        self.rng = random.Random(seed)
+        self.queue = deque()
+        self.avg = 0.0
+        self.count = -1  # Packets accepted since the last early drop
+        self.idle_since = 0.0
+
+    def enqueue(self, packet, size, flow, now):
+        if self.length:
+            self.avg += self.weight * (self.length - self.avg)
+        elif self.packet_time:
+            self.avg *= (1 - self.weight) ** ((now - self.idle_since) / self.packet_time)
+        else:
+            self.avg *= 1 - self.weight
+
+        if self.avg >= self.max_th:
+            self.count = 0
+            self.early_drops += 1
+            return False
+        if self.avg >= self.min_th:
+            self.count += 1
+            pb = self.max_p * (self.avg - self.min_th) / (self.max_th - self.min_th)
+            # Spacing drops out uniformly rather than geometrically
+            pa = pb / (1 - self.count * pb) if self.count * pb < 1 else 1.0
+            if self.rng.random() < pa:
+                self.count = 0
+                self.early_drops += 1
+                return False
+        else:
+            self.count = -1
+        if self.length >= self.limit:
+            self.overflow_drops += 1
+            return False
+        item = QueuedPacket(packet, size, flow, now)
+        self.queue.append(item)
+        self._accepted(item, now)
+        return True
+
+    def dequeue(self, now):
+        if not self.queue:
+            return None
+        item = self.queue.popleft()
+        self._released(item, now)
+        if not self.queue:
+            self.idle_since = now
+        return item
+
+
+# One FIFO under CoDel control (RFC 8289). Packets are timestamped on the way
+# in; once every packet for a whole interval has waited longer than target,
+# CoDel drops at the head, more often the longer the delay persists
+# (interval / sqrt(count)). Used on its own by CoDel and per flow by FQ-CoDel.
+class CoDelQueue:
+    def __init__(self, target, interval, mtu):
+        self.target = target
+        self.interval = interval
+        self.mtu = mtu
+        self.queue = deque()
+        self.backlog = 0
+        self.first_above_time = 0.0
+        self.drop_next = 0.0
+        self.count = 0
+        self.lastcount = 0
+        self.dropping = False
+        self.deficit = 0  # FQ-CoDel bookkeeping
+        self.listed = False
+
+    def append(self, item):
+        self.queue.append(item)
+        self.backlog += item.size
+
+    def popleft(self):
+        item = self.queue.popleft()
+        self.backlog -= item.size
+        return item
+
+    def _dodequeue(self, now):
+        if not self.queue:
+            self.first_above_time = 0.0
+            return None, False
+        item = self.popleft()
+        if now - item.enqueued < self.target or self.backlog <= self.mtu:
+            self.first_above_time = 0.0
+            return item, False
+        if self.first_above_time == 0.0:
+            self.first_above_time = now + self.interval
+            return item, False
+        return item, now >= self.first_above_time
+
+    def _control_law(self, t):
+        return t + self.interval / math.sqrt(self.count)
+
+    def dequeue(self, now, drop):
+        item, ok_to_drop = self._dodequeue(now)
+        if item is None:
+            self.dropping = False
+            return None
+        if self.dropping:
+            if not ok_to_drop:
+                self.dropping = False
+            while self.dropping and now >= self.drop_next:
+                drop(item, now)
+                self.count += 1
+                item, ok_to_drop = self._dodequeue(now)
+                if item is None or not ok_to_drop:
+                    self.dropping = False
+                else:
+                    self.drop_next = self._control_law(self.drop_next)
+        elif ok_to_drop:
+            drop(item, now)
+            item, _ = self._dodequeue(now)
+            self.dropping = True
+            # Resume near the old drop rate if the last dropping state ended recently
+            delta = self.count - self.lastcount
+            self.count = delta if delta > 1 and now - self.drop_next < 16 * self.interval else 1
+            self.drop_next = self._control_law(now)
+            self.lastcount = self.count
+        return item
+
+
+class CoDel(QueueDiscipline):
+    name = "codel"
+
+    def __init__(self, limit=1000, target=0.005, interval=0.1, mtu=1514):
+        super().__init__(limit)
+        self.codel = CoDelQueue(target, interval, mtu)
+
+    def enqueue(self, packet, size, flow, now):
+        if self.length >= self.limit:
+            self.overflow_drops += 1
+            return False
+        item = QueuedPacket(packet, size, flow, now)
+        self.codel.append(item)
+        self._accepted(item, now)
+        return True
+
+    def dequeue(self, now):
+        item = self.codel.dequeue(now, self._dropped_queued)
+        if item is not None:
+            self._released(item, now)
+        return item
+
+
+# FQ-CoDel (RFC 8290): packets are hashed by flow into buckets, each a
+# CoDelQueue, served by deficit round robin. Buckets that just became active
+# go on new_flows and are served ahead of the old_flows list, so sparse flows
+# see almost no queueing. On overflow the head of the fattest bucket is dropped.
+class FQCoDel(QueueDiscipline):
+    name = "fq_codel"
+
+    def __init__(self, limit=10240, flows=1024, quantum=1514, target=0.005, interval=0.1, mtu=1514):
+        super().__init__(limit)
+        self.flows = flows
+        self.quantum = quantum
+        self.target = target
+        self.interval = interval
+        self.mtu = mtu
+        self.buckets = {}
+        self.new_flows = deque()
+        self.old_flows = deque()
+
+    def enqueue(self, packet, size, flow, now):
+        index = hash(flow) % self.flows
+        bucket = self.buckets.get(index)
+        if bucket is None:
+            bucket = self.buckets[index] = CoDelQueue(self.target, self.interval, self.mtu)
+        item = QueuedPacket(packet, size, flow, now)
+        bucket.append(item)
+        self._accepted(item, now)
+        if not bucket.listed:
+            bucket.listed = True
+            bucket.deficit = self.quantum
+            self.new_flows.append(bucket)
+        if self.length > self.limit:
+            fattest = max(self.buckets.values(), key=lambda candidate: candidate.backlog)
+            self._dropped_queued(fattest.popleft(), now, early=False)
+            return fattest is not bucket or bool(bucket.queue)
+        return True
+
+    def dequeue(self, now):
+        while True:
+            if self.new_flows:
+                flows = self.new_flows
+            elif self.old_flows:
+                flows = self.old_flows
+            else:
+                return None
+            bucket = flows[0]
+            if bucket.deficit <= 0:
+                bucket.deficit += self.quantum
+                flows.popleft()
+                self.old_flows.append(bucket)
+                continue
+            item = bucket.dequeue(now, self._dropped_queued)
+            if item is None:
+                flows.popleft()
+                # An emptied new flow takes one more turn at the back of the old list
+                if flows is self.new_flows:
+                    self.old_flows.append(bucket)
+                else:
+                    bucket.listed = False
+                continue
+            bucket.deficit -= item.size
+            self._released(item, now)
+            return item
+
+
+# Bounded FIFO for device and hub receive buffers. When full it either
+# refuses the new frame (tail drop) or throws away its oldest one to make room
+# (head drop), so memory stays capped however far the reader falls behind.
+class FrameBuffer:
+    def __init__(self, capacity=1024, policy="tail"):
+        if policy not in ("tail", "head"):
+            raise ValueError(f"Unknown drop policy '{policy}', expected 'tail' or 'head'")
+        if capacity < 1:
+            raise ValueError("A frame buffer needs room for at least one frame")
+        self.capacity = capacity
+        self.policy = policy
+        # A head-drop deque evicts its oldest entry by itself when it overflows
+        self.items = deque(maxlen=capacity if policy == "head" else None)
+        self.enqueued = 0
+        self.dequeued = 0
+        self.tail_drops = 0
+        self.head_drops = 0
+        self.max_length = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    @property
+    def dropped(self):
+        return self.tail_drops + self.head_drops
+
+    def full(self):
+        return len(self.items) >= self.capacity
+
+    def append(self, item):
+        items = self.items
+        if len(items) >= self.capacity:
+            if self.policy == "tail":
+                self.tail_drops += 1
+                return False
+            self.head_drops += 1
+        items.append(item)
+        self.enqueued += 1
+        if len(items) > self.max_length:
+            self.max_length = len(items)
+        return True
+
+    def extend(self, batch):
+        items = self.items
+        room = self.capacity - len(items)
+        if len(batch) > room:
+            if self.policy == "tail":
+                self.tail_drops += len(batch) - room
+                batch = batch[:room]
+            else:
+                self.head_drops += len(batch) - room
+        items.extend(batch)
+        self.enqueued += len(batch)
+        if len(items) > self.max_length:
+            self.max_length = len(items)
+        return len(batch)
+
+    def popleft(self):
+        self.dequeued += 1
+        return self.items.popleft()
+
+    def peek(self):
+        return self.items[0]
+
+    def drain(self):
+        items = list(self.items)
+        self.items.clear()
+        self.dequeued += len(items)
+        return items
+
+    def clear(self):
+        self.dequeued += len(self.items)
+        self.items.clear()
+
+    def stats(self):
+        return {"capacity": self.capacity, "policy": self.policy, "length": len(self.items),
+                "max_length": self.max_length, "enqueued": self.enqueued, "dequeued": self.dequeued,
+                "tail_drops": self.tail_drops, "head_drops": self.head_drops}
+
+
+QUEUES = {"droptail": DropTail, "red": RED, "codel": CoDel, "fq_codel": FQCoDel}
+
+
+def make_queue(discipline="droptail", limit=100, **options):
+    if discipline not in QUEUES:
+        raise ValueError(f"Unknown queue discipline '{discipline}', expected one of: {', '.join(QUEUES)}")
+    return QUEUES[discipline](limit, **options)
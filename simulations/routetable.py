@@ -0,0 +1,148 @@
+import ipaddress
+import socket
+import struct
+import numpy as np
+
+LONG_ENTRY = 0x80000000  # Set in a DIR-24-8 first-level entry that points at a 256-entry second-level block
+
+
+def ip_to_int(ip):
+    if isinstance(ip, int):
+        return ip
+    return struct.unpack("!I", socket.inet_aton(ip))[0]
+
+
+def ips_to_array(ips):
+    return np.fromiter((ip_to_int(ip) for ip in ips), dtype=np.uint32)
+
+
+def parse_prefix(network, mask):
+    net = ipaddress.ip_network(f"{network}/{mask}", strict=False)
+    if net.version != 4:
+        raise ValueError(f"Only IPv4 routes are supported, got {net}")
+    return int(net.network_address), net.prefixlen
+
+
+# Routing table with longest-prefix-match lookups. Routes are stored as
+# integer prefixes in one hash table per prefix length, so a lookup costs at
+# most 33 dict probes no matter how many routes are installed.
+class RouteTable:
+    def __init__(self):
+        self.tables = {}  # {prefixlen: {network as int: route}}
+        self.lengths = []  # (prefixlen, netmask, table) for the lengths in use, longest first
+        self.count = 0
+        self.next_hops = []  # Distinct next hops, bulk lookups return indices into this list
+        self.next_hop_index = {}
+        self.dir24 = None  # (first level, second level) arrays, built on the first bulk lookup
+
+    def add(self, network, mask, next_hop, **attributes):
+        prefix, length = parse_prefix(network, mask)
+        route = {'network': network, 'mask': mask, 'next_hop': next_hop}
+        route.update(attributes)
+        return self.insert(prefix, length, route)
+
+    def remove(self, network, mask):
+        return self.delete(*parse_prefix(network, mask))
+
+    # insert/delete take an already parsed integer prefix, for routing protocols
+    # that install many routes and should not re-parse strings
+    def insert(self, prefix, length, route):
+        table = self.tables.get(length)
+        if table is None:
+            table = self.tables[length] = {}
+            self._index_lengths()
+        if prefix not in table:
+            self.count += 1
+        table[prefix] = route
+        next_hop = route['next_hop']
+        if next_hop not in self.next_hop_index:
+            self.next_hop_index[next_hop] = len(self.next_hops)
+            self.next_hops.append(next_hop)
+        self.dir24 = None
+        return route
+
+    def delete(self, prefix, length):
+        table = self.tables.get(length)
+        if table is None or prefix not in table:
+            return None
+        route = table.pop(prefix)
+        self.count -= 1
+        self.dir24 = None
+        if not table:
+            del self.tables[length]
+            self._index_lengths()
+        return route
+
+    def get(self, network, mask):
+        prefix, length = parse_prefix(network, mask)
+        return self.tables.get(length, {}).get(prefix)
+
+    def lookup(self, destination_ip):
+        address = ip_to_int(destination_ip)
+        for length, netmask, table in self.lengths:
+            route = table.get(address & netmask)
+            if route is not None:
+                return route
+        return None
+
+    def lookup_many(self, addresses):
+        # Vectorized longest-prefix match for a whole trace of uint32 addresses.
+        # Returns the index into self.next_hops for every address, -1 where no route matches.
+        if self.dir24 is None:
+            self.dir24 = self._build_dir24()
+        first, second = self.dir24
+
+        addresses = np.asarray(addresses, dtype=np.uint32)
+        entries = first[addresses >> 8]
+        result = entries.astype(np.int64) - 1
+        long = (entries & LONG_ENTRY) != 0
+        if long.any():
+            blocks = (entries[long] & ~np.uint32(LONG_ENTRY)).astype(np.int64)
+            result[long] = second[blocks * 256 + (addresses[long] & 0xFF)].astype(np.int64) - 1
+        return result.astype(np.int32)
+
+    def _build_dir24(self):
+        # DIR-24-8: one entry per /24 holding next hop index + 1 (0 means no route), or a
+        # pointer to a 256-entry block for /24s that contain longer prefixes.
+        first = np.zeros(1 << 24, dtype=np.uint32)
+        blocks = {}
+        long_routes = []
+        for length in sorted(self.tables):
+            for prefix, route in self.tables[length].items():
+                value = self.next_hop_index[route['next_hop']] + 1
+                if length <= 24:
+                    start = prefix >> 8
+                    first[start:start + (1 << (24 - length))] = value
+                else:
+                    long_routes.append((prefix, length, value))
+
+        # Second-level blocks start out with whatever their covering /24 resolved to
+        for prefix, length, value in long_routes:
+            key = prefix >> 8
+            block = blocks.get(key)
+            if block is None:
+                block = blocks[key] = np.full(256, first[key], dtype=np.uint32)
+            start = prefix & 0xFF
+            block[start:start + (1 << (32 - length))] = value
+
+        for block_id, key in enumerate(blocks):
+            first[key] = LONG_ENTRY | block_id
+        second = np.concatenate(list(blocks.values())) if blocks else np.zeros(0, dtype=np.uint32)
+        return first, second
+
+    def clear(self):
+        self.tables = {}
+        self.lengths = []
+        self.count = 0
+        self.dir24 = None
+
+    def _index_lengths(self):
+        self.lengths = [(length, (0xFFFFFFFF << (32 - length)) & 0xFFFFFFFF, self.tables[length])
+                        for length in sorted(self.tables, reverse=True)]
+
+    def __iter__(self):
+        for _, _, table in self.lengths:
+            yield from table.values()
+
+    def __len__(self):
+        return self.count
@@ -0,0 +1,141 @@
+import argparse
+import importlib
+import json
+import random
+import sys
+from simulations.sinks import ListSink, NullSink, StreamSink
+
+# Scenario name -> "module:function", the function is called as function(config, sink)
+SCENARIOS = {
+    "layer1": "simulations.layer1:run_scenario",
+    "hub_flood": "simulations.layer1:run_flood_benchmark",
+    "layer2": "simulations.layer2:run_scenario",
+    "switch_fabric": "simulations.layer2:run_fabric_benchmark",
+    "spanning_tree": "simulations.layer2:run_spanning_tree_scenario",
+    "crc": "simulations.error_control:run_scenario",
+    "crc_detection": "simulations.error_control:run_detection_scenario",
+    "fec_goodput": "simulations.fec:run_goodput_scenario",
+    "csma_cd": "simulations.access_control:run_scenario",
+    "sliding_window": "simulations.slidingwindow:run_scenario",
+    "arq": "simulations.slidingwindow:run_arq_scenario",
+    "ip_routing": "simulations.ipaddressing:run_scenario",
+    "rip": "simulations.ipaddressing:run_rip_scenario",
+    "arp": "simulations.ipaddressing:run_arp_scenario",
+    "ospf": "simulations.ospf:run_ospf_scenario",
+    "spf_benchmark": "simulations.ospf:run_spf_benchmark",
+    "transport": "simulations.transportlayer:run_scenario",
+    "transport_timers": "simulations.transportlayer:run_timer_scenario",
+    "transport_connections": "simulations.transportlayer:run_connection_scenario",
+    "ftp": "simulations.transportlayer:run_ftp_scenario",
+    "tcp": "simulations.tcp:run_scenario",
+    "aqm": "simulations.tcp:run_queue_scenario",
+    "tcp_fairness": "simulations.tcp:run_fairness_check",
+}
+
+
+def load_scenario(name):
+    if name not in SCENARIOS:
+        raise ValueError(f"Unknown scenario '{name}', expected one of: {', '.join(SCENARIOS)}")
+    module_name, function_name = SCENARIOS[name].split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def run(name, config=None, seed=None, sink=None):
+    scenario = load_scenario(name)
+    config = dict(config or {})
+    if seed is not None:
+        random.seed(seed)
+        # Scenarios that keep their own generators seed them from the config
+        config["seed"] = seed
+    return scenario(config, sink or NullSink())
+
+
+def load_config(path):
+    if path is None:
+        return [{}]
+    with open(path) as f:
+        config = json.load(f)
+    # A config file holds either a single scenario or a list of them
+    return config if isinstance(config, list) else [config]
+
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulations", description="Run network simulations headless")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="List available scenarios")
+
+    run_parser = commands.add_parser("run", help="Run a scenario")
+    run_parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    run_parser.add_argument("--config", help="JSON file with scenario parameters (an object or a list of objects)")
+    run_parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+    run_parser.add_argument("--output", help="Write results as JSON to this file instead of stdout")
+    run_parser.add_argument("--log", action="store_true", help="Print simulation events to stderr")
+    run_parser.add_argument("--keep-log", action="store_true", help="Include simulation events in the results")
+
+    sweep_parser = commands.add_parser("sweep", help="Run a scenario over a grid of parameters in parallel")
+    sweep_parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    sweep_parser.add_argument("--grid", help="JSON file mapping parameter names to lists of values")
+    sweep_parser.add_argument("--param", action="append", default=[], metavar="NAME=V1,V2,...",
+                              help="Parameter values to sweep, values are parsed as JSON when possible")
+    sweep_parser.add_argument("--config", help="JSON file with parameters shared by every run")
+    sweep_parser.add_argument("--seed", type=int, default=0, help="Base seed, run i uses seed + i")
+    sweep_parser.add_argument("--repeats", type=int, default=1, help="Runs per parameter combination")
+    sweep_parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    sweep_parser.add_argument("--output", required=True, help="Results table, .csv or .parquet")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name in sorted(SCENARIOS):
+            print(name)
+        return 0
+
+    if args.command == "sweep":
+        from simulations import sweep
+
+        grid = {}
+        if args.grid:
+            with open(args.grid) as f:
+                grid.update(json.load(f))
+        for param in args.param:
+            name, values = param.split("=", 1)
+            grid[name] = [parse_value(value) for value in values.split(",")]
+        base_config = load_config(args.config)[0]
+
+        rows = sweep.sweep(args.scenario, grid, base_config, args.seed, args.repeats, args.workers)
+        sweep.write_table(rows, args.output)
+        print(f"Wrote {len(rows)} runs to {args.output}")
+        return 0
+
+    results = []
+    for index, config in enumerate(load_config(args.config)):
+        if args.keep_log:
+            sink = ListSink()
+        elif args.log:
+            sink = StreamSink(sys.stderr)
+        else:
+            sink = NullSink()
+        seed = config.pop("seed", None)
+        if seed is None and args.seed is not None:
+            seed = args.seed + index
+        result = {"scenario": args.scenario, "config": config, "seed": seed,
+                  "result": run(args.scenario, config, seed, sink)}
+        if args.keep_log:
+            result["log"] = sink.messages
+        results.append(result)
+
+    output = json.dumps(results if len(results) > 1 else results[0], indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
@@ -0,0 +1,43 @@
+import sys
+
+
+# Model classes report what they do through a sink instead of calling
+# st.write directly, so the same simulation can drive the Streamlit UI,
+# print to a terminal, record a log, or run silently in a batch job.
+class StreamlitSink:
+    def __init__(self, target=None):
+        self.target = target  # A container or placeholder to write into, defaults to the page
+
+    def write(self, message):
+        target = self.target
+        if target is None:
+            # Imported here so headless runs and pool workers never load Streamlit
+            import streamlit as st
+            target = st
+        target.write(message)
+
+
+class NullSink:
+    def write(self, message):
+        pass
+
+
+class ListSink:
+    def __init__(self):
+        self.messages = []
+
+    def write(self, message):
+        self.messages.append(str(message))
+
+
+class StreamSink:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, message):
+        self.stream.write(f"{message}\n")
+
+
+# Models built without a sink stay quiet; the Streamlit pages pass a StreamlitSink
+def default_sink(sink=None):
+    return sink if sink is not None else NullSink()
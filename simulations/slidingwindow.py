@@ -1,31 +1,286 @@
 import streamlit as st
-import time
 import random
+from simulations.engine import Scheduler, TimerWheel
+from simulations.sinks import StreamlitSink, default_sink
 
+# Sender window kept in a ring buffer of window_size slots. base and next_seq_num
+# count frames from the start of the transfer; on the wire frames carry
+# next_seq_num modulo 2**seq_bits, so memory stays constant however long the transfer.
 class SlidingWindowProtocol:
-    def __init__(self, window_size):
+    def __init__(self, window_size, seq_bits=None):
+        if seq_bits is None:
+            seq_bits = max(1, window_size.bit_length())
+        if window_size > (1 << seq_bits) - 1:
+            raise ValueError(f"A window of {window_size} frames needs more than {seq_bits} sequence number bits")
         self.window_size = window_size
-        self.frames = []
-        self.acknowledged = []
+        self.seq_bits = seq_bits
+        self.seq_modulus = 1 << seq_bits
+        self.frames = [None] * window_size
+        self.acknowledged = [False] * window_size
         self.base = 0
         self.next_seq_num = 0
 
+    def seq(self, number):
+        return number % self.seq_modulus
+
+    def outstanding(self):
+        return self.next_seq_num - self.base
+
     def send_frame(self, frame):
         if self.next_seq_num < self.base + self.window_size:
-            self.frames.append(frame)
-            self.acknowledged.append(False)
+            slot = self.next_seq_num % self.window_size
+            self.frames[slot] = frame
+            self.acknowledged[slot] = False
             self.next_seq_num += 1
             return True
         return False
 
     def receive_ack(self, ack_num):
-        if ack_num >= self.base:
-            for i in range(self.base, ack_num + 1):
-                self.acknowledged[i] = True
-            self.base = ack_num + 1
+        # Cumulative ACK carrying the wire sequence number of the last frame received in order.
+        # Anything that does not fall inside the outstanding frames is a stale duplicate.
+        offset = (ack_num - self.base) % self.seq_modulus
+        if offset >= self.outstanding():
+            return False
+        for number in range(self.base, self.base + offset + 1):
+            slot = number % self.window_size
+            self.frames[slot] = None
+            self.acknowledged[slot] = True
+        self.base += offset + 1
+        return True
+
+    def receive_selective_ack(self, ack_num):
+        # Selective Repeat ACK for one frame; the window slides over every acknowledged frame at its front
+        number = self.number(ack_num)
+        if number is None or self.acknowledged[number % self.window_size]:
+            return False
+        self.acknowledged[number % self.window_size] = True
+        while self.base < self.next_seq_num and self.acknowledged[self.base % self.window_size]:
+            self.frames[self.base % self.window_size] = None
+            self.base += 1
+        return True
+
+    def number(self, seq):
+        # Frame count of an outstanding wire sequence number, None if it is not outstanding
+        offset = (seq - self.base) % self.seq_modulus
+        return self.base + offset if offset < self.outstanding() else None
+
+    def frame(self, number):
+        return self.frames[number % self.window_size]
 
     def get_window(self):
-        return self.frames[self.base:self.base + self.window_size], self.acknowledged[self.base:self.base + self.window_size]
+        slots = [number % self.window_size for number in range(self.base, self.next_seq_num)]
+        return [self.frames[slot] for slot in slots], [self.acknowledged[slot] for slot in slots]
+
+
+class GoBackNReceiver:
+    def __init__(self, seq_bits):
+        self.seq_modulus = 1 << seq_bits
+        self.expected = 0
+
+    def receive(self, seq):
+        # Returns the frames delivered in order, the cumulative ACK to send and any NAKs
+        delivered = 0
+        if seq == self.expected % self.seq_modulus:
+            self.expected += 1
+            delivered = 1
+        ack = (self.expected - 1) % self.seq_modulus if self.expected else None
+        return delivered, ack, []
+
+
+# Selective Repeat receiver: out-of-order frames wait in a ring buffer the
+# size of the window until the gap in front of them is filled. A frame that
+# arrives past the highest one seen so far NAKs every frame it skipped over.
+class SelectiveRepeatReceiver:
+    def __init__(self, window_size, seq_bits):
+        self.window_size = window_size
+        self.seq_modulus = 1 << seq_bits
+        self.buffer = [False] * window_size
+        self.expected = 0
+        self.highest = -1
+
+    def receive(self, seq):
+        offset = (seq - self.expected) % self.seq_modulus
+        if offset >= self.window_size:
+            # Already delivered, the ACK must have been lost, so acknowledge it again
+            return 0, seq, []
+        number = self.expected + offset
+        naks = [missing % self.seq_modulus for missing in range(self.highest + 1, number)]
+        self.highest = max(self.highest, number)
+        self.buffer[number % self.window_size] = True
+        delivered = 0
+        while self.buffer[self.expected % self.window_size]:
+            self.buffer[self.expected % self.window_size] = False
+            self.expected += 1
+            delivered += 1
+        return delivered, seq, naks
+
+
+# Step-by-step Go-Back-N with random ACK loss, driven by the UI and run_scenario
+def simulate(window_size, num_frames, ack_loss=0.2, tick=0.5, speed=None, sink=None, on_step=None, seq_bits=None):
+    sink = default_sink(sink)
+    protocol = SlidingWindowProtocol(window_size, seq_bits)
+    scheduler = Scheduler()
+
+    frame_num = 0
+    ack_num = 0
+    acks_lost = 0
+
+    def step():
+        nonlocal frame_num, ack_num, acks_lost
+        if on_step:
+            on_step(protocol)
+        frames, acknowledged = protocol.get_window()
+        sink.write(f"Frame Window: {frames}")
+        sink.write(f"Acknowledged: {acknowledged}")
+
+        if frame_num < num_frames:
+            sent = protocol.send_frame(f"Frame {frame_num}")
+            if sent:
+                sink.write(f"Sent Frame {frame_num}")
+                frame_num += 1
+
+        # Simulate receiving acknowledgments
+        if random.random() > ack_loss:
+            if ack_num < frame_num:
+                protocol.receive_ack(protocol.seq(ack_num))
+                sink.write(f"Received Acknowledgment for Frame {ack_num} (sequence number {protocol.seq(ack_num)})")
+                ack_num += 1
+        else:
+            sink.write(f"Acknowledgment for Frame {ack_num} lost")
+            acks_lost += 1
+
+        if frame_num < num_frames or protocol.base < num_frames:
+            scheduler.schedule(tick, step)
+
+    scheduler.schedule(0, step)
+    scheduler.run(speed=speed)
+    return {"frames": num_frames, "acks_lost": acks_lost, "steps": scheduler.events_run, "time": scheduler.now}
+
+
+# Go-Back-N or Selective Repeat over a link with a serialization rate, a
+# one-way delay and random frame/ACK loss. Retransmission timers for every
+# outstanding frame live on one TimerWheel; frames queue FIFO for the link.
+def simulate_arq(mode, window_size, num_frames, loss=0.01, ack_loss=0.0, bandwidth=1e6, delay=0.01,
+                 frame_bits=8000, timeout=None, seq_bits=None, tick=None, seed=None, sink=None):
+    if mode not in ("gbn", "sr"):
+        raise ValueError(f"Unknown ARQ mode '{mode}', expected 'gbn' or 'sr'")
+    sink = default_sink(sink)
+    selective = mode == "sr"
+    if seq_bits is None:
+        seq_bits = window_size.bit_length() + selective
+    if selective and window_size > 1 << (seq_bits - 1):
+        raise ValueError(f"Selective Repeat needs a window of at most half the {1 << seq_bits} sequence numbers")
+
+    rng = random.Random(seed)
+    scheduler = Scheduler()
+    sender = SlidingWindowProtocol(window_size, seq_bits)
+    receiver = SelectiveRepeatReceiver(window_size, seq_bits) if selective else GoBackNReceiver(seq_bits)
+    frame_time = frame_bits / bandwidth
+    timeout = timeout or 2 * (2 * delay + frame_time)
+    wheel = TimerWheel(scheduler, tick or timeout / 64)
+    timers = [None] * window_size  # Selective Repeat keeps one timer per window slot
+    go_back_timer = None
+    link_free = 0.0
+    stats = {"transmissions": 0, "retransmissions": 0, "timeouts": 0, "naks": 0, "delivered": 0, "completed": None}
+
+    def transmit(number):
+        # Queues the frame behind whatever the link is still sending, returns the delay until it has left
+        nonlocal link_free
+        link_free = max(scheduler.now, link_free) + frame_time
+        stats["transmissions"] += 1
+        if rng.random() >= loss:
+            scheduler.schedule_at(link_free + delay, frame_arrives, sender.seq(number))
+        return link_free - scheduler.now
+
+    def start_timer(number, departs):
+        nonlocal go_back_timer
+        if selective:
+            timers[number % window_size] = wheel.start(departs + timeout, frame_timeout, number)
+        else:
+            go_back_timer = wheel.start(departs + timeout, frame_timeout, number)
+
+    def send_new():
+        while sender.next_seq_num < num_frames and sender.send_frame(sender.next_seq_num):
+            number = sender.next_seq_num - 1
+            departs = transmit(number)
+            if selective or go_back_timer is None or not go_back_timer.pending:
+                start_timer(number, departs)
+
+    def retransmit(number):
+        stats["retransmissions"] += 1
+        if selective:
+            timers[number % window_size].cancel()
+        start_timer(number, transmit(number))
+
+    def frame_arrives(seq):
+        delivered, ack, naks = receiver.receive(seq)
+        stats["delivered"] += delivered
+        if delivered and stats["delivered"] == num_frames:
+            stats["completed"] = scheduler.now
+        if ack is not None and rng.random() >= ack_loss:
+            scheduler.schedule(delay, ack_arrives, ack)
+        for nak in naks:
+            stats["naks"] += 1
+            if rng.random() >= ack_loss:
+                scheduler.schedule(delay, nak_arrives, nak)
+
+    def ack_arrives(ack):
+        if selective:
+            number = sender.number(ack)
+            if number is not None and sender.receive_selective_ack(ack):
+                timers[number % window_size].cancel()
+        elif sender.receive_ack(ack):
+            go_back_timer.cancel()
+            if sender.outstanding():
+                start_timer(sender.base, 0)
+        send_new()
+
+    def nak_arrives(seq):
+        number = sender.number(seq)
+        if number is not None and not sender.acknowledged[number % window_size]:
+            retransmit(number)
+
+    def frame_timeout(number):
+        stats["timeouts"] += 1
+        if selective:
+            retransmit(number)
+        else:
+            # Go back to the oldest unacknowledged frame and resend the whole window
+            departs = 0
+            for outstanding in range(sender.base, sender.next_seq_num):
+                stats["retransmissions"] += 1
+                departs = transmit(outstanding)
+            start_timer(sender.base, departs)
+
+    send_new()
+    scheduler.run()
+
+    completed = stats["completed"] or scheduler.now
+    goodput = num_frames * frame_bits / completed if completed else 0.0
+    result = {"mode": mode, "window_size": window_size, "seq_bits": seq_bits, "frames": num_frames,
+              "bandwidth_delay_frames": 2 * delay / frame_time, "time": completed, "goodput": goodput,
+              "utilization": goodput / bandwidth, "events": scheduler.events_run}
+    result.update({key: value for key, value in stats.items() if key != "completed"})
+    sink.write(f"{mode.upper()}: {num_frames} frames in {completed:.3f}s, utilization {result['utilization']:.3f}, "
+               f"{stats['retransmissions']} retransmissions, {stats['timeouts']} timeouts, {stats['naks']} NAKs")
+    return result
+
+
+def run_arq_scenario(config, sink=None):
+    # Runs Go-Back-N and Selective Repeat with the same link and loss settings
+    options = {key: config[key] for key in ("loss", "ack_loss", "bandwidth", "delay", "frame_bits", "timeout",
+                                            "seq_bits", "tick") if key in config}
+    rows = []
+    for mode in config.get("modes", ["gbn", "sr"]):
+        rows.append(simulate_arq(mode, config.get("window_size", 64), config.get("num_frames", 10000),
+                                 seed=config.get("seed"), sink=sink, **options))
+    return {"rows": rows}
+
+
+def run_scenario(config, sink=None):
+    return simulate(config.get("window_size", 4), config.get("num_frames", 10), config.get("ack_loss", 0.2),
+                    config.get("tick", 0.5), sink=sink, seq_bits=config.get("seq_bits"))
+
 
 # Main function to create the Streamlit UI
 def main():
@@ -33,43 +288,23 @@ def main():
 
     window_size = st.sidebar.slider("Window Size", min_value=1, max_value=10, value=4)
     num_frames = st.sidebar.number_input("Number of Frames to Send", min_value=1, max_value=50, value=10)
+    speed = st.sidebar.number_input("Playback Speed (x real time, 0 = as fast as possible)", min_value=0.0, value=1.0)
     start_simulation = st.sidebar.button("Start Simulation")
 
     if start_simulation:
-        protocol = SlidingWindowProtocol(window_size)
-
         st.write(f"Sending {num_frames} frames with a window size of {window_size}.")
 
-        frame_num = 0
-        ack_num = 0
-
         simulation_placeholder = st.empty()
         progress_bar = st.progress(0)
+        sink = StreamlitSink()
+
+        def on_step(protocol):
+            # Redraw the window state in place on every step
+            sink.target = simulation_placeholder.container()
+            progress_bar.progress(min(protocol.base / num_frames, 1.0))
 
-        while frame_num < num_frames or protocol.base < num_frames:
-            with simulation_placeholder.container():
-                st.write(f"Frame Window: {protocol.get_window()[0]}")
-                st.write(f"Acknowledged: {protocol.get_window()[1]}")
-
-                if frame_num < num_frames:
-                    sent = protocol.send_frame(f"Frame {frame_num}")
-                    if sent:
-                        st.write(f"Sent Frame {frame_num}")
-                        frame_num += 1
-
-                # Simulate receiving acknowledgments
-                if random.random() > 0.2:  # 80% chance to receive an acknowledgment
-                    if ack_num < frame_num:
-                        protocol.receive_ack(ack_num)
-                        st.write(f"Received Acknowledgment for Frame {ack_num}")
-                        ack_num += 1
-                else:
-                    st.write(f"Acknowledgment for Frame {ack_num} lost")
-
-                time.sleep(0.5)  # Simulate time delay
-
-                progress = min(protocol.base / num_frames, 1.0)
-                progress_bar.progress(progress)
+        simulate(window_size, num_frames, speed=speed or None, sink=sink, on_step=on_step)
+        progress_bar.progress(1.0)
 
         st.success("All frames sent and acknowledged.")
 
@@ -0,0 +1,76 @@
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from simulations import runner
+
+
+def expand_grid(grid):
+    # {"a": [1, 2], "b": [3]} -> [{"a": 1, "b": 3}, {"a": 2, "b": 3}]
+    names = list(grid)
+    values = [grid[name] if isinstance(grid[name], (list, tuple, range)) else [grid[name]] for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def flatten(result, prefix=""):
+    # Keep the scalar metrics of a nested result, e.g. {"summary": {"throughput": x}} -> {"summary.throughput": x}
+    row = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            row.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float, str, bool)) or value is None:
+            row[name] = value
+    return row
+
+
+def run_one(task):
+    index, scenario, config, seed = task
+    runner.load_scenario(scenario)  # Keep the import out of the timing
+    start = time.perf_counter()
+    result = runner.run(scenario, dict(config), seed)
+    row = {"run": index, "seed": seed}
+    row.update(config)
+    row.update(flatten(result))
+    row["wall_time"] = time.perf_counter() - start
+    return row
+
+
+def sweep(scenario, grid, base_config=None, seed=0, repeats=1, workers=None):
+    tasks = []
+    for config in expand_grid(grid):
+        for _ in range(repeats):
+            # Every run gets its own seed derived from its position, so results are
+            # reproducible no matter which worker picks the run up
+            index = len(tasks)
+            tasks.append((index, scenario, {**(base_config or {}), **config}, seed + index))
+
+    if workers == 1:
+        return [run_one(task) for task in tasks]
+
+    workers = workers or os.cpu_count()
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        rows = list(executor.map(run_one, tasks, chunksize=chunksize))
+    return sorted(rows, key=lambda row: row["run"])
+
+
+def write_table(rows, path):
+    columns = []
+    for row in rows:
+        for column in row:
+            if column not in columns:
+                columns.append(column)
+
+    if path.endswith(".parquet"):
+        try:
+            import pandas as pd
+        except ImportError:
+            raise RuntimeError("Writing Parquet needs pandas and pyarrow installed, use a .csv path instead")
+        pd.DataFrame(rows, columns=columns).to_parquet(path, index=False)
+    else:
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
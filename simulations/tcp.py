@@ -0,0 +1,608 @@
+import math
+import random
+from collections import deque
+from simulations.engine import Scheduler, TimerWheel
+from simulations.link import Link
+from simulations.queues import make_queue
+from simulations.sinks import default_sink
+
+HEADER_BYTES = 40
+
+
+class Segment:
+    __slots__ = ("flow", "seq", "size", "sent_time", "retransmitted", "delivered", "delivered_time",
+                 "first_sent_time")
+
+    def __init__(self, flow, seq, size, sent_time, retransmitted, delivered, delivered_time, first_sent_time):
+        self.flow = flow
+        self.seq = seq
+        self.size = size
+        self.sent_time = sent_time
+        self.retransmitted = retransmitted
+        self.delivered = delivered  # Flow's delivered count when this segment was sent, for rate samples
+        self.delivered_time = delivered_time
+        self.first_sent_time = first_sent_time
+
+
+# Congestion control algorithms adjust flow.cwnd (in segments) and optionally
+# flow.pacing_rate (segments per second). Reno is the base class: slow start,
+# additive increase and halving on loss.
+class Reno:
+    name = "reno"
+
+    def __init__(self, flow):
+        self.flow = flow
+
+    def on_ack(self, acked, rtt):
+        flow = self.flow
+        if flow.cwnd < flow.ssthresh:
+            flow.cwnd += acked
+        else:
+            flow.cwnd += acked / flow.cwnd
+
+    def on_rate_sample(self, rate, rtt):
+        pass
+
+    def on_loss(self):
+        # Entering fast recovery after three duplicate ACKs
+        flow = self.flow
+        flow.ssthresh = max(flow.in_flight() / 2, 2)
+        flow.cwnd = flow.ssthresh
+
+    def on_recovery_exit(self):
+        self.flow.cwnd = self.flow.ssthresh
+
+    def on_timeout(self):
+        flow = self.flow
+        flow.ssthresh = max(flow.in_flight() / 2, 2)
+        flow.cwnd = 1
+
+
+# CUBIC (RFC 8312): after a loss the window follows a cubic curve through the
+# window it had before the loss, with a Reno-friendly floor.
+class Cubic(Reno):
+    name = "cubic"
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self, flow):
+        super().__init__(flow)
+        self.w_max = 0.0
+        self.epoch_start = None
+        self.origin = 0.0
+        self.k = 0.0
+        self.w_est = 0.0
+
+    def on_ack(self, acked, rtt):
+        flow = self.flow
+        if flow.cwnd < flow.ssthresh:
+            flow.cwnd += acked
+            return
+        now = flow.scheduler.now
+        if self.epoch_start is None:
+            self.epoch_start = now
+            self.w_est = flow.cwnd
+            if flow.cwnd < self.w_max:
+                self.k = ((self.w_max - flow.cwnd) / self.C) ** (1 / 3)
+                self.origin = self.w_max
+            else:
+                self.k = 0.0
+                self.origin = flow.cwnd
+        # Aim for where the curve will be one RTT from now, W_cubic(t + RTT)
+        rtt = flow.srtt or rtt or 0.0
+        target = self.origin + self.C * (now - self.epoch_start + rtt - self.k) ** 3
+        if target > flow.cwnd:
+            flow.cwnd += (target - flow.cwnd) / flow.cwnd * acked
+        else:
+            flow.cwnd += 0.01 * acked / flow.cwnd
+        self.w_est += 3 * (1 - self.BETA) / (1 + self.BETA) * acked / flow.cwnd
+        flow.cwnd = max(flow.cwnd, self.w_est)
+
+    def _reduce(self):
+        flow = self.flow
+        self.epoch_start = None
+        # Fast convergence: give up more bandwidth when the last peak was not reached
+        if flow.cwnd < self.w_max:
+            self.w_max = flow.cwnd * (1 + self.BETA) / 2
+        else:
+            self.w_max = flow.cwnd
+        flow.ssthresh = max(flow.cwnd * self.BETA, 2)
+
+    def on_loss(self):
+        self._reduce()
+        self.flow.cwnd = self.flow.ssthresh
+
+    def on_timeout(self):
+        self._reduce()
+        self.flow.cwnd = 1
+
+
+# BBR-style model: estimates bottleneck bandwidth (windowed max of delivery
+# rate samples over about ten minimum RTTs) and the minimum RTT, paces at a
+# gain times that bandwidth and grows the window towards twice the estimated
+# BDP. As in BBRv1, a loss or timeout caps the window and holds it to packet
+# conservation until the losses are repaired, then the window from before the
+# loss (or before ProbeRTT) is restored. This model has no RACK to catch a lost
+# retransmission, so conservation lasts the whole recovery instead of one round.
+class BBR(Reno):
+    name = "bbr"
+    STARTUP_GAIN = 2 / math.log(2)
+    PROBE_GAINS = (1.25, 0.75, 1, 1, 1, 1, 1, 1)
+    BW_WINDOW = 10  # Minimum RTTs
+    MIN_RTT_WINDOW = 10.0  # Seconds
+    PROBE_RTT_TIME = 0.2
+    MIN_CWND = 4
+
+    def __init__(self, flow):
+        super().__init__(flow)
+        self.state = "startup"
+        self.bw_samples = deque()  # (time, rate) with decreasing rates, the windowed max is at the front
+        self.bandwidth = 0.0
+        self.min_rtt = None
+        self.min_rtt_stamp = 0.0
+        self.round = 0
+        self.next_round_delivered = 0
+        self.last_delivered = 0
+        self.full_bw = 0.0
+        self.full_bw_rounds = 0
+        self.cycle_index = 0
+        self.cycle_stamp = 0.0
+        self.probe_rtt_done = None
+        self.pacing_gain = self.STARTUP_GAIN
+        self.cwnd_gain = self.STARTUP_GAIN
+        self.prior_cwnd = 0.0
+        self.recovering = False
+        self.recover = None  # snd_nxt at a timeout, recovery ends once it is acknowledged
+
+    def bdp(self):
+        if not self.bandwidth or self.min_rtt is None:
+            return self.flow.initial_cwnd
+        return self.bandwidth * self.min_rtt
+
+    def on_rate_sample(self, rate, rtt):
+        flow = self.flow
+        now = flow.scheduler.now
+        acked = flow.delivered - self.last_delivered
+        self.last_delivered = flow.delivered
+        round_start = flow.delivered >= self.next_round_delivered
+        if round_start:
+            self.round += 1
+            self.next_round_delivered = flow.delivered + flow.in_flight()
+
+        expired = now - self.min_rtt_stamp > self.MIN_RTT_WINDOW
+        if rtt is not None and (self.min_rtt is None or rtt <= self.min_rtt or expired):
+            self.min_rtt = rtt
+            self.min_rtt_stamp = now
+        # Samples age out by time, so a flow that stops getting ACKs through
+        # does not keep a peak it saw before the others took the link
+        while self.bw_samples and self.bw_samples[-1][1] <= rate:
+            self.bw_samples.pop()
+        self.bw_samples.append((now, rate))
+        if self.min_rtt is not None:
+            while self.bw_samples[0][0] < now - self.BW_WINDOW * self.min_rtt:
+                self.bw_samples.popleft()
+        self.bandwidth = self.bw_samples[0][1]
+
+        if self.state == "startup" and round_start:
+            # Leave startup once three rounds in a row grew the bandwidth by less than 25%
+            if self.bandwidth >= self.full_bw * 1.25:
+                self.full_bw = self.bandwidth
+                self.full_bw_rounds = 0
+            else:
+                self.full_bw_rounds += 1
+                if self.full_bw_rounds >= 3:
+                    self.state = "drain"
+                    self.pacing_gain = 1 / self.STARTUP_GAIN
+                    self.cwnd_gain = self.STARTUP_GAIN
+        if self.state == "drain" and flow.in_flight() <= self.bdp():
+            self._enter_probe_bw(now)
+        if self.state == "probe_bw" and self.min_rtt and now - self.cycle_stamp > self.min_rtt:
+            self.cycle_index = (self.cycle_index + 1) % len(self.PROBE_GAINS)
+            self.cycle_stamp = now
+            self.pacing_gain = self.PROBE_GAINS[self.cycle_index]
+        if self.state != "probe_rtt" and expired:
+            # Drain the queue for a moment so the next samples see the real propagation delay
+            self._save_cwnd()
+            self.state = "probe_rtt"
+            self.probe_rtt_done = now + max(self.PROBE_RTT_TIME, self.min_rtt or 0)
+            self.pacing_gain = 1
+        if self.state == "probe_rtt" and now >= self.probe_rtt_done:
+            self.min_rtt_stamp = now
+            self._enter_probe_bw(now)
+            flow.cwnd = max(flow.cwnd, self.prior_cwnd)
+
+        if self.recover is not None and flow.snd_una >= self.recover:
+            self.recover = None
+            self._exit_recovery()
+        self._update_model(acked)
+
+    def _enter_probe_bw(self, now):
+        self.state = "probe_bw"
+        self.cwnd_gain = 2
+        self.cycle_index = self.flow.rng.randrange(1, len(self.PROBE_GAINS))
+        self.cycle_stamp = now
+        self.pacing_gain = self.PROBE_GAINS[self.cycle_index]
+
+    def _update_model(self, acked):
+        flow = self.flow
+        target = self.cwnd_gain * self.bdp()
+        cwnd = flow.cwnd
+        if self.recovering:
+            # Send no faster than data is delivered until the losses are repaired
+            cwnd = max(cwnd, self._pipe() + acked)
+        elif self.state != "startup":
+            cwnd = min(cwnd + acked, target)
+        elif cwnd < target or flow.delivered < flow.initial_cwnd:
+            cwnd += acked
+        cwnd = max(cwnd, self.MIN_CWND)
+        if self.state == "probe_rtt":
+            cwnd = min(cwnd, self.MIN_CWND)
+        flow.cwnd = cwnd
+        if self.bandwidth:
+            rate = self.pacing_gain * self.bandwidth
+            # Startup only ever speeds up, a slow early sample must not stall it
+            if self.state != "startup" or rate > (flow.pacing_rate or 0):
+                flow.pacing_rate = rate
+
+    def _pipe(self):
+        # Segments still in the network: in flight minus the holes below the highest SACK
+        flow = self.flow
+        lost = max(0, min(flow.high_sacked, flow.snd_nxt - 1) + 1 - flow.snd_una - flow.sacked_out)
+        return max(flow.in_flight() - lost, 0)
+
+    def _save_cwnd(self):
+        if self.recovering or self.state == "probe_rtt":
+            self.prior_cwnd = max(self.prior_cwnd, self.flow.cwnd)
+        else:
+            self.prior_cwnd = self.flow.cwnd
+
+    def _enter_recovery(self, cwnd):
+        self._save_cwnd()
+        self.recovering = True
+        self.flow.cwnd = max(cwnd, 1)
+
+    def _exit_recovery(self):
+        self.recovering = False
+        self.flow.cwnd = max(self.flow.cwnd, self.prior_cwnd)
+
+    def on_ack(self, acked, rtt):
+        pass  # The window follows the model on every rate sample
+
+    def on_loss(self):
+        # Cap the window at what is still in the network, less the segments the SACKs show lost
+        self._enter_recovery(self._pipe() + 1)
+
+    def on_recovery_exit(self):
+        self._exit_recovery()
+
+    def on_timeout(self):
+        self.recover = self.flow.snd_nxt
+        self._enter_recovery(1)
+
+
+ALGORITHMS = {"reno": Reno, "cubic": Cubic, "bbr": BBR}
+
+
+# A bulk TCP transfer in segment units. The sending side does NewReno loss
+# recovery and an RFC 6298 retransmission timer on the shared timer wheel;
+# the receiving side sends one cumulative ACK per segment back over an
+# uncongested reverse path. Each ACK also names the segment that triggered
+# it when that segment arrived out of order, a one-block SACK; the sender
+# keeps those in a scoreboard so they neither count as in flight nor get
+# resent after a timeout.
+class TCPFlow:
+    def __init__(self, flow_id, scheduler, timers, link, algorithm="reno", rtt=0.05, mss=1460,
+                 initial_cwnd=10, start=0.0, stop=None, seed=None):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown congestion control '{algorithm}', expected one of: {', '.join(ALGORITHMS)}")
+        self.flow_id = flow_id
+        self.scheduler = scheduler
+        self.timers = timers
+        self.link = link
+        self.mss = mss
+        self.reverse_delay = max(rtt - link.delay, 0.0)  # ACK path, so the base RTT is about `rtt`
+        self.stop = stop
+        self.rng = random.Random(seed)
+
+        self.initial_cwnd = initial_cwnd
+        self.cwnd = float(initial_cwnd)
+        self.ssthresh = float("inf")
+        self.pacing_rate = None
+        self.next_send_time = 0.0
+        self.pacing_event = None
+        self.snd_una = 0
+        self.snd_nxt = 0
+        self.sent = {}  # seq -> Segment for everything not yet acknowledged
+        self.dupacks = 0
+        self.sacked = set()
+        self.sacked_out = 0  # Scoreboard entries below snd_nxt
+        self.high_sacked = -1
+        self.in_recovery = False
+        self.recover = 0
+        self.rtx_next = 0  # Next hole to retransmit during recovery
+        self.srtt = None
+        self.rttvar = None
+        self.rto = 1.0
+        self.timer = None
+        self.delivered = 0
+        self.delivered_time = start
+        self.first_sent_time = start  # Send time of the segment delivered last
+
+        self.rcv_nxt = 0
+        self.out_of_order = set()
+
+        self.transmissions = 0
+        self.retransmissions = 0
+        self.timeouts = 0
+        self.fast_retransmits = 0
+        self.cc = ALGORITHMS[algorithm](self)
+        scheduler.schedule_at(start, self.try_send)
+
+    def flight_size(self):
+        return self.snd_nxt - self.snd_una
+
+    def in_flight(self):
+        return self.snd_nxt - self.snd_una - self.sacked_out
+
+    def active(self):
+        return self.stop is None or self.scheduler.now < self.stop
+
+    def try_send(self):
+        self.pacing_event = None
+        now = self.scheduler.now
+        while self.in_flight() < self.cwnd and self.active():
+            if self.snd_nxt in self.sacked:
+                self.snd_nxt += 1
+                self.sacked_out += 1
+                continue
+            if self.pacing_rate:
+                if now < self.next_send_time:
+                    self.pacing_event = self.scheduler.schedule_at(self.next_send_time, self.try_send)
+                    return
+                self.next_send_time = max(self.next_send_time, now - 1 / self.pacing_rate) + 1 / self.pacing_rate
+            self._transmit(self.snd_nxt)
+            self.snd_nxt += 1
+
+    def _transmit(self, seq):
+        retransmitted = seq in self.sent
+        if not self.flight_size():
+            # Nothing in flight after a timeout or idle period, so the next rate samples start now
+            self.delivered_time = self.first_sent_time = self.scheduler.now
+        segment = Segment(self, seq, self.mss + HEADER_BYTES, self.scheduler.now, retransmitted,
+                          self.delivered, self.delivered_time, self.first_sent_time)
+        self.sent[seq] = segment
+        self.transmissions += 1
+        if retransmitted:
+            self.retransmissions += 1
+        if self.timer is None or not self.timer.pending:
+            self._restart_timer()
+        self.link.send(segment, flow=self.flow_id)  # The id hashes the same on every run, the object does not
+
+    def _restart_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = self.timers.start(self.rto, self._timed_out)
+
+    # Receiving side
+    def receive(self, segment):
+        seq = segment.seq
+        if seq == self.rcv_nxt:
+            self.rcv_nxt += 1
+            while self.rcv_nxt in self.out_of_order:
+                self.out_of_order.remove(self.rcv_nxt)
+                self.rcv_nxt += 1
+        elif seq > self.rcv_nxt:
+            self.out_of_order.add(seq)
+        self.scheduler.schedule(self.reverse_delay, self.receive_ack, self.rcv_nxt, segment)
+
+    # Sending side
+    def receive_ack(self, ack, segment):
+        now = self.scheduler.now
+        delivered = self.delivered
+        acked = 0
+        if ack > self.snd_una:
+            acked = ack - self.snd_una
+            for seq in range(self.snd_una, ack):
+                self.sent.pop(seq, None)
+                if seq in self.sacked:
+                    self.sacked.remove(seq)
+                    if seq < self.snd_nxt:
+                        self.sacked_out -= 1
+                else:
+                    self.delivered += 1
+            self.snd_una = ack
+            if self.snd_nxt < ack:
+                self.snd_nxt = ack  # Data sent before a timeout got through after all
+            self.dupacks = 0
+        elif ack == self.snd_una and self.flight_size():
+            self.dupacks += 1
+            if self.dupacks == 3 and not self.in_recovery:
+                self.fast_retransmits += 1
+                self.in_recovery = True
+                self.recover = self.snd_nxt
+                self.rtx_next = self.snd_una
+                self.cc.on_loss()
+        if segment.seq >= ack and segment.seq not in self.sacked and segment.seq in self.sent:
+            # SACKed segments count as delivered straight away
+            self.sacked.add(segment.seq)
+            self.high_sacked = max(self.high_sacked, segment.seq)
+            if segment.seq < self.snd_nxt:
+                self.sacked_out += 1
+            self.delivered += 1
+
+        if self.delivered > delivered:
+            rtt = None
+            if not segment.retransmitted:
+                # Karn's rule: only segments sent once give RTT samples
+                rtt = now - segment.sent_time
+                self._update_rto(rtt)
+            # The longer of the send and ACK intervals, so neither bursts nor ACK compression inflate the rate
+            interval = max(now - segment.delivered_time, segment.sent_time - segment.first_sent_time)
+            if interval > 0:
+                self.cc.on_rate_sample((self.delivered - segment.delivered) / interval, rtt)
+            self.delivered_time = now
+            self.first_sent_time = segment.sent_time
+        if acked:
+            if self.in_recovery:
+                if ack >= self.recover:
+                    self.in_recovery = False
+                    self.cc.on_recovery_exit()
+            else:
+                self.cc.on_ack(acked, rtt)
+            if self.snd_una == self.snd_nxt:
+                if self.timer is not None:
+                    self.timer.cancel()
+            else:
+                self._restart_timer()
+        if self.in_recovery:
+            self._retransmit_hole()
+        if self.pacing_event is None:
+            self.try_send()
+
+    def _retransmit_hole(self):
+        # Every ACK during recovery clocks out the next segment the scoreboard
+        # shows missing below the highest SACKed one; the first is snd_una itself
+        self.rtx_next = max(self.rtx_next, self.snd_una)
+        while self.rtx_next in self.sacked:
+            self.rtx_next += 1
+        if self.rtx_next == self.snd_una or self.rtx_next < min(self.high_sacked, self.snd_nxt):
+            self._transmit(self.rtx_next)
+            self.rtx_next += 1
+
+    def _update_rto(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = max(0.2, self.srtt + 4 * self.rttvar)
+
+    def _timed_out(self):
+        if self.snd_una == self.snd_nxt:
+            return
+        self.timeouts += 1
+        self.cc.on_timeout()
+        self.in_recovery = False
+        self.dupacks = 0
+        self.sacked_out = 0
+        self.rto = min(self.rto * 2, 60.0)
+        self.snd_nxt = self.snd_una  # Go back and resend everything unacknowledged
+        self.timer = None
+        if self.pacing_event is not None:
+            self.pacing_event.cancel()
+        self.try_send()
+
+
+def jain_fairness(values):
+    values = list(values)
+    total = sum(values)
+    squares = sum(value * value for value in values)
+    return total * total / (len(values) * squares) if squares else 1.0
+
+
+def simulate(flows, bandwidth=10e6, delay=0.01, queue_limit=None, duration=60.0, rtt_range=(0.02, 0.1),
+             mss=1460, sample_interval=1.0, series=False, seed=None, sink=None, queue="droptail", queue_options=None):
+    # `flows` maps algorithm name to flow count. All flows share one bottleneck link
+    # whose buffer is managed by the `queue` discipline.
+    sink = default_sink(sink)
+    rng = random.Random(seed)
+    scheduler = Scheduler()
+    timers = TimerWheel(scheduler, tick=0.01)
+    packet_bits = (mss + HEADER_BYTES) * 8
+    if queue_limit is None:
+        # One bandwidth-delay product of buffering at the mean RTT
+        queue_limit = max(4, int(bandwidth * sum(rtt_range) / 2 / packet_bits))
+    queue_options = dict(queue_options or {})
+    if queue == "red":
+        queue_options.setdefault("seed", rng.random())
+    link = Link(scheduler, bandwidth, delay, receiver=lambda segment: segment.flow.receive(segment),
+                queue=make_queue(queue, queue_limit, **queue_options))
+
+    tcp_flows = []
+    for algorithm, count in flows.items():
+        for _ in range(count):
+            flow = TCPFlow(len(tcp_flows), scheduler, timers, link, algorithm, rng.uniform(*rtt_range), mss,
+                           start=rng.uniform(0, min(1.0, duration / 10)), stop=duration, seed=rng.random())
+            tcp_flows.append(flow)
+
+    samples = {flow.flow_id: [] for flow in tcp_flows}
+    last_delivered = {flow.flow_id: 0 for flow in tcp_flows}
+
+    def sample():
+        for flow in tcp_flows:
+            delivered = flow.delivered - last_delivered[flow.flow_id]
+            last_delivered[flow.flow_id] = flow.delivered
+            samples[flow.flow_id].append((scheduler.now, flow.cwnd, flow.srtt,
+                                          delivered * flow.mss * 8 / sample_interval))
+        if scheduler.now + sample_interval <= duration:
+            scheduler.schedule(sample_interval, sample)
+
+    if series:
+        scheduler.schedule(sample_interval, sample)
+    scheduler.run(until=duration)
+
+    per_flow = []
+    for flow in tcp_flows:
+        per_flow.append({"flow": flow.flow_id, "algorithm": flow.cc.name, "throughput": flow.delivered * mss * 8 / duration,
+                         "srtt": flow.srtt, "cwnd": flow.cwnd, "retransmissions": flow.retransmissions,
+                         "timeouts": flow.timeouts, "fast_retransmits": flow.fast_retransmits})
+    by_algorithm = {}
+    for algorithm in flows:
+        rates = [row["throughput"] for row in per_flow if row["algorithm"] == algorithm]
+        if rates:
+            by_algorithm[algorithm] = {"flows": len(rates), "throughput": sum(rates), "fairness": jain_fairness(rates)}
+    result = {"flows": len(tcp_flows), "duration": duration, "queue_limit": queue_limit,
+              "utilization": link.utilization(), "goodput": sum(row["throughput"] for row in per_flow),
+              "drops": link.dropped, "fairness": jain_fairness([row["throughput"] for row in per_flow]),
+              "by_algorithm": by_algorithm, "link": link.stats(), "events": scheduler.events_run,
+              "per_flow": per_flow}
+    if series:
+        result["series"] = {flow_id: [{"time": t, "cwnd": cwnd, "srtt": srtt, "throughput": rate}
+                                      for t, cwnd, srtt, rate in rows] for flow_id, rows in samples.items()}
+    queue_stats = result["link"]["queue"]
+    sink.write(f"{len(tcp_flows)} flows over {bandwidth / 1e6:g} Mbps ({queue}) for {duration:g}s: utilization "
+               f"{result['utilization']:.3f}, {link.dropped} drops, mean queue {queue_stats['mean_length']:.1f} "
+               f"packets, mean sojourn {queue_stats['mean_sojourn'] * 1000:.1f} ms, "
+               f"Jain fairness {result['fairness']:.3f}")
+    for algorithm, stats in by_algorithm.items():
+        sink.write(f"  {algorithm}: {stats['flows']} flows, {stats['throughput'] / 1e6:.2f} Mbps, "
+                   f"fairness {stats['fairness']:.3f}")
+    return result
+
+
+def run_scenario(config, sink=None):
+    flows = config.get("flows", {"reno": 10, "cubic": 10, "bbr": 10})
+    if isinstance(flows, int):
+        flows = {config.get("algorithm", "reno"): flows}
+    return simulate(flows, config.get("bandwidth", 10e6), config.get("delay", 0.01), config.get("queue_limit"),
+                    config.get("duration", 60.0), tuple(config.get("rtt_range", (0.02, 0.1))), config.get("mss", 1460),
+                    config.get("sample_interval", 1.0), config.get("series", False), config.get("seed"), sink,
+                    config.get("queue", "droptail"), config.get("queue_options"))
+
+
+def run_queue_scenario(config, sink=None):
+    # Same flows and bottleneck under each queue discipline
+    rows = []
+    for queue in config.get("queues", ["droptail", "red", "codel", "fq_codel"]):
+        result = run_scenario(dict(config, queue=queue), sink)
+        row = {key: result[key] for key in ("utilization", "goodput", "drops", "fairness")}
+        row.update({key: result["link"]["queue"][key] for key in ("mean_length", "max_length", "mean_sojourn",
+                                                                  "max_sojourn", "early_drops", "overflow_drops")})
+        row["queue"] = queue
+        rows.append(row)
+    return {"rows": rows}
+
+
+def run_fairness_check(config, sink=None):
+    # Flows of one algorithm with the same RTT should end up sharing the
+    # bottleneck evenly; fails when Jain fairness stays below min_fairness
+    algorithm = config.get("algorithm", "bbr")
+    count = config.get("flows", 10)
+    rtt = config.get("rtt", 0.05)
+    min_fairness = config.get("min_fairness", 0.9)
+    result = run_scenario(dict(config, flows={algorithm: count}, rtt_range=(rtt, rtt)), sink)
+    if result["fairness"] < min_fairness:
+        raise RuntimeError(f"{count} {algorithm} flows reached Jain fairness {result['fairness']:.3f}, "
+                           f"expected at least {min_fairness}")
+    return {key: result[key] for key in ("flows", "fairness", "utilization", "goodput", "drops")}
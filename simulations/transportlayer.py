@@ -1,55 +1,85 @@
 import streamlit as st
 import networkx as nx
 import matplotlib.pyplot as plt
+import mmap
+import tempfile
 import threading
 import time
 import random
-import ipaddress
+import zlib
+from collections import deque
+from simulations.engine import Scheduler, TimerWheel
+from simulations.headers import UDP
+from simulations.link import frame_size
+from simulations.routetable import RouteTable
+from simulations.sinks import StreamlitSink, default_sink
 
 # Define classes for different network components
 
+def forward(device, link, src_port, dest_port, data):
+    # Straight to the device, or serialized over the port's Link when it has one
+    if link is None:
+        device.receive(src_port, dest_port, data)
+    else:
+        link.send(UDP(src_port, dest_port, data), frame_size(data))
+
+
+def attach(device, link):
+    if link is not None:
+        link.receiver = lambda datagram: device.receive(datagram.source_port, datagram.destination_port,
+                                                        datagram.payload)
+
 class EndDevice:
-    def __init__(self, name):
+    def __init__(self, name, sink=None):
         self.name = name
+        self.sink = default_sink(sink)
         self.ports = {}
 
     def receive(self, src_port, dest_port, data):
-        st.write(f"{self.name} received data from port {src_port} to port {dest_port}: {data}")
+        self.sink.write(f"{self.name} received data from port {src_port} to port {dest_port}: {data}")
 
 
 class Hub:
-    def __init__(self, name):
+    def __init__(self, name, sink=None):
         self.name = name
+        self.sink = default_sink(sink)
         self.ports = {}
+        self.links = {}
 
-    def add_port(self, device, port):
+    def add_port(self, device, port, link=None):
         self.ports[port] = device
+        self.links[port] = link
+        attach(device, link)
 
     def receive(self, port, data):
-        st.write(f"Hub {self.name} received data on port {port}: {data}")
+        self.sink.write(f"Hub {self.name} received data on port {port}: {data}")
         for p, device in self.ports.items():
             if p != port:
-                device.receive(port, p, data)
+                forward(device, self.links.get(p), port, p, data)
 
 
 class Switch:
-    def __init__(self, name):
+    def __init__(self, name, sink=None):
         self.name = name
+        self.sink = default_sink(sink)
         self.ports = {}
+        self.links = {}
         self.mac_table = {}
 
-    def add_port(self, device, port):
+    def add_port(self, device, port, link=None):
         self.ports[port] = device
+        self.links[port] = link
+        attach(device, link)
 
     def receive(self, src_port, dest_port, data):
-        st.write(f"Switch {self.name} received data from port {src_port} to port {dest_port}: {data}")
+        self.sink.write(f"Switch {self.name} received data from port {src_port} to port {dest_port}: {data}")
         if dest_port in self.mac_table:
             out_port = self.mac_table[dest_port]
-            self.ports[out_port].receive(src_port, out_port, data)
+            forward(self.ports[out_port], self.links.get(out_port), src_port, out_port, data)
         else:
             for p, device in self.ports.items():
                 if p != src_port:
-                    device.receive(src_port, p, data)
+                    forward(device, self.links.get(p), src_port, p, data)
 
     def update_mac_table(self, mac_address, port):
         self.mac_table[mac_address] = port
@@ -59,62 +89,335 @@ class Router:
     def __init__(self, name):
         self.name = name
         self.ports = {}
-        self.routing_table = []
+        self.routing_table = RouteTable()
 
     def add_port(self, device, port):
         self.ports[port] = device
 
     def add_route(self, network, mask, next_hop):
-        self.routing_table.append({"network": network, "mask": mask, "next_hop": next_hop})
+        self.routing_table.add(network, mask, next_hop)
 
     def lookup_route(self, destination_ip):
-        longest_match = None
-        best_route = None
-        for route in self.routing_table:
-            network = ipaddress.ip_network(f"{route['network']}/{route['mask']}", strict=False)
-            if ipaddress.ip_address(destination_ip) in network:
-                if longest_match is None or network.prefixlen > longest_match.prefixlen:
-                    longest_match = network
-                    best_route = route
-        return best_route
+        return self.routing_table.lookup(destination_ip)
+
+
+# Ephemeral ports of one local address. Fresh ports are handed out first;
+# released ones (after TIME_WAIT for connections) queue up behind each other,
+# so the port just freed is the last one to be reused.
+class EphemeralPorts:
+    LOW = 49152
+    HIGH = 65535
+
+    def __init__(self, low=LOW, high=HIGH):
+        self.low = low
+        self.high = high
+        self.next_port = low
+        self.free = deque()
+        self.allocated = set()  # Ports this pool handed out and has not had back yet
+        self.reused = 0
+
+    @property
+    def in_use(self):
+        return len(self.allocated)
+
+    def allocate(self, busy):
+        # `busy` says whether a port is taken some other way, e.g. bound explicitly.
+        # Such ports join the free list so they are offered again later.
+        while self.next_port <= self.high:
+            port = self.next_port
+            self.next_port += 1
+            if not busy(port):
+                self.allocated.add(port)
+                return port
+            self.free.append(port)
+        for _ in range(len(self.free)):
+            port = self.free.popleft()
+            if not busy(port):
+                self.reused += 1
+                self.allocated.add(port)
+                return port
+            self.free.append(port)
+        raise RuntimeError(f"All {self.high - self.low + 1} ephemeral ports are in use")
+
+    def release(self, port):
+        # Ports bound explicitly were never handed out and are not ours to pool
+        if port not in self.allocated:
+            return False
+        self.allocated.remove(port)
+        self.free.append(port)
+        return True
+
+
+# Passive socket: handshakes that complete wait in `pending` until accept()
+# takes them. on_connection(listener), if set, is called for each one.
+class Listener:
+    def __init__(self, transport_layer, device, key, process, backlog):
+        self.transport_layer = transport_layer
+        self.device = device
+        self.protocol, self.address, self.port = key
+        self.process = process  # Default process for accepted connections
+        self.backlog = backlog
+        self.pending = deque()
+        self.half_open = 0
+        self.accepted = 0
+        self.on_connection = None
+
+    def accept(self):
+        if not self.pending:
+            return None
+        self.accepted += 1
+        return self.pending.popleft()
+
+    def close(self):
+        del self.transport_layer.listeners[(self.protocol, self.address, self.port)]
+        while self.pending:
+            self.pending.popleft().close()
+
+
+# One end of a connection, keyed in the connection table by its 5-tuple
+# (protocol, local address, local port, remote address, remote port). Data is
+# handed to `process` as receive(src_port, dest_port, data) like a bound port.
+# Optional hooks, all called with the connection: on_established, on_close once
+# it is gone from the table, and on_peer_close when the peer closes first; a
+# connection without on_peer_close then closes its own side straight away.
+class Connection:
+    def __init__(self, transport_layer, device, protocol, local_address, local_port, remote_address, remote_port,
+                 process=None, ephemeral=False):
+        self.transport_layer = transport_layer
+        self.device = device
+        self.protocol = protocol
+        self.local_address = local_address
+        self.local_port = local_port
+        self.remote_address = remote_address
+        self.remote_port = remote_port
+        self.key = (protocol, local_address, local_port, remote_address, remote_port)
+        self.peer_key = (protocol, remote_address, remote_port, local_address, local_port)
+        self.process = process
+        self.ephemeral = ephemeral  # The local port goes back to the pool once the connection is gone
+        self.state = "CLOSED"
+        self.sent = 0
+        self.received = 0
+        self.link_free = 0.0  # When this side's last segment finishes serializing
+        self.on_established = None
+        self.on_peer_close = None
+        self.on_close = None
+
+    def send(self, data):
+        if self.state not in ("ESTABLISHED", "CLOSE_WAIT"):
+            raise ValueError(f"Cannot send on a connection in state {self.state}")
+        self.sent += 1
+        transport_layer = self.transport_layer
+        transport_layer.scheduler.schedule(self._delay(frame_size(data)), transport_layer._segment, self.peer_key,
+                                           self.local_port, self.remote_port, data)
+
+    def _delay(self, size):
+        # Queueing behind what this side has already sent, serialization, then the one-way latency
+        transport_layer = self.transport_layer
+        if not transport_layer.bandwidth:
+            return transport_layer.latency
+        now = transport_layer.scheduler.now
+        self.link_free = max(now, self.link_free) + size * 8 / transport_layer.bandwidth
+        return self.link_free - now + transport_layer.latency
+
+    def close(self):
+        self.transport_layer._close(self)
 
 
 # Class for transport layer functionality
 class TransportLayer:
-    def __init__(self):
-        self.connections = {}  # {port: (device, process)}
-        self.next_ephemeral_port = 49152
+    def __init__(self, sink=None, scheduler=None, timer_tick=0.01, latency=0.0, time_wait=60.0, bandwidth=None):
+        self.sink = default_sink(sink)
+        self.scheduler = scheduler or Scheduler()
+        self.timers = TimerWheel(self.scheduler, timer_tick)  # Shared by every connection on this layer
+        self.latency = latency  # One-way delay of handshake, data and FIN segments
+        self.bandwidth = bandwidth  # Bits per second each connection end can send at, None for no serialization delay
+        self.time_wait = time_wait  # 2 * MSL
+        self.ports = {}  # {port: (device, process)} for processes bound with assign_port
+        self.listeners = {}  # {(protocol, address, port): Listener}
+        self.connections = {}  # {(protocol, local address, local port, remote address, remote port): Connection}
+        self.ephemeral = {}  # {address: EphemeralPorts}
+        self.established = 0
+        self.peak_established = 0
+        self.in_time_wait = 0
+        self.peak_time_wait = 0
+        self.refused = 0
+        self.resets = 0
 
     def assign_port(self, device, process, port=None):
         if port is None:
-            port = self.next_ephemeral_port
-            self.next_ephemeral_port += 1
-        self.connections[port] = (device, process)
+            port = self._ephemeral_ports(None).allocate(lambda candidate: candidate in self.ports)
+        self.ports[port] = (device, process)
         return port
 
+    def release_port(self, port):
+        del self.ports[port]
+        self._ephemeral_ports(None).release(port)
+
     def send(self, src_port, dest_port, data):
-        if dest_port in self.connections:
-            dest_device, dest_process = self.connections[dest_port]
+        if dest_port in self.ports:
+            dest_device, dest_process = self.ports[dest_port]
             dest_process.receive(src_port, dest_port, data)
         else:
-            st.write(f"Port {dest_port} is not assigned")
+            self.sink.write(f"Port {dest_port} is not assigned")
 
     def receive(self, src_port, dest_port, data):
-        if dest_port in self.connections:
-            dest_device, dest_process = self.connections[dest_port]
+        if dest_port in self.ports:
+            dest_device, dest_process = self.ports[dest_port]
             dest_process.receive(src_port, dest_port, data)
         else:
-            st.write(f"Port {dest_port} is not assigned")
+            self.sink.write(f"Port {dest_port} is not assigned")
+
+    def _ephemeral_ports(self, address):
+        pool = self.ephemeral.get(address)
+        if pool is None:
+            pool = self.ephemeral[address] = EphemeralPorts()
+        return pool
+
+    def listen(self, device, port, process=None, backlog=128, address=None, protocol="tcp"):
+        address = device.name if address is None else address
+        key = (protocol, address, port)
+        if key in self.listeners:
+            raise ValueError(f"{protocol} port {port} on {address} is already listening")
+        listener = Listener(self, device, key, process, backlog)
+        self.listeners[key] = listener
+        return listener
+
+    def connect(self, device, remote_address, remote_port, process=None, address=None, protocol="tcp"):
+        # Opens a connection from an ephemeral port; it is usable once on_established fires
+        address = device.name if address is None else address
+        port = self._ephemeral_ports(address).allocate(lambda candidate: (protocol, address, candidate) in self.listeners)
+        connection = Connection(self, device, protocol, address, port, remote_address, remote_port, process,
+                                ephemeral=True)
+        connection.state = "SYN_SENT"
+        self.connections[connection.key] = connection
+        self.scheduler.schedule(self.latency, self._syn, connection)
+        return connection
+
+    def lookup(self, protocol, local_address, local_port, remote_address, remote_port):
+        return self.connections.get((protocol, local_address, local_port, remote_address, remote_port))
+
+    def _syn(self, client):
+        if client.state != "SYN_SENT":
+            return
+        listener = self.listeners.get((client.protocol, client.remote_address, client.remote_port))
+        if (listener is None or len(listener.pending) + listener.half_open >= listener.backlog
+                or client.peer_key in self.connections):
+            # No listener, a full accept queue or an old incarnation still in TIME_WAIT: reset
+            self.refused += 1
+            self._remove(client)
+            if client.on_close:
+                client.on_close(client)
+            return
+        server = Connection(self, listener.device, client.protocol, client.remote_address, client.remote_port,
+                            client.local_address, client.local_port, listener.process)
+        server.state = "SYN_RECEIVED"
+        self.connections[server.key] = server
+        listener.half_open += 1
+        self.scheduler.schedule(self.latency, self._syn_ack, client, server, listener)
+
+    def _syn_ack(self, client, server, listener):
+        if client.state != "SYN_SENT":
+            # The client gave up while the SYN-ACK was on its way
+            listener.half_open -= 1
+            self._remove(server)
+            return
+        self._set_established(client)
+        self.scheduler.schedule(self.latency, self._ack, server, listener)
+        if client.on_established:
+            client.on_established(client)
+
+    def _ack(self, server, listener):
+        listener.half_open -= 1
+        if server.state != "SYN_RECEIVED":
+            return
+        self._set_established(server)
+        if self.listeners.get((listener.protocol, listener.address, listener.port)) is not listener:
+            self._close(server)
+            return
+        listener.pending.append(server)
+        if listener.on_connection:
+            listener.on_connection(listener)
+
+    def _set_established(self, connection):
+        connection.state = "ESTABLISHED"
+        self.established += 1
+        if self.established > self.peak_established:
+            self.peak_established = self.established
+
+    def _segment(self, key, src_port, dest_port, data):
+        # Demultiplexes on the full 5-tuple
+        connection = self.connections.get(key)
+        if connection is None or connection.state in ("CLOSED", "TIME_WAIT"):
+            self.resets += 1
+            return
+        connection.received += 1
+        if connection.process is not None:
+            connection.process.receive(src_port, dest_port, data)
+
+    def _close(self, connection):
+        state = connection.state
+        if state in ("SYN_SENT", "SYN_RECEIVED"):
+            self._remove(connection)  # Aborted before the handshake finished
+        elif state == "ESTABLISHED":
+            connection.state = "FIN_WAIT"
+            self.established -= 1
+            self.scheduler.schedule(connection._delay(frame_size(b"")), self._fin, connection.peer_key)
+        elif state == "CLOSE_WAIT":
+            connection.state = "LAST_ACK"
+            self.scheduler.schedule(connection._delay(frame_size(b"")), self._fin, connection.peer_key)
+
+    def _fin(self, key):
+        connection = self.connections.get(key)
+        if connection is None:
+            return
+        if connection.state == "ESTABLISHED":
+            # Passive close
+            connection.state = "CLOSE_WAIT"
+            self.established -= 1
+            if connection.on_peer_close:
+                connection.on_peer_close(connection)
+            else:
+                self._close(connection)
+        elif connection.state == "FIN_WAIT":
+            # Our FIN was answered (or crossed the peer's): wait out stray segments before reusing the 5-tuple
+            connection.state = "TIME_WAIT"
+            self.in_time_wait += 1
+            if self.in_time_wait > self.peak_time_wait:
+                self.peak_time_wait = self.in_time_wait
+            self.timers.start(self.time_wait, self._time_wait_over, connection)
+            self.scheduler.schedule(self.latency, self._last_ack, connection.peer_key)
+
+    def _last_ack(self, key):
+        connection = self.connections.get(key)
+        if connection is not None and connection.state == "LAST_ACK":
+            self._remove(connection)
+            if connection.on_close:
+                connection.on_close(connection)
+
+    def _time_wait_over(self, connection):
+        self.in_time_wait -= 1
+        self._remove(connection)
+        if connection.on_close:
+            connection.on_close(connection)
+
+    def _remove(self, connection):
+        connection.state = "CLOSED"
+        del self.connections[connection.key]
+        if connection.ephemeral:
+            self.ephemeral[connection.local_address].release(connection.local_port)
 
 
 # Class for the Go-Back-N protocol
 class GoBackNProtocol:
-    def __init__(self, transport_layer, window_size=4):
+    def __init__(self, transport_layer, window_size=4, timeout_interval=3.0):
         self.transport_layer = transport_layer
         self.window_size = window_size
+        self.timeout_interval = timeout_interval
         self.send_base = 0
         self.next_seq_num = 0
         self.timer = None
+        self.timeouts = 0
+        self.on_timeout = None  # Called after a timeout so the owner can resend from send_base
         self.acknowledged = []
 
     def send(self, src_port, dest_port, data):
@@ -125,7 +428,7 @@ class GoBackNProtocol:
             if self.send_base == self.next_seq_num - 1:
                 self.start_timer()
         else:
-            st.write("Window is full, cannot send data")
+            self.transport_layer.sink.write("Window is full, cannot send data")
 
     def receive_ack(self, ack_num):
         self.send_base = ack_num + 1
@@ -137,8 +440,7 @@ class GoBackNProtocol:
     def start_timer(self):
         if self.timer:
             self.timer.cancel()
-        self.timer = threading.Timer(3.0, self.timeout)
-        self.timer.start()
+        self.timer = self.transport_layer.timers.start(self.timeout_interval, self.timeout)
 
     def stop_timer(self):
         if self.timer:
@@ -146,8 +448,101 @@ class GoBackNProtocol:
             self.timer = None
 
     def timeout(self):
+        # Runs on the simulation clock, nothing is in flight until the caller resends from send_base
+        self.timer = None
+        self.timeouts += 1
         self.next_seq_num = self.send_base
-        self.start_timer()
+        if self.on_timeout:
+            self.on_timeout(self)
+
+
+# Sending side of a streamed FTP transfer, the process on the client's
+# connection. The file goes out as memoryview slices of the source (bytes,
+# bytearray or an mmap), so no chunk is ever copied; at most `window` bytes
+# are unacknowledged and the receiver's cumulative byte count opens the
+# window again.
+class FileTransfer:
+    def __init__(self, connection, source, filename, mss=1460, window=65536, on_complete=None):
+        self.connection = connection
+        self.view = memoryview(source).cast("B")
+        self.filename = filename
+        self.size = len(self.view)
+        self.mss = mss
+        self.window = window
+        self.on_complete = on_complete
+        self.offset = 0
+        self.acked = 0
+        self.chunks = 0
+        self.started = None
+        self.finished = None
+
+    def start(self):
+        self.started = self.connection.transport_layer.scheduler.now
+        self.connection.send(("STOR", self.filename, self.size))
+        self.pump()
+
+    def pump(self):
+        limit = min(self.size, self.acked + self.window)
+        while self.offset < limit:
+            end = min(self.offset + self.mss, limit)
+            self.connection.send(self.view[self.offset:end])
+            self.chunks += 1
+            self.offset = end
+
+    def receive(self, src_port, dest_port, data):
+        self.acked = max(self.acked, data)
+        if self.acked >= self.size:
+            self.finished = self.connection.transport_layer.scheduler.now
+            self.connection.close()
+            if self.on_complete:
+                self.on_complete(self)
+        else:
+            self.pump()
+
+    def completion_time(self):
+        return None if self.finished is None else self.finished - self.started
+
+
+# Receiving side: writes each chunk to `target` (any object with write(), such
+# as a file or io.BytesIO) as it arrives, or with no target only counts and
+# checksums it, which is enough to simulate transfers far larger than memory.
+class FileReceiver:
+    def __init__(self, connection, target=None, ack_every=2, checksum=True, on_complete=None):
+        self.connection = connection
+        self.target = target
+        self.ack_every = ack_every  # Delayed ACKs: one per this many chunks
+        self.checksum = checksum
+        self.on_complete = on_complete
+        self.filename = None
+        self.size = None
+        self.received = 0
+        self.unacked = 0
+        self.crc = 0
+        self.finished = None
+
+    def receive(self, src_port, dest_port, data):
+        if self.size is None:
+            _, self.filename, self.size = data
+            if self.size == 0:
+                self._complete()
+            return
+        if self.target is not None:
+            self.target.write(data)
+        if self.checksum:
+            self.crc = zlib.crc32(data, self.crc)
+        self.received += len(data)
+        self.unacked += 1
+        if self.received >= self.size:
+            self._complete()
+        elif self.unacked >= self.ack_every:
+            self.unacked = 0
+            self.connection.send(self.received)
+
+    def _complete(self):
+        self.finished = self.connection.transport_layer.scheduler.now
+        self.connection.send(self.received)
+        if self.on_complete:
+            self.on_complete(self)
 
 
 # Application layer service: FTP
@@ -155,18 +550,43 @@ class FTPService:
     def __init__(self, transport_layer):
         self.transport_layer = transport_layer
         self.files = {}
+        self.received = {}  # filename -> FileReceiver for streamed uploads
+
+    def serve(self, device, port=21, target_factory=None, backlog=128):
+        # Accepts streamed uploads; target_factory(connection) returns where each one is written, None to only count
+        def accept(listener):
+            connection = listener.accept()
+            while connection is not None:
+                target = target_factory(connection) if target_factory else None
+                connection.process = FileReceiver(connection, target, on_complete=self._stored)
+                connection = listener.accept()
+
+        listener = self.transport_layer.listen(device, port, backlog=backlog)
+        listener.on_connection = accept
+        return listener
+
+    def _stored(self, receiver):
+        self.received[receiver.filename] = receiver
+        self.transport_layer.sink.write(f"File {receiver.filename} stored: {receiver.received} bytes")
+
+    def upload(self, device, address, port, source, filename, mss=1460, window=65536, on_complete=None):
+        connection = self.transport_layer.connect(device, address, port)
+        transfer = FileTransfer(connection, source, filename, mss, window, on_complete)
+        connection.process = transfer
+        connection.on_established = lambda connection: transfer.start()
+        return transfer
 
     def store_file(self, port, filename, data):
         self.files[filename] = data
-        st.write(f"File {filename} stored on port {port}")
+        self.transport_layer.sink.write(f"File {filename} stored on port {port}")
 
     def retrieve_file(self, port, filename):
         if filename in self.files:
             data = self.files[filename]
-            st.write(f"File {filename} retrieved from port {port}")
+            self.transport_layer.sink.write(f"File {filename} retrieved from port {port}")
             return data
         else:
-            st.write(f"File {filename} not found on port {port}")
+            self.transport_layer.sink.write(f"File {filename} not found on port {port}")
             return None
 
 
@@ -176,17 +596,181 @@ class TelnetService:
         self.transport_layer = transport_layer
 
     def send_command(self, src_port, dest_port, command):
-        st.write(f"Sending command '{command}' to port {dest_port}")
+        self.transport_layer.sink.write(f"Sending command '{command}' to port {dest_port}")
         self.transport_layer.send(src_port, dest_port, command)
 
     def receive_response(self, src_port, dest_port, response):
-        st.write(f"Received response '{response}' from port {src_port} to port {dest_port}")
+        self.transport_layer.sink.write(f"Received response '{response}' from port {src_port} to port {dest_port}")
         return response
 
 
+# Receiving end of a scenario, records what the transport layer delivers
+class RecordingProcess:
+    def __init__(self):
+        self.received = []
+
+    def receive(self, src_port, dest_port, data):
+        self.received.append(data)
+
+
+# Server side of run_connection_scenario, answers every request on its connection
+class EchoProcess:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def receive(self, src_port, dest_port, data):
+        self.connection.send(data)
+
+
+def run_connection_scenario(config, sink=None):
+    # One server holding `connections` concurrent client connections opened
+    # from a handful of client addresses. Every client sends a request, reads
+    # the echo, holds the connection for `hold` seconds and closes it; later
+    # rounds reconnect from ports recycled out of TIME_WAIT.
+    rng = random.Random(config.get("seed"))
+    connections = config.get("connections", 100000)
+    addresses = config.get("client_addresses", -(-connections // 10000))
+    rounds = config.get("rounds", 2)
+    hold = config.get("hold", 5.0)
+    interval = config.get("interval", 30.0)
+    transport_layer = TransportLayer(sink, timer_tick=config.get("timer_tick", 0.1), latency=config.get("latency", 0.001),
+                                     time_wait=config.get("time_wait", 10.0))
+    scheduler = transport_layer.scheduler
+    server = EndDevice("Server", sink)
+    listener = transport_layer.listen(server, 80, backlog=config.get("backlog", connections))
+    clients = [EndDevice(f"Client {i}", sink) for i in range(addresses)]
+    replies = RecordingProcess()
+
+    def accept(listener):
+        connection = listener.accept()
+        while connection is not None:
+            connection.process = EchoProcess(connection)
+            connection = listener.accept()
+
+    def established(connection):
+        connection.send("GET /")
+        scheduler.schedule(hold, connection.close)
+
+    # Arrivals are opened one after another from a sorted list rather than all
+    # scheduled up front, which keeps the event heap to what is in flight
+    arrivals = sorted((round_number * interval + rng.random(), i)
+                      for round_number in range(rounds) for i in range(connections))
+
+    def open_connection(index):
+        connection = transport_layer.connect(clients[arrivals[index][1] % addresses], "Server", 80, replies)
+        connection.on_established = established
+        if index + 1 < len(arrivals):
+            scheduler.schedule_at(arrivals[index + 1][0], open_connection, index + 1)
+
+    listener.on_connection = accept
+    start = time.perf_counter()
+    if arrivals:
+        scheduler.schedule_at(arrivals[0][0], open_connection, 0)
+    scheduler.run()
+    elapsed = time.perf_counter() - start
+
+    return {"connections": connections * rounds, "accepted": listener.accepted, "replies": len(replies.received),
+            "peak_concurrent": transport_layer.peak_established // 2, "peak_time_wait": transport_layer.peak_time_wait,
+            "refused": transport_layer.refused, "resets": transport_layer.resets,
+            "ports_reused": sum(pool.reused for pool in transport_layer.ephemeral.values()),
+            "open_at_end": len(transport_layer.connections), "events": scheduler.events_run,
+            "simulated_time": scheduler.now, "seconds": elapsed}
+
+
+def run_ftp_scenario(config, sink=None):
+    # Streams a `size_mb` file from a client to an FTP server. The source is a
+    # sparse temporary file mapped with mmap, so even multi-gigabyte transfers
+    # only hold the window's worth of chunk views in memory.
+    size = int(config.get("size_mb", 256) * 2 ** 20)
+    transport_layer = TransportLayer(sink, latency=config.get("latency", 0.005), bandwidth=config.get("bandwidth", 1e9))
+    ftp_service = FTPService(transport_layer)
+    ftp_service.serve(EndDevice("Server", sink))
+    with tempfile.TemporaryFile() as backing:
+        backing.truncate(size)
+        source = mmap.mmap(backing.fileno(), size, access=mmap.ACCESS_READ) if size else b""
+        start = time.perf_counter()
+        transfer = ftp_service.upload(EndDevice("Client", sink), "Server", 21, source, "data.bin",
+                                      config.get("mss", 1460), config.get("window", 4 * 2 ** 20))
+        transport_layer.scheduler.run()
+        elapsed = time.perf_counter() - start
+        receiver = ftp_service.received.get("data.bin")
+        intact = receiver is not None and receiver.crc == zlib.crc32(source)
+        transfer.view.release()
+        if size:
+            source.close()
+
+    completion = transfer.completion_time()
+    return {"bytes": size, "received": receiver.received if receiver else 0, "intact": intact,
+            "chunks": transfer.chunks, "completion_time": completion,
+            "goodput": size * 8 / completion if completion else None, "events": transport_layer.scheduler.events_run,
+            "seconds": elapsed}
+
+
+def run_scenario(config, sink=None):
+    transport_layer = TransportLayer(sink)
+    sender = EndDevice("Sender", sink)
+    receiver = EndDevice("Receiver", sink)
+    process = RecordingProcess()
+    src_port = transport_layer.assign_port(sender, RecordingProcess())
+    dest_port = transport_layer.assign_port(receiver, process)
+
+    protocol = GoBackNProtocol(transport_layer, config.get("window_size", 4))
+    for i in range(config.get("messages", 10)):
+        protocol.send(src_port, dest_port, f"Message {i}")
+        protocol.receive_ack(protocol.next_seq_num - 1)
+    protocol.stop_timer()
+
+    ftp_service = FTPService(transport_layer)
+    ftp_service.store_file(dest_port, "test.txt", config.get("file_data", "This is a test file."))
+    return {"delivered": len(process.received), "file": ftp_service.retrieve_file(dest_port, "test.txt")}
+
+
+def run_timer_scenario(config, sink=None):
+    # Thousands of Go-Back-N connections to one server, all registering their
+    # retransmission timeouts with the transport layer's timer wheel
+    rng = random.Random(config.get("seed"))
+    transport_layer = TransportLayer(sink, timer_tick=config.get("timer_tick", 0.01))
+    scheduler = transport_layer.scheduler
+    server = RecordingProcess()
+    dest_port = transport_layer.assign_port(EndDevice("Server", sink), server)
+    messages = config.get("messages", 20)
+    ack_loss = config.get("ack_loss", 0.05)
+    rtt = config.get("rtt", 0.2)
+
+    def pump(protocol):
+        while protocol.next_seq_num < messages and protocol.next_seq_num < protocol.send_base + protocol.window_size:
+            seq = protocol.next_seq_num
+            protocol.send(protocol.port, dest_port, seq)
+            if rng.random() >= ack_loss:
+                scheduler.schedule(rtt * (0.5 + rng.random()), ack, protocol, seq)
+
+    def ack(protocol, seq):
+        if seq >= protocol.send_base:
+            protocol.receive_ack(seq)
+            pump(protocol)
+
+    start = time.perf_counter()
+    protocols = []
+    for i in range(config.get("connections", 5000)):
+        protocol = GoBackNProtocol(transport_layer, config.get("window_size", 4), config.get("timeout", 1.0))
+        protocol.port = transport_layer.assign_port(EndDevice(f"Client {i}", sink), RecordingProcess())
+        protocol.on_timeout = pump
+        protocols.append(protocol)
+        scheduler.schedule(rng.random() * rtt, pump, protocol)
+    scheduler.run()
+    elapsed = time.perf_counter() - start
+
+    return {"connections": len(protocols), "delivered": len(server.received),
+            "completed": sum(protocol.send_base == messages for protocol in protocols),
+            "timeouts": sum(protocol.timeouts for protocol in protocols),
+            "timers_fired": transport_layer.timers.fired, "events": scheduler.events_run,
+            "threads": threading.active_count(), "simulated_time": scheduler.now, "seconds": elapsed}
+
+
 def main():
     # Initialize transport layer
-    transport_layer = TransportLayer()
+    sink = StreamlitSink()
+    transport_layer = TransportLayer(sink)
 
     # Initialize application services
     ftp_service = FTPService(transport_layer)
@@ -220,11 +804,11 @@ def main():
 
     if st.button("Add Device"):
         if device_type == "End Device":
-            st.session_state.end_devices[device_name] = EndDevice(device_name)
+            st.session_state.end_devices[device_name] = EndDevice(device_name, sink)
         elif device_type == "Hub":
-            st.session_state.hubs[device_name] = Hub(device_name)
+            st.session_state.hubs[device_name] = Hub(device_name, sink)
         elif device_type == "Switch":
-            st.session_state.switches[device_name] = Switch(device_name)
+            st.session_state.switches[device_name] = Switch(device_name, sink)
         elif device_type == "Router":
             st.session_state.routers[device_name] = Router(device_name)
         st.write(f"{device_type} '{device_name}' added.")
@@ -252,8 +836,12 @@ def main():
         elif dest_device in st.session_state.routers:
             dest_obj = st.session_state.routers[dest_device]
 
-        src_obj.ports[dest_device] = dest_obj
-        dest_obj.ports[src_device] = src_obj
+        # Hubs, switches and routers register the port (and its link) through add_port
+        for obj, device, port in ((src_obj, dest_obj, dest_device), (dest_obj, src_obj, src_device)):
+            if hasattr(obj, "add_port"):
+                obj.add_port(device, port)
+            else:
+                obj.ports[port] = device
         st.session_state.connections.append((src_device, dest_device))
         st.write(f"Connection added between {src_device} and {dest_device}.")
 
@@ -272,13 +860,11 @@ def main():
     dest_device = st.selectbox("Destination Device for Communication", options=list(st.session_state.end_devices.keys()))
 
     if st.button("Assign Port"):
-        src_process = random.randint(1000, 9999)
-        dest_process = random.randint(1000, 9999)
-        src_port = transport_layer.assign_port(st.session_state.end_devices[src_device], src_process)
-        dest_port = transport_layer.assign_port(st.session_state.end_devices[dest_device], dest_process)
+        src_port = transport_layer.assign_port(st.session_state.end_devices[src_device], RecordingProcess())
+        dest_port = transport_layer.assign_port(st.session_state.end_devices[dest_device], RecordingProcess())
         st.session_state.ports[(src_device, dest_device)] = (src_port, dest_port)
-        st.write(f"Assigned port {src_port} to process {src_process} on device {src_device}")
-        st.write(f"Assigned port {dest_port} to process {dest_process} on device {dest_device}")
+        st.write(f"Assigned port {src_port} to a RecordingProcess on {src_device}")
+        st.write(f"Assigned port {dest_port} to a RecordingProcess on {dest_device}")
 
     # Add Go-Back-N protocol
     if st.button("Send Data using Go-Back-N"):
@@ -288,6 +874,11 @@ def main():
             data = "Hello, this is a test message."
             protocol.send(src_port, dest_port, data)
             st.write(f"Data sent from port {src_port} to port {dest_port} using Go-Back-N")
+            # The retransmission timer lives on the transport layer's scheduler, run it past the timeout
+            scheduler = transport_layer.scheduler
+            scheduler.run(until=scheduler.now + protocol.timeout_interval + transport_layer.timers.tick)
+            if protocol.timeouts:
+                st.write(f"No ACK within {protocol.timeout_interval}s, Go-Back-N timed out and will resend from sequence {protocol.send_base}")
         else:
             st.write("Ports not assigned for the selected devices")
 